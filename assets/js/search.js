@@ -0,0 +1,155 @@
+// Client for the search index built by dnatools/searchindex.py.
+//
+// Only meta.json and the shards holding the query's terms are fetched; each
+// shard is decoded once and kept. Terms are made the same way as at build
+// time: NFKC, then Chinese character bigrams, lower-cased words otherwise.
+//
+//   const search = createSearch('/search/');
+//   search('染色体 DNA').then(results => ...);   // [{url, title, score}, ...]
+//
+// Loaded in a page, it also wires up every <form data-search> (see
+// layouts/base.html): typing into its search input lists the matching pages
+// in the form's <ol>, using the index next to this script.
+
+(function (global) {
+  const CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff';
+  // Letters and digits in any script, as [^\W_] is in Python (\W here is ASCII-only)
+  const TERMS = new RegExp(`([${CJK}]+)|((?:(?![${CJK}])[\\p{L}\\p{N}])+)`, 'gu');
+
+  function fnv1a(term) {
+    let hash = 0x811c9dc5;
+    for (const byte of new TextEncoder().encode(term)) {
+      hash = Math.imul(hash ^ byte, 0x01000193) >>> 0;
+    }
+    return hash;
+  }
+
+  function tokenize(text) {
+    const terms = [];
+    for (const [, cjk, word] of text.normalize('NFKC').toLowerCase().matchAll(TERMS)) {
+      if (cjk) {
+        const chars = Array.from(cjk);
+        if (chars.length === 1) terms.push(chars[0]);
+        for (let i = 0; i < chars.length - 1; i++) terms.push(chars[i] + chars[i + 1]);
+      } else if (Array.from(word).length > 1 || /^\p{N}+$/u.test(word)) {
+        terms.push(word);
+      }
+    }
+    return terms;
+  }
+
+  function decodeShard(buffer) {
+    const bytes = new Uint8Array(buffer);
+    const decoder = new TextDecoder();
+    let pos = 0;
+    const varint = () => {
+      let value = 0;
+      let shift = 0;
+      let byte;
+      do {
+        byte = bytes[pos++];
+        value += (byte & 0x7f) * 2 ** shift;
+        shift += 7;
+      } while (byte & 0x80);
+      return value;
+    };
+    const terms = new Map();
+    for (let count = varint(); count > 0; count--) {
+      const length = varint();
+      const term = decoder.decode(bytes.subarray(pos, pos + length));
+      pos += length;
+      const postings = [];
+      let page = 0;
+      for (let n = varint(); n > 0; n--) {
+        page += varint();
+        postings.push([page, varint()]);
+      }
+      terms.set(term, postings);
+    }
+    return terms;
+  }
+
+  function createSearch(base) {
+    base = base.endsWith('/') ? base : base + '/';
+    const shards = new Map();
+    const meta = fetch(base + 'meta.json').then(response => response.json());
+
+    function shard(n) {
+      if (!shards.has(n)) {
+        shards.set(n, fetch(`${base}shard-${n}.bin`)
+          .then(response => response.arrayBuffer())
+          .then(decodeShard));
+      }
+      return shards.get(n);
+    }
+
+    // Pages containing every term, ranked by tf-idf
+    return async function search(query, limit = 20) {
+      const terms = [...new Set(tokenize(query))];
+      if (!terms.length) return [];
+      const { shards: count, docs } = await meta;
+      const lists = await Promise.all(
+        terms.map(term => shard(fnv1a(term) % count).then(terms => terms.get(term) || [])));
+
+      let scores = null;
+      for (const postings of lists) {
+        const idf = Math.log(1 + docs.length / (postings.length || 1));
+        const next = new Map();
+        for (const [page, frequency] of postings) {
+          if (scores === null || scores.has(page)) {
+            next.set(page, (scores ? scores.get(page) : 0) + frequency * idf);
+          }
+        }
+        scores = next;
+      }
+      return [...scores]
+        .sort((a, b) => b[1] - a[1])
+        .slice(0, limit)
+        .map(([page, score]) => ({ url: docs[page][0], title: docs[page][1], score }));
+    };
+  }
+
+  function attach(form, search) {
+    const input = form.querySelector('input[type="search"]');
+    const list = form.querySelector('ol');
+    let latest = 0;
+    const show = async () => {
+      const query = input.value;
+      const request = ++latest;
+      const results = query.trim() ? await search(query) : [];
+      if (request !== latest) return;   // a later keystroke already answered
+      list.replaceChildren(...results.map(({ url, title }) => {
+        const link = document.createElement('a');
+        link.href = url;
+        link.textContent = title || url;
+        const item = document.createElement('li');
+        item.append(link);
+        return item;
+      }));
+      list.hidden = !results.length;
+    };
+    input.addEventListener('input', show);
+    form.addEventListener('submit', event => {
+      event.preventDefault();
+      show();
+    });
+  }
+
+  global.createSearch = createSearch;
+  if (typeof document !== 'undefined' && document.currentScript) {
+    // The index lives next to this script, whatever name it was deployed under
+    const base = new URL('.', document.currentScript.src).href;
+    const forms = () => document.querySelectorAll('form[data-search]');
+    const start = () => {
+      if (!forms().length) return;
+      const search = createSearch(base);
+      forms().forEach(form => attach(form, search));
+    };
+    if (document.readyState === 'loading') {
+      document.addEventListener('DOMContentLoaded', start);
+    } else {
+      start();
+    }
+  }
+  if (typeof module !== 'undefined') module.exports = { createSearch, tokenize, fnv1a, decodeShard };
+})(typeof window !== 'undefined' ? window : globalThis);
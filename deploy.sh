@@ -13,7 +13,9 @@ cp -r *.js deploy/ 2>/dev/null || true
 cp -r *.jpg deploy/
 cp -r *.png deploy/
 cp -r *.gif deploy/
+cp -r *.webp deploy/ 2>/dev/null || true
 cp -r *.ico deploy/ 2>/dev/null || true
+cp -r assets/ deploy/
 cp -r ch-en/ deploy/
 cp -r WHY1_files/ deploy/ 2>/dev/null || true
 cp -r WHAT_files/ deploy/ 2>/dev/null || true
@@ -28,6 +30,18 @@ cp -r T*_files/ deploy/ 2>/dev/null || true
 cp vercel.json deploy/ 2>/dev/null || true
 cp package.json deploy/ 2>/dev/null || true
 
+# Strip Word-export markup from the copied pages
+echo "Minifying HTML..."
+python3 -m dnatools.minify deploy | tail -1
+
+# Search index under deploy/search/; before deploybuild so it is precompressed too
+echo "Building search index..."
+python3 -m dnatools.searchindex deploy
+
+# Content-hashed asset names, .gz/.br siblings and cache headers
+echo "Fingerprinting and precompressing..."
+python3 -m dnatools.deploybuild deploy
+
 echo "Deployment directory created at ./deploy/"
 echo "Size: $(du -sh deploy/)"
 echo ""
@@ -0,0 +1,3 @@
+"""
+Shared helpers for the site maintenance scripts (encoding repair, HTML fixes, builds).
+"""
@@ -0,0 +1,3 @@
+from dnatools.cli import main
+
+main()
@@ -0,0 +1,99 @@
+"""
+Report what the fixers would still change on a set of pages, without writing.
+
+For every page:
+
+  encoding    stored in a legacy Chinese encoding (fix_chinese_files would convert it)
+  structure   the fix_html_structure.repair_page fixes that would fire
+  links       local src/href references that resolve to no file, or only to a
+              file whose name differs in case/normalization (dnatools.linkcheck)
+
+Each page is read and decoded once. The exit status is 1 if any page has an
+issue, so the audit can gate a commit hook.
+
+    python -m dnatools.audit                 # every page
+    python -m dnatools.audit WHY.html ch-en/*.html
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter, namedtuple
+
+from dnatools.backupstore import PROJECT_ROOT
+from dnatools.detect import detect_file
+from dnatools.fsindex import html_files, scan_tree
+from dnatools.linkcheck import FileIndex, resolve
+from dnatools.rewrite import rewrite_references
+
+# Pages with fewer Chinese characters than this are not worth converting (as in fix_chinese_files)
+CHINESE_THRESHOLD = 10
+
+Issue = namedtuple('Issue', ['page', 'kind', 'detail'])
+
+
+def _repair_page():
+    # fix_html_structure lives at the project root, outside the package
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    from fix_html_structure import repair_page
+    return repair_page
+
+
+def audit_page(page, index, root='.'):
+    """Issues found in one page; index is a linkcheck.FileIndex of the tree."""
+    issues = []
+    detection = detect_file(page)
+    if detection.encoding is None:
+        issues.append(Issue(page, 'encoding', "not UTF-8 or a recognised Chinese encoding"))
+    elif detection.encoding != 'utf-8' and detection.chinese_count > CHINESE_THRESHOLD:
+        issues.append(Issue(page, 'encoding', f"stored as {detection.encoding}"))
+
+    fixes = _repair_page()(detection.text).fixes
+    if fixes:
+        issues.append(Issue(page, 'structure', ', '.join(fixes)))
+
+    def check(url):
+        target = resolve(page, url, root)
+        if target is not None:
+            status, actual = index.lookup(target)
+            if status == 'broken':
+                issues.append(Issue(page, 'links', f"{url} -> missing {target}"))
+            elif status == 'mismatch':
+                issues.append(Issue(page, 'links', f"{url} -> only {actual} exists"))
+        return url
+
+    rewrite_references(detection.text, check)
+    return issues
+
+
+def audit(pages, root='.'):
+    """Audit pages and print their issues; returns all issues."""
+    index = FileIndex(entry for entry in scan_tree(root) if entry.kind not in ('temp', 'backup'))
+    issues = []
+    for page in pages:
+        try:
+            found = audit_page(page, index, root)
+        except OSError as e:
+            found = [Issue(page, 'error', str(e))]
+        for issue in found:
+            print(f"{issue.page}: {issue.kind}: {issue.detail}")
+        issues.extend(found)
+
+    counts = Counter(issue.kind for issue in issues)
+    affected = len({issue.page for issue in issues})
+    summary = ', '.join(f"{kind} {count}" for kind, count in sorted(counts.items()))
+    print(f"\n{affected} of {len(pages)} pages have issues{': ' + summary if summary else ''}")
+    return issues
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report what the fixers would still change, without writing.")
+    parser.add_argument('paths', nargs='*', help='pages to audit (default: every HTML page)')
+    args = parser.parse_args()
+    pages = [os.path.normpath(path) for path in args.paths] or html_files('.')
+    sys.exit(1 if audit(pages) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Content-addressed store for the pre-images of files the tools rewrite.
+
+Before a tool overwrites a file it calls snapshot() (or write_text/write_bytes); the original bytes are
+stored once under their SHA-256 (zstd-compressed if the zstandard package is
+installed, zlib otherwise) and a line (path, hash, time, tool) is appended to the
+index. Identical originals share one blob, so repeated runs cost nothing.
+
+write_text/write_bytes write a temp file next to the target and rename it over
+the target, so an interrupted run leaves every file either old or new, never
+half written.
+
+    python -m dnatools.backupstore list [PATH]
+    python -m dnatools.backupstore restore PATH [--hash H | --before TIME] [--to DEST]
+    python -m dnatools.backupstore import backups_gb18030 [--tool NAME]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+from dnatools import metrics
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.path.join(PROJECT_ROOT, '.dnatools', 'backups')
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=19).compress(data), '.zst'
+    return zlib.compress(data, 9), '.zz'
+
+
+def _decompress(blob, suffix):
+    if suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError("this blob is zstd-compressed; install the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+class BackupStore:
+    """Blobs under objects/<2 hex>/<hash>.<codec> plus an append-only index.jsonl."""
+
+    def __init__(self, store_dir=STORE_DIR, root=PROJECT_ROOT):
+        self.store_dir = store_dir
+        self.root = root
+        self.index_path = os.path.join(store_dir, 'index.jsonl')
+
+    def _key(self, filepath):
+        """Index paths relative to the project root, whatever the caller's cwd."""
+        return os.path.relpath(os.path.abspath(filepath), self.root)
+
+    def _blob_path(self, digest):
+        directory = os.path.join(self.store_dir, 'objects', digest[:2])
+        for suffix in ('.zst', '.zz'):
+            path = os.path.join(directory, digest + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, data):
+        """Store bytes once; returns their hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if self._blob_path(digest) is None:
+            blob, suffix = _compress(data)
+            directory = os.path.join(self.store_dir, 'objects', digest[:2])
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, digest + suffix)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        path = self._blob_path(digest)
+        if path is None:
+            raise KeyError(digest)
+        with open(path, 'rb') as f:
+            return _decompress(f.read(), os.path.splitext(path)[1])
+
+    def record(self, filepath, data, tool, timestamp=None):
+        """Store data as a pre-image of filepath and append it to the index."""
+        digest = self.put(data)
+        entry = {
+            'path': self._key(filepath),
+            'hash': digest,
+            'size': len(data),
+            'time': timestamp or datetime.now().isoformat(timespec='seconds'),
+            'tool': tool,
+        }
+        os.makedirs(self.store_dir, exist_ok=True)
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        # One O_APPEND write per entry keeps lines whole across worker processes
+        fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        return entry
+
+    def entries(self, filepath=None):
+        """Index entries, oldest first, optionally only those for one file."""
+        if not os.path.exists(self.index_path):
+            return []
+        key = self._key(filepath) if filepath is not None else None
+        result = []
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if key is None or entry['path'] == key:
+                    result.append(entry)
+        return result
+
+    def restore(self, filepath, digest=None, before=None, dest=None):
+        """Write a stored pre-image back; defaults to the most recent one."""
+        candidates = self.entries(filepath)
+        if digest:
+            candidates = [e for e in candidates if e['hash'].startswith(digest)]
+        if before:
+            candidates = [e for e in candidates if e['time'] < before]
+        if not candidates:
+            raise KeyError(f"no backup of {filepath} matches")
+        entry = sorted(candidates, key=lambda e: e['time'])[-1]
+        target = dest or filepath
+        # Restoring is itself a rewrite, so keep what is there now
+        if os.path.exists(target):
+            with open(target, 'rb') as f:
+                self.record(target, f.read(), 'restore')
+        replace_file(target, self.get(entry['hash']))
+        return entry
+
+
+_default_store = None
+
+
+def default_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = BackupStore()
+    return _default_store
+
+
+def snapshot(filepath, tool, data=None):
+    """Save the current contents of filepath before a tool overwrites it.
+
+    Pass data when the caller already holds the file's bytes, to skip the re-read.
+    """
+    if data is None:
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, 'rb') as f:
+            data = f.read()
+    return default_store().record(filepath, data, tool)
+
+
+def replace_file(filepath, data, encoding=None):
+    """Atomically replace filepath with data (text if encoding is given), keeping its mode."""
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    try:
+        if encoding is None:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        else:
+            with open(tmp_path, 'w', encoding=encoding) as f:
+                f.write(data)
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, tmp_path)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_text(filepath, content, tool, encoding='utf-8'):
+    """Snapshot filepath, then atomically overwrite it with content."""
+    with metrics.stage('write'):
+        snapshot(filepath, tool)
+        replace_file(filepath, content, encoding)
+
+
+def write_bytes(filepath, data, tool, original=None):
+    """Snapshot filepath (or the given original bytes), then atomically overwrite it with data."""
+    with metrics.stage('write'):
+        snapshot(filepath, tool, original)
+        replace_file(filepath, data)
+
+
+def import_folder(store, folder, tool):
+    """Ingest an old full-copy backup folder; its files map to the same names at the root."""
+    count = 0
+    for directory, _, names in os.walk(folder):
+        for name in names:
+            source = os.path.join(directory, name)
+            original = os.path.join(store.root, os.path.relpath(source, folder))
+            with open(source, 'rb') as f:
+                data = f.read()
+            timestamp = datetime.fromtimestamp(os.path.getmtime(source)).isoformat(timespec='seconds')
+            store.record(original, data, tool, timestamp=timestamp)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, restore or import stored pre-images.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='show stored pre-images')
+    list_parser.add_argument('path', nargs='?')
+
+    restore_parser = commands.add_parser('restore', help='write a pre-image back')
+    restore_parser.add_argument('path')
+    restore_parser.add_argument('--hash', help='hash (or prefix) of the version to restore')
+    restore_parser.add_argument('--before', help='latest version saved before this ISO time')
+    restore_parser.add_argument('--to', help='write here instead of over the original')
+
+    import_parser = commands.add_parser('import', help='ingest a backups_gb18030-style folder')
+    import_parser.add_argument('folders', nargs='+')
+    import_parser.add_argument('--tool', help='tool name to record (default: the folder name)')
+
+    args = parser.parse_args()
+    store = default_store()
+
+    if args.command == 'list':
+        for entry in store.entries(args.path):
+            print(f"{entry['time']}  {entry['hash'][:12]}  {entry['size']:8}  {entry['tool']:20}  {entry['path']}")
+    elif args.command == 'restore':
+        try:
+            entry = store.restore(args.path, args.hash, args.before, args.to)
+        except KeyError as e:
+            print(e.args[0])
+            sys.exit(1)
+        print(f"Restored {args.to or args.path} from {entry['time']} ({entry['tool']}, {entry['hash'][:12]})")
+    elif args.command == 'import':
+        for folder in args.folders:
+            count = import_folder(store, folder, args.tool or os.path.basename(os.path.normpath(folder)))
+            print(f"Imported {count} files from {folder}")
+
+
+if __name__ == "__main__":
+    main()
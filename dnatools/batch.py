@@ -0,0 +1,115 @@
+"""
+Run a per-file fixer over many files, optionally across a process pool.
+
+Files are spread over the workers in chunks of roughly equal total size, and the
+per-file results always come back in the order the files were given.
+"""
+
+import argparse
+import heapq
+import os
+from functools import partial
+
+from dnatools import metrics
+
+# Chunks handed to each worker; more than one lets fast workers pick up slack
+CHUNKS_PER_JOB = 4
+
+
+class _MetricsAction(argparse.Action):
+    """--metrics PATH: start recording as soon as the option is parsed."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, values)
+        metrics.enable(path=values)
+
+
+class _ProfileAction(argparse.Action):
+    """--profile: start cProfile as soon as the option is parsed."""
+
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(option_strings, dest, nargs=0, default=False, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, True)
+        metrics.enable(profile=True)
+
+
+def add_batch_arguments(parser):
+    """Add the options shared by every tree-wide fixer to an argparse parser."""
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (0 = one per CPU, default: 1)')
+    parser.add_argument('--force', action='store_true',
+                        help='reprocess files even if the manifest says they are unchanged')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run, skipping the files it completed (even with --force)')
+    parser.add_argument('--metrics', metavar='OUT.jsonl', action=_MetricsAction,
+                        help='write per-file timing records here and print the slowest files and stages')
+    parser.add_argument('--profile', action=_ProfileAction,
+                        help='run under cProfile and print the top functions (best with -j 1)')
+    return parser
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def balanced_chunks(paths, count):
+    """Split paths into at most `count` lists of (index, path) with similar total size."""
+    count = max(1, min(count, len(paths)))
+    order = sorted(range(len(paths)), key=lambda i: _file_size(paths[i]), reverse=True)
+
+    # Largest file first onto the lightest chunk
+    heap = [(0, n) for n in range(count)]
+    chunks = [[] for _ in range(count)]
+    for i in order:
+        load, n = heapq.heappop(heap)
+        chunks[n].append((i, paths[i]))
+        heapq.heappush(heap, (load + _file_size(paths[i]), n))
+
+    return [chunk for chunk in chunks if chunk]
+
+
+def _run_chunk(func, chunk):
+    return [(i, func(path)) for i, path in chunk]
+
+
+def run_batch(func, paths, jobs=1):
+    """Call func(path) for every path and return the results in input order.
+
+    func must be a module-level function so it can be sent to worker processes.
+    """
+    paths = list(paths)
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+
+    if not metrics.recording():
+        return _run(func, paths, jobs)
+
+    # Records are built where each file is processed and travel back with its result
+    results = []
+    for result, record in _run(partial(metrics.measured_call, func), paths, jobs):
+        metrics.add_record(record)
+        results.append(result)
+    return results
+
+
+def _run(func, paths, jobs):
+    if jobs == 1 or len(paths) < 2:
+        return [func(path) for path in paths]
+
+    # Imported here: loading multiprocessing costs more than a one-file run
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = [None] * len(paths)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_run_chunk, func, chunk)
+                   for chunk in balanced_chunks(paths, jobs * CHUNKS_PER_JOB)]
+        for future in futures:
+            for i, result in future.result():
+                results[i] = result
+
+    return results
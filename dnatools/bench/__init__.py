@@ -0,0 +1,9 @@
+"""
+Throughput benchmarks for the fixers, over a synthetic legacy-encoding corpus.
+
+dnatools.bench.corpus generates reproducible Word-export-style pages;
+dnatools.bench.run times the detection, conversion, structure, rename and
+styling stages over them and stores the numbers as JSON per commit.
+
+    python -m dnatools.bench --pages 300 --max-size 400000
+"""
@@ -0,0 +1,3 @@
+from dnatools.bench.run import main
+
+main()
@@ -0,0 +1,192 @@
+"""
+Deterministic corpus of Word-export-style pages in the site's legacy encodings.
+
+Page i of a corpus is generated from random.Random(f"{seed}:{i}") alone, so the
+same parameters always produce the same bytes on every machine. Pages cycle
+through ENCODINGS and declare their charset the way Word did; their sizes are
+spread log-uniformly between min_size and max_size (the largest real page,
+CH-EN10-P4.html, is about 400 KB). Every page has what the fixers look for:
+
+  - Chinese paragraphs in mso-styled spans, mixed with English text
+  - image references using the Chinese names update_filenames.py rewrites
+  - now and then an early </body></html> or a missing closing tag
+
+The Chinese text only uses characters that exist in both GB2312 and Big5, so
+every encoding can represent every page.
+
+    python -m dnatools.bench.corpus /tmp/corpus --pages 100
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+from functools import lru_cache
+
+ENCODINGS = ('gb2312', 'gbk', 'gb18030', 'big5', 'utf-8')
+DEFAULT_PAGES = 100
+DEFAULT_MIN_SIZE = 4 * 1024
+DEFAULT_MAX_SIZE = 400 * 1024
+DEFAULT_SEED = 1
+CORPUS_FILE = 'corpus.json'
+
+_IMAGE_NAMES = ('英文B1封面.jpg', '英文B2封面.jpg', '中文E.jpg', '法文E.jpg', '末代公主.jpg',
+                '1英文.jpg', '2中文.jpg', 'image001.jpg', 'image002.gif')
+
+_WORDS = ('DNA', 'sequence', 'chromosome', 'mitochondrial', 'haplogroup', 'origin', 'species',
+          'human', 'analysis', 'the', 'of', 'and', 'in', 'decoding', 'ancestor', 'marker',
+          'primate', 'genome', 'difference', 'nucleotide', 'evolution', 'research')
+
+_HEAD = '''<html xmlns:v="urn:schemas-microsoft-com:vml"
+xmlns:o="urn:schemas-microsoft-com:office:office"
+xmlns:w="urn:schemas-microsoft-com:office:word"
+xmlns="http://www.w3.org/TR/REC-html40">
+<head>
+<meta http-equiv=Content-Type content="text/html; charset={charset}">
+<meta name=ProgId content=Word.Document>
+<meta name=Generator content="Microsoft Word 11">
+<title>{title}</title>
+<!--[if gte mso 9]><xml>
+ <o:DocumentProperties><o:Author>DNA</o:Author></o:DocumentProperties>
+</xml><![endif]-->
+<style>
+<!--
+p.MsoNormal, li.MsoNormal, div.MsoNormal
+	{{mso-style-parent:"";margin:0in;margin-bottom:.0001pt;mso-pagination:widow-orphan;
+	font-size:12.0pt;font-family:"Times New Roman";mso-fareast-font-family:SimSun;}}
+@page Section1 {{size:8.5in 11.0in;margin:1.0in 1.25in 1.0in 1.25in;mso-header-margin:.5in;}}
+div.Section1 {{page:Section1;}}
+-->
+</style>
+</head>
+<body lang=EN-US link=blue vlink=purple style='tab-interval:.5in'>
+<div class=Section1>
+'''
+
+_TAIL = '''</div>
+</body>
+</html>
+'''
+
+
+@lru_cache(maxsize=1)
+def _hanzi():
+    """Level-1 GB2312 characters that Big5 can also encode."""
+    chars = []
+    for lead in range(0xB0, 0xD8):
+        for trail in range(0xA1, 0xFF):
+            try:
+                char = bytes([lead, trail]).decode('gb2312')
+                char.encode('big5')
+            except UnicodeError:
+                continue
+            chars.append(char)
+    return chars
+
+
+def _chinese(rng, length):
+    return ''.join(rng.choices(_hanzi(), k=length))
+
+
+def _english(rng, count):
+    return ' '.join(rng.choices(_WORDS, k=count))
+
+
+def _paragraph(rng, stem):
+    kind = rng.random()
+    if kind < 0.1:
+        name = rng.choice(_IMAGE_NAMES)
+        return (f"<p class=MsoNormal align=center style='text-align:center'><span lang=ZH-CN>"
+                f"<img width={rng.randrange(200, 600)} height={rng.randrange(100, 400)} "
+                f"src=\"{stem}_files/{name}\" v:shapes=\"_x0000_i{rng.randrange(1025, 1100)}\"></span></p>\n")
+    if kind < 0.15:
+        return (f"<p class=MsoNormal><a href=\"{rng.choice(_IMAGE_NAMES)}\"><span lang=ZH-CN>"
+                f"{_chinese(rng, rng.randrange(4, 12))}</span></a><o:p></o:p></p>\n")
+    return (f"<p class=MsoNormal style='mso-outline-level:{rng.randrange(1, 5)}'>"
+            f"<b style='mso-bidi-font-weight:normal'><span lang=ZH-CN style='font-size:14.0pt;"
+            f"font-family:SimSun;mso-ascii-font-family:\"Times New Roman\"'>{_chinese(rng, rng.randrange(20, 120))}"
+            f"</span></b><span lang=EN-US style='font-size:14.0pt'>{_english(rng, rng.randrange(3, 30))}"
+            f"<o:p></o:p></span></p>\n")
+
+
+def generate_page(index, encoding, size, seed=DEFAULT_SEED):
+    """Bytes of page `index`: a Word-export page of roughly `size` bytes in `encoding`."""
+    rng = random.Random(f"{seed}:{index}")
+    stem = f"page{index:05}"
+    parts = [_HEAD.format(charset=encoding, title=_chinese(rng, 8))]
+    length = len(parts[0])
+    defect = rng.random()
+    early_end = defect < 0.1
+    while length < size:
+        paragraph = _paragraph(rng, stem)
+        if early_end and length > size / 2:
+            paragraph += '</body>\n</html>\n'
+            early_end = False
+        parts.append(paragraph)
+        # Two bytes per Chinese character in the legacy encodings, three in UTF-8
+        length += len(paragraph.encode(encoding, 'xmlcharrefreplace'))
+    if defect > 0.9:
+        parts.append('</div>\n')       # missing </body></html>
+    else:
+        parts.append(_TAIL)
+    return ''.join(parts).encode(encoding, 'xmlcharrefreplace')
+
+
+def page_sizes(pages, min_size, max_size, seed=DEFAULT_SEED):
+    """Log-uniform page sizes, fixed by the seed."""
+    rng = random.Random(f"{seed}:sizes")
+    low, high = math.log(min_size), math.log(max(min_size, max_size))
+    return [int(math.exp(rng.uniform(low, high))) for _ in range(pages)]
+
+
+def generate_corpus(directory, pages=DEFAULT_PAGES, min_size=DEFAULT_MIN_SIZE,
+                    max_size=DEFAULT_MAX_SIZE, seed=DEFAULT_SEED):
+    """Write the corpus into directory (reused if already generated); returns the page paths."""
+    params = {'pages': pages, 'min_size': min_size, 'max_size': max_size, 'seed': seed,
+              'encodings': list(ENCODINGS)}
+    paths = [os.path.join(directory, f"page{i:05}.html") for i in range(pages)]
+    marker = os.path.join(directory, CORPUS_FILE)
+    try:
+        with open(marker, 'r', encoding='utf-8') as f:
+            if json.load(f) == params and all(os.path.exists(path) for path in paths):
+                return paths
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(directory, exist_ok=True)
+    for old in os.listdir(directory):
+        if old.startswith('page') and old.endswith('.html'):
+            os.remove(os.path.join(directory, old))
+    for i, (path, size) in enumerate(zip(paths, page_sizes(pages, min_size, max_size, seed))):
+        with open(path, 'wb') as f:
+            f.write(generate_page(i, ENCODINGS[i % len(ENCODINGS)], size, seed))
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=1)
+    return paths
+
+
+def add_corpus_arguments(parser):
+    """Options describing a corpus, shared with dnatools.bench.run."""
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES, help=f'number of pages (default: {DEFAULT_PAGES})')
+    parser.add_argument('--min-size', type=int, default=DEFAULT_MIN_SIZE,
+                        help=f'smallest page in bytes (default: {DEFAULT_MIN_SIZE})')
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_SIZE,
+                        help=f'largest page in bytes (default: {DEFAULT_MAX_SIZE})')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f'corpus seed (default: {DEFAULT_SEED})')
+    return parser
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic legacy-encoding page corpus.")
+    parser.add_argument('directory', help='where to write the pages')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.directory, args.pages, args.min_size, args.max_size, args.seed)
+    total = sum(os.path.getsize(path) for path in paths)
+    print(f"{len(paths)} pages, {total / 1e6:.1f} MB in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
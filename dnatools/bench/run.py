@@ -0,0 +1,177 @@
+"""
+Time the fixer stages over a synthetic corpus and store the results as JSON.
+
+Stages (each runs in its own fresh interpreter so its peak RSS is its own):
+
+  detection   dnatools.detect.detect_bytes on the raw bytes
+  conversion  detect, relabel the charset and encode as UTF-8
+  structure   fix_html_structure.repair_structure
+  rename      update_filenames.FILENAME_REWRITER
+  styling     tools.update_styling.restyle
+
+Inputs are read (and for the text stages decoded) before the clock starts. Each
+stage runs --repeat times and the fastest run counts. Results go to
+.dnatools/bench/<commit>.json; --compare prints the change against an earlier file.
+
+    python -m dnatools.bench --pages 300
+    python -m dnatools.bench --stages detection conversion --compare .dnatools/bench/4d2c255.json
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows; peak RSS is reported as null
+    resource = None
+
+from dnatools.backupstore import PROJECT_ROOT
+from dnatools.bench.corpus import add_corpus_arguments, generate_corpus
+from dnatools.detect import detect_bytes, relabel_charset
+
+BENCH_DIR = os.path.join('.dnatools', 'bench')
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+DEFAULT_REPEAT = 3
+
+# name -> (module, attribute, input): input is 'raw' bytes or decoded 'text'
+STAGES = {
+    'detection': ('dnatools.detect', 'detect_bytes', 'raw'),
+    'conversion': ('dnatools.bench.run', 'convert', 'raw'),
+    'structure': ('fix_html_structure', 'repair_structure', 'text'),
+    'rename': ('update_filenames', 'FILENAME_REWRITER.rewrite', 'text'),
+    'styling': ('tools.update_styling', 'restyle', 'text'),
+}
+
+
+def convert(raw):
+    """What the encoding fixers do per page: decode, relabel, encode as UTF-8."""
+    return relabel_charset(detect_bytes(raw).text).encode('utf-8')
+
+
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_stage(name, paths, repeat=DEFAULT_REPEAT):
+    """Time one stage over paths in this process; returns its result dict."""
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    module, attribute, kind = STAGES[name]
+    func = importlib.import_module(module)
+    for part in attribute.split('.'):
+        func = getattr(func, part)
+
+    raws = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            raws.append(f.read())
+    if kind == 'text':
+        inputs = [detect_bytes(raw).text for raw in raws]
+    else:
+        inputs = raws
+
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        for item in inputs:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    size = sum(len(raw) for raw in raws)
+    return {
+        'files': len(paths),
+        'bytes': size,
+        'seconds': round(best, 6),
+        'files_per_sec': round(len(paths) / best, 2) if best else None,
+        'mb_per_sec': round(size / 1e6 / best, 3) if best else None,
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def run_isolated(name, paths, repeat=DEFAULT_REPEAT):
+    """run_stage in a freshly spawned interpreter."""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_stage, name, paths, repeat).result()
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, previous):
+    """Print files/sec of each stage against an earlier results file."""
+    print(f"\nAgainst {previous['commit']} ({previous['timestamp']}):")
+    for name, stage in results['stages'].items():
+        before = previous.get('stages', {}).get(name)
+        if not before or not before.get('files_per_sec') or not stage['files_per_sec']:
+            continue
+        ratio = stage['files_per_sec'] / before['files_per_sec']
+        print(f"  {name:11} {ratio:6.2f}x  ({before['files_per_sec']:.1f} -> {stage['files_per_sec']:.1f} files/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fixer stages on a synthetic corpus.")
+    add_corpus_arguments(parser)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='stages to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f'runs per stage, fastest counts (default: {DEFAULT_REPEAT})')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help=f'corpus directory (default: {CORPUS_DIR})')
+    parser.add_argument('-o', '--output', help=f'results file (default: {BENCH_DIR}/<commit>.json)')
+    parser.add_argument('--compare', metavar='RESULTS', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.corpus, args.pages, args.min_size, args.max_size, args.seed)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"Corpus: {len(paths)} pages, {size / 1e6:.1f} MB ({args.corpus})")
+
+    commit = current_commit()
+    results = {
+        'commit': commit,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {'pages': args.pages, 'min_size': args.min_size, 'max_size': args.max_size,
+                   'seed': args.seed, 'bytes': size},
+        'repeat': args.repeat,
+        'stages': {},
+    }
+    for name in args.stages:
+        stage = run_isolated(name, paths, args.repeat)
+        results['stages'][name] = stage
+        print(f"{name:11} {stage['files_per_sec']:9.1f} files/s {stage['mb_per_sec']:8.2f} MB/s "
+              f"peak {stage['peak_rss_kb'] or 0:8} KB")
+
+    output = args.output or os.path.join(BENCH_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+        f.write('\n')
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
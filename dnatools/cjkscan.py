@@ -0,0 +1,272 @@
+"""
+Classify the encoding of a page from its raw bytes, without decoding it.
+
+Works on anything that exposes the buffer protocol (bytes, memoryview, mmap), so
+files can be scanned straight from a memory map. When NumPy is installed the
+lead/trail byte range checks for GB2312/GBK/Big5 and the UTF-8 validity check run
+vectorized over the whole buffer; otherwise a regex tokenizer plus a Counter of
+distinct characters does the same job.
+
+    python -m dnatools.cjkscan backups_gb18030/ WHY.html
+"""
+
+import mmap
+import os
+import re
+import sys
+from collections import Counter, namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # optional; the pure-Python scan gives the same answers
+    np = None
+
+# Candidates in order of preference when two of them score the same
+CANDIDATES = ['gb2312', 'gb18030', 'gbk', 'big5', 'utf-8']
+
+Classification = namedtuple('Classification', ['encoding', 'confidence', 'chinese_count'])
+
+# Below this a legacy buffer is not taken for CJK at all (Latin-1/cp1252 pages
+# score near 0, real GBK/Big5 pages above 0.75); encoding is None then
+MIN_CONFIDENCE = 0.3
+
+# Weight of a valid, frequently used character vs. a valid but rare one
+_COMMON = 1.0
+_RARE = 0.5
+_INVALID = -2.0
+
+_HANZI = re.compile('[\u4e00-\u9fff]')
+
+# One token per multi-byte character (or stray high byte); ASCII is skipped entirely
+_MULTIBYTE = re.compile(
+    rb'[\x81-\xfe][\x30-\x39][\x81-\xfe][\x30-\x39]'   # gb18030 four-byte sequence
+    rb'|[\x81-\xfe][\x40-\x7e\x80-\xfe]'                # double-byte character
+    rb'|[\x80-\xff]'                                    # lone high byte
+)
+
+
+# The range predicates below only use & | ^ and comparisons, so they work the same
+# on plain ints (one character at a time) and on NumPy arrays (all at once).
+# Each returns (valid, common, hanzi) masks.
+
+def _in(byte, low, high):
+    return (byte >= low) & (byte <= high)
+
+
+def _gb2312(lead, trail):
+    valid = _in(lead, 0xA1, 0xF7) & _in(trail, 0xA1, 0xFE)
+    return valid, valid & _in(lead, 0xB0, 0xD7), valid & _in(lead, 0xB0, 0xF7)
+
+
+def _gbk(lead, trail):
+    valid = _in(lead, 0x81, 0xFE) & (_in(trail, 0x40, 0x7E) | _in(trail, 0x80, 0xFE))
+    gb_valid, gb_common, gb_hanzi = _gb2312(lead, trail)
+    # GBK extension areas (GBK/3, GBK/4, GBK/5) are almost all hanzi
+    extension = valid & (gb_valid ^ True)
+    return valid, gb_common, gb_hanzi | (extension & (_in(lead, 0xA1, 0xA9) ^ True))
+
+
+def _big5(lead, trail):
+    valid = _in(lead, 0xA1, 0xF9) & (_in(trail, 0x40, 0x7E) | _in(trail, 0xA1, 0xFE))
+    common = valid & _in(lead, 0xA4, 0xC6)
+    return valid, common, common | (valid & _in(lead, 0xC9, 0xF9))
+
+
+_CLASSIFIERS = {
+    'gb2312': _gb2312,
+    'gb18030': _gbk,
+    'gbk': _gbk,
+    'big5': _big5,
+}
+
+
+def _score(common, valid, pairs, invalid_units):
+    return _COMMON * common + _RARE * (valid - common) + _INVALID * (pairs - valid + invalid_units)
+
+
+def _score_legacy_python(buf):
+    units = Counter(_MULTIBYTE.findall(buf))
+    counts = {encoding: [0, 0, 0] for encoding in _CLASSIFIERS}   # valid, common, hanzi
+    pairs = lone = four_byte = 0
+
+    for unit, count in units.items():
+        if len(unit) == 1:
+            lone += count
+        elif len(unit) == 4:
+            four_byte += count
+        else:
+            pairs += count
+            for encoding, classify_pair in _CLASSIFIERS.items():
+                masks = classify_pair(unit[0], unit[1])
+                for n, mask in enumerate(masks):
+                    if mask:
+                        counts[encoding][n] += count
+
+    return counts, pairs, lone, four_byte
+
+
+def _score_legacy_numpy(b):
+    n = b.size
+    padded = np.concatenate((b, np.zeros(3, dtype=np.uint8)))
+    # 0xFF is never part of a character: a lone byte that ends the run like ASCII
+    high = (b >= 0x80) & (b != 0xFF)
+
+    # The tokenizer takes characters two bytes at a time through a run of high
+    # bytes, except that a 0x80 in lead position goes alone; either way the
+    # byte after a 0x80 starts a character, so every such byte restarts the
+    # count. The last lead of an odd-length run takes the following
+    # (ASCII-range) byte as trail.
+    index = np.arange(n)
+    previous = np.concatenate(([0], b[:-1]))
+    run_start = high & (np.concatenate(([True], ~high[:-1])) | (previous == 0x80))
+    run_origin = np.maximum.accumulate(np.where(run_start, index, 0))
+    leads = np.flatnonzero(high & (((index - run_origin) & 1) == 0))
+
+    # gb18030 four-byte sequences: lead, digit, lead, digit. In a chain of them
+    # (lead, digit, lead, digit, lead, digit, ...) only every other lead starts
+    # one; the lead in between is its second half
+    four = (_in(padded[leads], 0x81, 0xFE) & _in(padded[leads + 1], 0x30, 0x39)
+            & _in(padded[leads + 2], 0x81, 0xFE) & _in(padded[leads + 3], 0x30, 0x39))
+    chained = np.concatenate(([False], four[:-1] & (leads[1:] == leads[:-1] + 2)))
+    position = np.arange(leads.size)
+    chain_origin = np.maximum.accumulate(np.where(chained, 0, position))
+    second_half = chained & (((position - chain_origin) & 1) == 1)
+    four &= ~second_half
+    leads = leads[~four & ~second_half]
+
+    lead, trail = padded[leads], padded[leads + 1]
+    paired = _in(lead, 0x81, 0xFE) & (_in(trail, 0x40, 0x7E) | _in(trail, 0x80, 0xFE))
+    lead, trail = lead[paired], trail[paired]
+
+    counts = {}
+    for encoding, classify_pair in _CLASSIFIERS.items():
+        counts[encoding] = [int(np.count_nonzero(mask)) for mask in classify_pair(lead, trail)]
+
+    lone = int(np.count_nonzero(~paired)) + int(np.count_nonzero(b == 0xFF))
+    return counts, int(lead.size), lone, int(np.count_nonzero(four))
+
+
+def _utf8_numpy(b):
+    """Return (is_valid_utf8, hanzi_count) without decoding."""
+    n = b.size
+    nxt = np.concatenate((b[1:], np.zeros(1, dtype=np.uint8)))
+    cont = (b & 0xC0) == 0x80
+    lead2 = _in(b, 0xC2, 0xDF)
+    lead3 = (b & 0xF0) == 0xE0
+    lead4 = _in(b, 0xF0, 0xF4)
+
+    if np.any((b >= 0x80) & ~cont & ~lead2 & ~lead3 & ~lead4):
+        return False, 0
+    # Overlong forms and surrogates are decided by the second byte
+    if np.any(((b == 0xE0) & (nxt < 0xA0)) | ((b == 0xED) & (nxt >= 0xA0))
+              | ((b == 0xF0) & (nxt < 0x90)) | ((b == 0xF4) & (nxt >= 0x90))):
+        return False, 0
+
+    # Every continuation byte must be claimed by exactly the lead before it
+    expected = np.zeros(n + 3, dtype=bool)
+    expected[1:n + 1] |= lead2 | lead3 | lead4
+    expected[2:n + 2] |= lead3 | lead4
+    expected[3:n + 3] |= lead4
+    if expected[n:].any() or not np.array_equal(expected[:n], cont):
+        return False, 0
+
+    hanzi = _in(b, 0xE5, 0xE9) | ((b == 0xE4) & (nxt >= 0xB8))
+    return True, int(np.count_nonzero(hanzi))
+
+
+def is_valid_utf8(buf):
+    """True if the whole buffer is valid UTF-8 (vectorized when NumPy is available)."""
+    if np is not None:
+        return len(buf) == 0 or _utf8_numpy(np.frombuffer(buf, dtype=np.uint8))[0]
+    try:
+        str(buf, 'utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def classify_buffer(buf, use_numpy=None):
+    """Classify a bytes-like buffer; returns (Classification, text_or_None).
+
+    The encoding is None when the buffer is neither UTF-8 nor convincingly one
+    of the CJK codecs.
+    The pure-Python path has to decode to validate UTF-8, so it hands the text
+    back to avoid a second decode; the NumPy path never decodes.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if bytes(buf[:3]) == b'\xef\xbb\xbf':
+        buf = memoryview(buf)[3:]
+    if len(buf) == 0:
+        return Classification('utf-8', 1.0, 0), ''
+
+    if use_numpy:
+        b = np.frombuffer(buf, dtype=np.uint8)
+        is_utf8, hanzi = _utf8_numpy(b)
+        if is_utf8:
+            return Classification('utf-8', 1.0, hanzi), None
+        counts, pairs, lone, four_byte = _score_legacy_numpy(b)
+    else:
+        try:
+            text = str(buf, 'utf-8')
+        except UnicodeDecodeError:
+            pass
+        else:
+            return Classification('utf-8', 1.0, len(_HANZI.findall(text))), text
+        counts, pairs, lone, four_byte = _score_legacy_python(buf)
+
+    scores = {}
+    for encoding, (valid, common, hanzi) in counts.items():
+        four_byte_weight = _RARE if encoding == 'gb18030' else _INVALID
+        scores[encoding] = (_score(common, valid, pairs, lone)
+                            + four_byte_weight * four_byte)
+
+    best_encoding = CANDIDATES[0]
+    for encoding in CANDIDATES[1:-1]:
+        if scores[encoding] > scores[best_encoding]:
+            best_encoding = encoding
+
+    total = pairs + lone + four_byte
+    confidence = max(0.0, min(1.0, scores[best_encoding] / total)) if total else 0.0
+    if confidence < MIN_CONFIDENCE:
+        return Classification(None, confidence, 0), None
+    chinese_count = counts[best_encoding][2]
+    if best_encoding == 'gb18030':
+        chinese_count += four_byte
+    return Classification(best_encoding, confidence, chinese_count), None
+
+
+def open_buffer(filepath):
+    """Memory-map a file read-only; empty files (which cannot be mapped) give b''."""
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def classify_file(filepath):
+    """Classify a file straight from a memory map, without decoding it."""
+    buf = open_buffer(filepath)
+    try:
+        return classify_buffer(buf)[0]
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+def main():
+    """Print the classification of every HTML file under the given paths."""
+    for root in sys.argv[1:] or ['.']:
+        if os.path.isfile(root):
+            paths = [root]
+        else:
+            paths = [os.path.join(directory, name)
+                     for directory, _, names in os.walk(root)
+                     for name in names if name.endswith(('.html', '.htm'))]
+        for filepath in sorted(paths):
+            result = classify_file(filepath)
+            print(f"{result.encoding or '-':8} {result.confidence:5.2f} {result.chinese_count:7}  {filepath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+One entry point for the page tools: python -m dnatools <command> [files...]
+
+    detect     print the encoding each page is stored in
+    convert    convert legacy-encoded pages to UTF-8 (fix_chinese_files)
+    structure  repair the HTML structure and charset (fix_html_structure)
+    mojibake   repair garbled Chinese with the table learned from the backups
+    rename     rewrite references to renamed files (update_filenames)
+    restyle    rebuild Word pages in the modern layout (tools/update_styling)
+    audit      report what the fixers would still change, without writing
+    build      render pages into the site layout (dnatools.sitebuild)
+
+Files can be given as paths or globs (quoted globs are expanded here, '**'
+included), and '-' reads more of them from stdin, one per line:
+
+    python -m dnatools structure T18-1END.html
+    python -m dnatools convert 'ch-en/*.html' -j 0
+    git diff --name-only -- '*.html' | python -m dnatools audit -
+
+Only argparse and the options are loaded up front; each command imports the
+modules it needs when it runs, so a one-file call from an editor hook starts
+about as fast as the interpreter does.
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+from dnatools.batch import add_batch_arguments
+
+
+def expand_paths(patterns, stdin=None):
+    """Paths named by patterns: globs expanded, '-' replaced by the lines of stdin, duplicates dropped."""
+    paths = []
+    for pattern in patterns:
+        if pattern == '-':
+            lines = (stdin or sys.stdin).read().splitlines()
+            paths.extend(expand_paths([line.strip() for line in lines if line.strip()]))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                print(f"No files match {pattern}")
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(os.path.normpath(path) for path in paths))
+
+
+def _project_import(module):
+    # The fixer scripts live at the project root, outside the package
+    from dnatools.backupstore import PROJECT_ROOT
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    import importlib
+    return importlib.import_module(module)
+
+
+def _all_pages(suffixes=('.html',)):
+    from dnatools.fsindex import html_files
+    return html_files('.', suffixes=suffixes)
+
+
+def _detect(args, paths):
+    if args.sniff:
+        from dnatools.sniff import sniff_encoding
+        for path in paths:
+            with open(path, 'rb') as f:
+                sniff = sniff_encoding(f.read())
+            print(f"{path}: {sniff.encoding} ({sniff.tier}, confidence {sniff.confidence:.2f})")
+    else:
+        from dnatools.detect import detect_file
+        for path in paths:
+            detection = detect_file(path)
+            print(f"{path}: {detection.encoding or 'not recognised'} (confidence {detection.confidence:.2f}, "
+                  f"{detection.chinese_count} Chinese characters)")
+
+
+def _convert(args, paths):
+    fix_chinese_files = _project_import('fix_chinese_files')
+    fix_chinese_files.convert_files(paths or _all_pages(), args.jobs, args.force, args.resume)
+
+
+def _structure(args, paths):
+    fix_html_structure = _project_import('fix_html_structure')
+    fix_html_structure.fix_files(paths or _all_pages(), args.jobs, args.force, args.resume)
+
+
+def _mojibake(args, paths):
+    from dnatools import mojibake
+    mojibake.repair_files(paths or _all_pages(), args.jobs, args.force, args.resume)
+
+
+def _rename(args, paths):
+    update_filenames = _project_import('update_filenames')
+    paths = paths or _all_pages()
+    if args.indexed:
+        paths = update_filenames.indexed_pages(paths)
+        if paths is None:
+            sys.exit("No reference index yet; run python -m dnatools.linkcheck first")
+        # The index only knows src/href values, so running text is left alone
+        args.attributes_only = True
+    update_filenames.update_files(paths, args.attributes_only, args.jobs, args.force, args.resume)
+
+
+def _restyle(args, paths):
+    update_styling = _project_import('tools.update_styling')
+    update_styling.restyle_files(paths)
+
+
+def _audit(args, paths):
+    from dnatools.audit import audit
+    if audit(paths or _all_pages(suffixes=('.html', '.htm'))):
+        sys.exit(1)
+
+
+def _build(args, paths):
+    from dnatools import sitebuild
+    if args.lang and args.lang not in sitebuild.LANGUAGES:
+        sys.exit(f"Unknown language {args.lang} (known: {', '.join(sitebuild.LANGUAGES)})")
+    sitebuild.build(paths, args.lang, jobs=args.jobs, force=args.force, resume=args.resume)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m dnatools', description="Site maintenance tools.")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+
+    def add(name, handler, help, paths_help, required=False, batch=False):
+        command = commands.add_parser(name, help=help, description=help)
+        command.add_argument('paths', nargs='+' if required else '*', metavar='FILE', help=paths_help)
+        if batch:
+            add_batch_arguments(command)
+        command.set_defaults(handler=handler)
+        return command
+
+    detect = add('detect', _detect, 'print the encoding each page is stored in', 'pages or globs', required=True)
+    detect.add_argument('--sniff', action='store_true',
+                        help='use the quick BOM/meta/chardet sniff instead of the full scan')
+    add('convert', _convert, 'convert legacy-encoded pages to UTF-8',
+        'pages or globs (default: every .html page)', batch=True)
+    add('structure', _structure, 'repair the HTML structure and charset declaration',
+        'pages or globs (default: every .html page)', batch=True)
+    add('mojibake', _mojibake, 'repair garbled Chinese with the table learned from the backups',
+        'pages or globs (default: every .html page)', batch=True)
+    rename = add('rename', _rename, 'rewrite references to renamed files',
+                 'pages or globs (default: every .html page)', batch=True)
+    rename.add_argument('--attributes-only', action='store_true',
+                        help='only rewrite src/href attribute values, not running text')
+    rename.add_argument('--indexed', action='store_true',
+                        help='only open pages the reference index lists as using an old name '
+                             '(implies --attributes-only)')
+    add('restyle', _restyle, 'rebuild Word-exported pages in the modern layout', 'pages or globs', required=True)
+    add('audit', _audit, 'report what the fixers would still change, without writing',
+        'pages or globs (default: every page)')
+    build = add('build', _build, 'render pages into the site layout',
+                'pages or globs (default: every page already migrated)', batch=True)
+    build.add_argument('--lang', help='output language directory for new pages')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    paths = expand_paths(args.paths)
+    if not paths and args.paths:
+        # Only empty globs or an empty stdin: do not fall back to the whole site
+        parser.exit(1, "No files to process\n")
+    args.handler(args, paths)
+
+
+if __name__ == "__main__":
+    main()
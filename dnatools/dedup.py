@@ -0,0 +1,231 @@
+"""
+Find byte-identical Word-export assets (the *_files directories) and store each once.
+
+The same image001.jpg ... imageNNN.jpg, filelist.xml and page copies appear under
+the root CHT*-P*_files directories, under ch-en/ and again under deploy/. Files
+are grouped by size first and only same-size files are hashed. Each group keeps
+one canonical copy (the shortest path outside deploy/); the others are then either
+
+  --link     replaced by hardlinks to the canonical copy (default), or
+  --rewrite  no longer referenced: src/href values in the pages are pointed at the
+             canonical copy, and with --prune duplicates that no page references
+             any more are deleted (their bytes go to the backup store first).
+
+Pages in deploy/ are only ever pointed at canonical copies inside deploy/, so the
+deploy tree stays self-contained. Root-absolute URLs (/CHT7-P1_files/image001.jpg)
+resolve against the site root of the page's tree (deploy/ for deploy pages) and
+stay root-absolute. Nothing is pruned when a page could not be read, since its
+references are unknown.
+
+    python -m dnatools.dedup --dry-run
+    python -m dnatools.dedup --rewrite --prune
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from urllib.parse import quote
+
+from dnatools.backupstore import snapshot, write_bytes
+from dnatools.detect import detect_bytes
+from dnatools.fsindex import DEFAULT_SKIP_DIRS, scan_tree
+from dnatools.manifest import file_hash
+from dnatools.rewrite import resolve_local, rewrite_references
+
+ASSET_DIR_SUFFIX = '_files'
+DEPLOY_DIR = 'deploy'
+
+# deploy/ is a copy of the site, which is exactly where most duplicates live
+SKIP_DIRS = DEFAULT_SKIP_DIRS - {DEPLOY_DIR}
+
+TOOL = 'dedup'
+
+
+def is_export_asset(path):
+    """True for files inside a Word-export *_files directory."""
+    return any(part.endswith(ASSET_DIR_SUFFIX) for part in os.path.dirname(path).split(os.sep))
+
+
+def _tree(path):
+    """'deploy' for files in the deploy copy, '' for the source tree."""
+    return DEPLOY_DIR if path.split(os.sep, 1)[0] == DEPLOY_DIR else ''
+
+
+def _canonical_order(path):
+    # Source tree before deploy/, then shallowest, then shortest name
+    return (_tree(path) == DEPLOY_DIR, path.count(os.sep), len(path), path)
+
+
+def find_duplicates(root='.'):
+    """Return groups of identical export assets, canonical copy first."""
+    by_size = defaultdict(list)
+    for entry in scan_tree(root, SKIP_DIRS):
+        if entry.size and entry.kind not in ('temp', 'backup') and is_export_asset(entry.path):
+            by_size[entry.size].append(entry.path)
+
+    groups = []
+    for size, paths in by_size.items():
+        if len(paths) < 2:
+            continue
+        by_hash = defaultdict(list)
+        for path in paths:
+            try:
+                by_hash[file_hash(path)].append(path)
+            except OSError as e:
+                print(f"Could not read {path}: {e}")
+        groups.extend(sorted(group, key=_canonical_order)
+                      for group in by_hash.values() if len(group) > 1)
+
+    groups.sort(key=lambda group: _canonical_order(group[0]))
+    return groups
+
+
+def link_duplicates(groups, dry_run=False):
+    """Replace every duplicate with a hardlink to its canonical copy; returns bytes freed."""
+    freed = 0
+    for canonical, *duplicates in groups:
+        for path in duplicates:
+            try:
+                if os.path.samefile(canonical, path):
+                    continue
+                size = os.path.getsize(path)
+                if not dry_run:
+                    tmp_path = path + '.dedup-tmp'
+                    os.link(canonical, tmp_path)
+                    os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Could not link {path}: {e}")
+                continue
+            freed += size
+    return freed
+
+
+def canonical_map(groups):
+    """Map each duplicate to the canonical copy in its own tree (source or deploy)."""
+    mapping = {}
+    for group in groups:
+        canonical_in_tree = {}
+        for path in group:
+            canonical = canonical_in_tree.setdefault(_tree(path), path)
+            if canonical != path:
+                mapping[path] = canonical
+    return mapping
+
+
+def _site_root(page, root):
+    """What a root-absolute URL in page is relative to: its tree's top directory."""
+    relative = os.path.relpath(page, root)
+    return os.path.normpath(os.path.join(root, _tree(relative)))
+
+
+def rewrite_page(page, mapping, referenced, dry_run=False, root='.'):
+    """Point a page's src/href values at canonical copies.
+
+    Returns the number changed, or None if the page's encoding is not
+    recognised (it is left alone and its references are unknown).
+    """
+    page_dir = os.path.dirname(page)
+    site_root = _site_root(page, root)
+
+    def replace(url):
+        absolute = url.startswith('/') and not url.startswith('//')
+        if absolute:
+            resolved = resolve_local(site_root, url.lstrip('/'))
+        else:
+            resolved = resolve_local(page_dir, url)
+        if resolved is None:
+            return url
+        path, suffix, encoded = resolved
+        canonical = mapping.get(path)
+        if canonical is None:
+            referenced.add(path)
+            return url
+        referenced.add(canonical)
+        if absolute:
+            new_url = '/' + os.path.relpath(canonical, site_root).replace(os.sep, '/')
+        else:
+            new_url = os.path.relpath(canonical, page_dir or '.').replace(os.sep, '/')
+        return (quote(new_url) if encoded else new_url) + suffix
+
+    with open(page, 'rb') as f:
+        raw = f.read()
+    detection = detect_bytes(raw)
+    if detection.encoding is None:
+        print(f"Skipping {page}: encoding not recognised")
+        return None
+    text, changed = rewrite_references(detection.text, replace)
+    if changed and not dry_run:
+        write_bytes(page, text.encode(detection.encoding, 'xmlcharrefreplace'), TOOL, original=raw)
+    return changed
+
+
+def rewrite_references_to_canonical(groups, root='.', prune=False, dry_run=False):
+    """Rewrite every page to use canonical copies; optionally delete unreferenced duplicates.
+
+    Returns (pages changed, references changed, bytes freed by pruning).
+    """
+    mapping = canonical_map(groups)
+    referenced = set()
+    unread = []
+    pages_changed = references_changed = 0
+    for entry in scan_tree(root, SKIP_DIRS):
+        if entry.kind != 'html':
+            continue
+        try:
+            changed = rewrite_page(entry.path, mapping, referenced, dry_run, root)
+        except OSError as e:
+            print(f"Could not rewrite {entry.path}: {e}")
+            unread.append(entry.path)
+            continue
+        if changed is None:
+            unread.append(entry.path)
+        elif changed:
+            pages_changed += 1
+            references_changed += changed
+            print(f"{'Would rewrite' if dry_run else 'Rewrote'} {changed} references in {entry.path}")
+
+    freed = 0
+    if prune and unread:
+        print(f"Not pruning: {len(unread)} pages could not be read, so their references are unknown")
+    elif prune:
+        for path in mapping:
+            if path in referenced:
+                continue
+            size = os.path.getsize(path)
+            if not dry_run:
+                snapshot(path, TOOL)
+                os.remove(path)
+            freed += size
+    return pages_changed, references_changed, freed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store each identical Word-export asset once.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--link', action='store_true', help='hardlink duplicates to the canonical copy (default)')
+    mode.add_argument('--rewrite', action='store_true', help='point src/href references at the canonical copy')
+    parser.add_argument('--prune', action='store_true',
+                        help='with --rewrite, delete duplicates no page references any more')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change')
+    args = parser.parse_args()
+    if args.prune and not args.rewrite:
+        parser.error('--prune only applies to --rewrite')
+
+    groups = find_duplicates('.')
+    duplicates = sum(len(group) - 1 for group in groups)
+    reclaimable = sum(os.path.getsize(group[0]) * (len(group) - 1) for group in groups)
+    print(f"Found {len(groups)} assets with {duplicates} duplicate copies "
+          f"({reclaimable / 1e6:.1f} MB)")
+
+    if args.rewrite:
+        pages, references, freed = rewrite_references_to_canonical(groups, '.', args.prune, args.dry_run)
+        print(f"\n{references} references in {pages} pages point at canonical copies")
+        if args.prune:
+            print(f"{'Would free' if args.dry_run else 'Freed'} {freed / 1e6:.1f} MB of unreferenced duplicates")
+    else:
+        freed = link_duplicates(groups, args.dry_run)
+        print(f"{'Would free' if args.dry_run else 'Freed'} {freed / 1e6:.1f} MB by hardlinking duplicates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Final deploy build steps: fingerprinted assets, precompressed files, cache headers.
+
+Run over the deploy/ copy after deploy.sh has filled it (and after
+dnatools.minify and dnatools.searchindex), in this order:
+
+  0. webp: every <img> whose image has WebP variants next to it (written by
+     dnatools.images) is wrapped in <picture> with a WebP <source>; the variant
+     widths go into its srcset, and the <img> stays as the fallback.
+  1. fingerprint: static assets (images, fonts, scripts, then stylesheets) are
+     copied to name.<hash>.ext by content hash, and every src/href in the pages
+     and url(...) in the stylesheets is rewritten to the new name. Stylesheets go
+     last so their own hash covers the rewritten url()s. The originals stay in
+     place (served with revalidation) for the references that are not rewritten:
+     background= attributes, inline style url()s and URLs built in scripts.
+  2. precompress: .gz and (if the brotli package is installed) .br siblings at
+     maximum compression for HTML, CSS, XML, JS, SVG and the search index
+     (JSON and .bin shards), across a process pool. A sibling is only kept if it
+     is smaller than the file.
+  3. headers: the "headers" section of deploy/vercel.json is regenerated so that
+     fingerprinted files are served as immutable for a year, and pages and the
+     search index (fetched by fixed names) are always revalidated.
+
+    python -m dnatools.deploybuild            # deploy/
+    python -m dnatools.deploybuild -j 0 --no-fingerprint --no-webp
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+from urllib.parse import quote
+
+try:
+    import brotli
+except ImportError:  # optional; only .gz files are written without it
+    brotli = None
+
+from dnatools.batch import run_batch
+from dnatools.detect import detect_bytes
+from dnatools.fsindex import DEFAULT_SKIP_DIRS, HTML_SUFFIXES, scan_tree
+from dnatools.htmltokens import attribute_value, parse_attributes, tokenize
+from dnatools.images import webp_variants
+from dnatools.imagesize import image_size
+from dnatools.rewrite import resolve_local, rewrite_references
+
+DEFAULT_ROOT = 'deploy'
+HASH_LENGTH = 10
+
+# Stylesheets last: they are rewritten to point at the other fingerprinted files first
+FINGERPRINT_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.svg', '.ico',
+                        '.woff', '.woff2', '.ttf', '.js', '.css')
+COMPRESS_SUFFIXES = ('.html', '.htm', '.css', '.xml', '.js', '.svg', '.json', '.bin')
+# Read by the host at deploy time, never served (vercel.json is rewritten after precompress)
+CONFIG_FILES = ('vercel.json', 'package.json')
+SEARCH_DIR = 'search'
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+
+_FINGERPRINTED = re.compile(r'\.[0-9a-f]{%d}\.[^./]+$' % HASH_LENGTH)
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+Compressed = namedtuple('Compressed', ['path', 'size', 'gzip_size', 'brotli_size'])
+
+
+def _files(root):
+    # deploy/ is skipped by default everywhere else; here it is the target. No
+    # index cache either, it would be written into (and deployed with) root.
+    return [entry for entry in scan_tree(root, DEFAULT_SKIP_DIRS - {DEFAULT_ROOT}, use_cache=False)
+            if entry.kind not in ('temp', 'backup')]
+
+
+def fingerprinted_name(path, data):
+    """name.ext -> name.<content hash>.ext"""
+    stem, suffix = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{suffix}"
+
+
+def _local(root, base_dir, url):
+    """resolve_local, with a /-prefixed URL taken from root."""
+    if url.startswith('/') and not url.startswith('//'):
+        return resolve_local(root, url.lstrip('/'))
+    return resolve_local(base_dir, url)
+
+
+def _replacer(root, base_dir, renamed):
+    """Return replace(url) that points local URLs at renamed files, keeping their style."""
+    def replace(url):
+        absolute = url.startswith('/') and not url.startswith('//')
+        resolved = _local(root, base_dir, url)
+        if resolved is None:
+            return url
+        path, suffix, encoded = resolved
+        new_path = renamed.get(path)
+        if new_path is None:
+            return url
+        if absolute:
+            new_url = '/' + os.path.relpath(new_path, root).replace(os.sep, '/')
+        else:
+            new_url = os.path.relpath(new_path, base_dir or '.').replace(os.sep, '/')
+        return (quote(new_url) if encoded else new_url) + suffix
+    return replace
+
+
+def _picture_source(tag, root, base_dir):
+    """The <source> tag offering an <img>'s WebP variants, or None if it has none."""
+    attributes = parse_attributes(tag)
+    src = next((attribute_value(raw).strip() for attr, raw in attributes if attr == 'src'), '')
+    resolved = _local(root, base_dir, src) if src else None
+    if resolved is None:
+        return None
+    path, suffix = resolved[0], resolved[1]
+    variants = webp_variants(path)
+    if not variants:
+        return None
+    # Variant names are the image's name plus a suffix, so its URL is too
+    base_url = src[:len(src) - len(suffix)].replace(' ', '%20').replace(',', '%2C')
+    size = image_size(path)
+    if size is None:
+        return f'<source type="image/webp" srcset="{base_url}.webp">'
+    candidates = [f"{base_url}{name[len(path):]} {width or size[0]}w" for name, width in variants]
+    shown = next((attribute_value(raw) for attr, raw in attributes if attr == 'width'), '')
+    shown = shown if shown.isdigit() else str(size[0])
+    return (f'<source type="image/webp" srcset="{", ".join(candidates)}" '
+            f'sizes="(max-width: {shown}px) 100vw, {shown}px">')
+
+
+def add_webp_sources(root=DEFAULT_ROOT):
+    """Wrap every <img> that has WebP variants in <picture>; returns (images, pages) changed."""
+    root = os.path.normpath(root)
+    images = pages = 0
+    for entry in _files(root):
+        if not entry.path.lower().endswith(HTML_SUFFIXES):
+            continue
+        with open(entry.path, 'rb') as f:
+            raw = f.read()
+        if b'<img' not in raw.lower():
+            continue
+        detection = detect_bytes(raw)
+        if detection.encoding is None:
+            print(f"Skipping {entry.path}: encoding not recognised")
+            continue
+        out = []
+        in_picture = 0
+        wrapped = 0
+        for kind, text, name in tokenize(detection.text):
+            if name == 'picture' and kind == 'start':
+                in_picture += 1
+            elif name == 'picture' and kind == 'end':
+                in_picture = max(0, in_picture - 1)
+            elif kind == 'start' and name == 'img' and not in_picture:
+                source = _picture_source(text, root, os.path.dirname(entry.path))
+                if source is not None:
+                    text = f'<picture>{source}{text}</picture>'
+                    wrapped += 1
+            out.append(text)
+        if wrapped:
+            with open(entry.path, 'wb') as f:
+                f.write(''.join(out).encode(detection.encoding, 'xmlcharrefreplace'))
+            images += wrapped
+            pages += 1
+    print(f"Offered WebP variants for {images} images in {pages} pages")
+    return images, pages
+
+
+def _rewrite_css(path, root, renamed):
+    with open(path, 'rb') as f:
+        css = f.read().decode('utf-8', 'surrogateescape')
+    replace = _replacer(root, os.path.dirname(path), renamed)
+
+    def replace_url(match):
+        quote_char, url = match.group(1), match.group(2).strip()
+        return f"url({quote_char}{replace(url)}{quote_char})"
+
+    return _CSS_URL.sub(replace_url, css).encode('utf-8', 'surrogateescape')
+
+
+def fingerprint_assets(root=DEFAULT_ROOT):
+    """Copy static assets to content-hashed names and rewrite references; returns {old: new}."""
+    root = os.path.normpath(root)
+    entries = _files(root)
+    order = {suffix: n for n, suffix in enumerate(('.js', '.css'), 1)}
+    assets = sorted((entry.path for entry in entries
+                     if entry.path.lower().endswith(FINGERPRINT_SUFFIXES)
+                     and not _FINGERPRINTED.search(entry.path)),
+                    key=lambda path: order.get(os.path.splitext(path)[1].lower(), 0))
+
+    renamed = {}
+    for path in assets:
+        if path.lower().endswith('.css'):
+            data = _rewrite_css(path, root, renamed)
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+        new_path = fingerprinted_name(path, data)
+        with open(new_path, 'wb') as f:
+            f.write(data)
+        renamed[path] = new_path
+
+    pages = 0
+    for entry in entries:
+        if not entry.path.lower().endswith(HTML_SUFFIXES):
+            continue
+        with open(entry.path, 'rb') as f:
+            raw = f.read()
+        detection = detect_bytes(raw)
+        if detection.encoding is None:
+            print(f"Skipping {entry.path}: encoding not recognised")
+            continue
+        text, changed = rewrite_references(detection.text,
+                                           _replacer(root, os.path.dirname(entry.path), renamed))
+        if changed:
+            with open(entry.path, 'wb') as f:
+                f.write(text.encode(detection.encoding, 'xmlcharrefreplace'))
+            pages += 1
+    print(f"Fingerprinted {len(renamed)} assets; rewrote references in {pages} pages")
+    return renamed
+
+
+def compress_file(path):
+    """Write path.gz (and path.br) next to path; returns Compressed with 0 for skipped siblings."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    sizes = []
+    encoders = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append(('.br', lambda d: brotli.compress(d, quality=11)))
+    for suffix, encode in encoders:
+        packed = encode(data)
+        if len(packed) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(packed)
+            sizes.append(len(packed))
+        else:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+            sizes.append(0)
+    if brotli is None:
+        sizes.append(0)
+    return Compressed(path, len(data), *sizes)
+
+
+def precompress(root=DEFAULT_ROOT, jobs=1):
+    """Precompress every text file under root in parallel; returns the Compressed results."""
+    config = {os.path.normpath(os.path.join(root, name)) for name in CONFIG_FILES}
+    paths = [entry.path for entry in _files(root)
+             if entry.path.lower().endswith(COMPRESS_SUFFIXES) and entry.path not in config]
+    results = run_batch(compress_file, paths, jobs=jobs)
+    total = sum(result.size for result in results)
+    gzip_total = sum(result.gzip_size or result.size for result in results)
+    line = f"Precompressed {len(results)} files: {total / 1e6:.1f} MB -> gzip {gzip_total / 1e6:.1f} MB"
+    if brotli is not None:
+        brotli_total = sum(result.brotli_size or result.size for result in results)
+        line += f", brotli {brotli_total / 1e6:.1f} MB"
+    else:
+        line += " (install brotli for .br files)"
+    print(line)
+    return results
+
+
+def cache_headers():
+    """The vercel.json "headers" rules for fingerprinted files and pages."""
+    extensions = '|'.join(sorted({suffix[1:] for suffix in FINGERPRINT_SUFFIXES}))
+    return [
+        {
+            'source': f"/(.*)\\.([0-9a-f]{{{HASH_LENGTH}}})\\.({extensions})",
+            'headers': [{'key': 'Cache-Control', 'value': IMMUTABLE}],
+        },
+        {
+            'source': '/(.*)\\.(html|htm)',
+            'headers': [{'key': 'Cache-Control', 'value': REVALIDATE}],
+        },
+        {
+            'source': f"/{SEARCH_DIR}/(.*)\\.(json|bin)",
+            'headers': [{'key': 'Cache-Control', 'value': REVALIDATE}],
+        },
+    ]
+
+
+def write_vercel_headers(root=DEFAULT_ROOT):
+    """Regenerate the "headers" section of root/vercel.json, keeping everything else."""
+    path = os.path.join(root, 'vercel.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {'version': 2}
+    config['headers'] = cache_headers()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+        f.write('\n')
+    print(f"Wrote cache headers to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint, precompress and set cache headers for deploy/.")
+    parser.add_argument('root', nargs='?', default=DEFAULT_ROOT, help=f'deploy tree (default: {DEFAULT_ROOT})')
+    parser.add_argument('--no-fingerprint', action='store_true', help='keep asset names as they are')
+    parser.add_argument('--no-webp', action='store_true', help='leave <img> tags without <picture>')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (0 = one per CPU, default: 1)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} does not exist; run deploy.sh first")
+    if not args.no_webp:
+        add_webp_sources(args.root)
+    if not args.no_fingerprint:
+        fingerprint_assets(args.root)
+    precompress(args.root, args.jobs)
+    write_vercel_headers(args.root)
+
+
+if __name__ == "__main__":
+    main()
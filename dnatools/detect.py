@@ -0,0 +1,61 @@
+"""
+Detect which Chinese encoding a page was saved with.
+
+The raw bytes are read once (memory-mapped) and every candidate (gb2312, gb18030,
+gbk, big5, utf-8) is scored from a single byte-level scan of the buffer by
+dnatools.cjkscan; only the winning codec is decoded. A page that is neither
+UTF-8 nor recognisably CJK gets encoding None and a cp1252 reading of its text,
+good enough to index or link-check but never to be written back.
+"""
+
+import mmap
+import re
+from collections import namedtuple
+
+from dnatools import metrics
+from dnatools.cjkscan import classify_buffer, open_buffer
+
+Detection = namedtuple('Detection', ['encoding', 'text', 'confidence', 'chinese_count'])
+
+# Read-only decoding of pages no candidate fits
+FALLBACK_ENCODING = 'cp1252'
+
+_CHARSET = re.compile(r'charset=(?:gb2312|gbk|gb18030|big5)\b', re.IGNORECASE)
+
+
+def detect_bytes(raw_data):
+    """Pick the best encoding for raw page bytes and decode them once.
+
+    Returns a Detection(encoding, text, confidence, chinese_count); encoding is
+    None when no candidate fits, and callers must then leave the page alone.
+    """
+    with metrics.stage('detect'):
+        result, text = classify_buffer(raw_data)
+    with metrics.stage('decode'):
+        if result.encoding is None:
+            text = str(raw_data, FALLBACK_ENCODING, 'replace')
+        elif text is None:
+            # utf-8-sig also drops a leading BOM
+            codec = 'utf-8-sig' if result.encoding == 'utf-8' else result.encoding
+            text = str(raw_data, codec, 'ignore')
+    if result.encoding is None:
+        kind = 'scan-none'
+    else:
+        kind = 'scan-utf8' if result.encoding == 'utf-8' else 'scan-legacy'
+    metrics.note(detection=kind, encoding=result.encoding)
+    return Detection(result.encoding, text, result.confidence, result.chinese_count)
+
+
+def detect_file(filepath):
+    """Read a file once and detect its encoding."""
+    buf = open_buffer(filepath)
+    try:
+        return detect_bytes(buf)
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+def relabel_charset(content):
+    """Point legacy charset declarations at UTF-8."""
+    return _CHARSET.sub('charset=utf-8', content)
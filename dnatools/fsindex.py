@@ -0,0 +1,163 @@
+"""
+One shared, pruned index of the files in the site tree.
+
+The tree is walked with os.scandir; skip-directories (.git, node_modules, the
+deploy copy, the gb18030 backups, ...) are pruned before descending, and every file
+is listed exactly once with its size, mtime and kind. The index is cached on disk
+together with the mtime of every directory it covers, so a later run only
+rescans directories whose listing changed.
+
+Sizes and mtimes are as of the last scan of the containing directory; tools that
+need fresh stats (e.g. dnatools.manifest) stat the file themselves.
+
+    python -m dnatools.fsindex            # summary by kind
+    python -m dnatools.fsindex --refresh  # ignore the cache
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+from collections import Counter, namedtuple
+
+FileEntry = namedtuple('FileEntry', ['path', 'size', 'mtime_ns', 'kind'])
+
+# Directory names (or paths relative to the root) that are never descended into
+DEFAULT_SKIP_DIRS = frozenset({
+    '.git',
+    '.dnatools',
+    '__pycache__',
+    'node_modules',
+    'deploy',
+    'backups_gb18030*',
+})
+
+HTML_SUFFIXES = ('.html', '.htm')
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.avif')
+BACKUP_SUFFIXES = ('.bak', '.backup', '.backup2')
+
+CACHE_DIR = '.dnatools'
+CACHE_VERSION = 1
+
+
+def file_kind(name):
+    """Classify a file name: temp, backup, html, image or other."""
+    lower = name.lower()
+    if name.startswith('.!'):
+        # Editor lock/temp copies such as .!18255!CHT7-P2.html
+        return 'temp'
+    if lower.endswith(BACKUP_SUFFIXES):
+        return 'backup'
+    if lower.endswith(HTML_SUFFIXES):
+        return 'html'
+    if lower.endswith(IMAGE_SUFFIXES):
+        return 'image'
+    return 'other'
+
+
+def _is_skipped(name, rel_path, skip_dirs):
+    return any(fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(rel_path, pattern)
+               for pattern in skip_dirs)
+
+
+def _cache_path(root, skip_dirs):
+    key = hashlib.blake2b(','.join(sorted(skip_dirs)).encode('utf-8'), digest_size=4).hexdigest()
+    return os.path.join(root, CACHE_DIR, f'fsindex-{key}.json')
+
+
+def _load_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache.get('dirs', {})
+
+
+def _save_cache(path, dirs):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'dirs': dirs}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def scan_tree(root='.', skip_dirs=DEFAULT_SKIP_DIRS, use_cache=True):
+    """Return a FileEntry for every file under root, skip-directories pruned.
+
+    With use_cache=False the cache is neither read nor written.
+    """
+    cache_path = _cache_path(root, skip_dirs)
+    cached_dirs = _load_cache(cache_path) if use_cache else {}
+    dirs = {}
+    entries = []
+
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        abs_dir = os.path.join(root, rel_dir)
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            continue
+
+        listing = cached_dirs.get(rel_dir)
+        if not listing or listing['mtime_ns'] != mtime_ns:
+            subdirs, files = [], []
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not _is_skipped(entry.name, rel_path, skip_dirs):
+                                subdirs.append(entry.name)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            files.append([entry.name, stat.st_size, stat.st_mtime_ns,
+                                          file_kind(entry.name)])
+                    except OSError:
+                        continue
+            listing = {'mtime_ns': mtime_ns, 'subdirs': sorted(subdirs), 'files': sorted(files)}
+
+        dirs[rel_dir] = listing
+        for name, size, file_mtime_ns, kind in listing['files']:
+            path = os.path.normpath(os.path.join(root, rel_dir, name))
+            entries.append(FileEntry(path, size, file_mtime_ns, kind))
+        stack.extend(os.path.join(rel_dir, name) for name in reversed(listing['subdirs']))
+
+    if use_cache and dirs != cached_dirs:
+        try:
+            _save_cache(cache_path, dirs)
+        except OSError as e:
+            print(f"Could not write file index cache {cache_path}: {e}")
+
+    return entries
+
+
+def html_files(root='.', skip_dirs=DEFAULT_SKIP_DIRS, suffixes=HTML_SUFFIXES, use_cache=True):
+    """Paths of the real HTML pages under root (no temp or backup copies)."""
+    return [entry.path for entry in scan_tree(root, skip_dirs, use_cache)
+            if entry.kind == 'html' and entry.path.lower().endswith(suffixes)]
+
+
+def main():
+    """Print how many files of each kind the index holds."""
+    if '--refresh' in sys.argv[1:]:
+        try:
+            os.remove(_cache_path('.', DEFAULT_SKIP_DIRS))
+        except OSError:
+            pass
+    entries = scan_tree('.')
+    kinds = Counter(entry.kind for entry in entries)
+    sizes = Counter()
+    for entry in entries:
+        sizes[entry.kind] += entry.size
+    for kind, count in kinds.most_common():
+        print(f"{kind:8} {count:6} files {sizes[kind] / 1e6:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Minimal lossless HTML tokenizer for legacy (Word-export) pages.
+
+tokenize() walks a document once and yields every piece of it exactly as it
+appears in the source, so joining all token texts gives back the input. It does
+not build a tree; callers keep whatever state they need while streaming.
+tokenize_stream() does the same over a sequence of chunks (e.g. file reads).
+"""
+
+import re
+from collections import namedtuple
+
+# kind is one of: text, start, end, comment, decl, pi
+Token = namedtuple('Token', ['kind', 'text', 'name'])
+
+_TOKEN = re.compile(r'''
+      (?P<comment><!--.*?-->)
+    | (?P<decl><![^>]*>)
+    | (?P<pi><\?.*?>)
+    | (?P<end></(?P<end_name>[A-Za-z][^\s/>]*)[^>]*>)
+    | (?P<start><(?P<start_name>[A-Za-z][^\s/>]*)(?:[^>"']|"[^"]*"|'[^']*')*>)
+    | (?P<text>[^<]+|<)
+''', re.DOTALL | re.VERBOSE)
+
+_ATTRIBUTE = re.compile(r'''([^\s"'=<>/]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?''')
+
+
+def _token(match):
+    kind = match.lastgroup
+    if kind == 'start':
+        name = match.group('start_name').lower()
+    elif kind == 'end':
+        name = match.group('end_name').lower()
+    else:
+        name = None
+    return Token(kind, match.group(0), name)
+
+
+def tokenize(content):
+    """Yield a Token for every tag, comment, declaration and text run in content."""
+    for match in _TOKEN.finditer(content):
+        yield _token(match)
+
+
+# What the buffer from a lone '<' to its end must look like for more input to
+# still turn it into a tag, comment, declaration or processing instruction
+_TAG_PREFIX = re.compile(r'''<(?:
+      ![^>]*
+    | \?[^>]*
+    | /(?:[A-Za-z][^>]*)?
+    | [A-Za-z](?:[^>"']|"[^"]*"|'[^']*')*(?:"[^"]*|'[^']*)?
+)?\Z''', re.DOTALL | re.VERBOSE)
+
+
+def _is_provisional(match, buffer):
+    """True if more input could turn this match into a different token.
+
+    A lone '<' may be the start of a tag whose closing quote or '>' has not
+    arrived yet, but only if everything after it is still an unfinished tag; a
+    '<' in running text ('a < b') is settled as soon as the next character is.
+    '<!--' parsed as a declaration may still become a comment.
+    """
+    text = match.group(0)
+    if text == '<':
+        return _TAG_PREFIX.match(buffer, match.start()) is not None
+    return match.lastgroup == 'decl' and text.startswith('<!--')
+
+
+def tokenize_stream(chunks):
+    """Like tokenize() over the concatenation of chunks, without holding the whole text.
+
+    Only the unfinished tail of each chunk (normally a partial tag or text run)
+    is carried over to the next one.
+    """
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        held = len(buffer)
+        for match in _TOKEN.finditer(buffer):
+            if match.end() == len(buffer) or _is_provisional(match, buffer):
+                held = match.start()
+                break
+            yield _token(match)
+        buffer = buffer[held:]
+    yield from tokenize(buffer)
+
+
+def parse_attributes(tag_text):
+    """Return [(name, raw_value_or_None), ...] for a start tag, keeping quotes as written."""
+    parts = tag_text[1:-1].rstrip('/').split(None, 1)
+    if len(parts) < 2:
+        return []
+    return [(m.group(1).lower(), m.group(2)) for m in _ATTRIBUTE.finditer(parts[1])]
+
+
+def attribute_value(raw_value):
+    """Strip the quotes from a raw attribute value."""
+    if raw_value and raw_value[0] in '"\'' and raw_value[-1] == raw_value[0]:
+        return raw_value[1:-1]
+    return raw_value or ''
+
+
+def build_start_tag(name, attributes, self_closing=False):
+    """Rebuild a start tag from a name and [(name, raw_value_or_None), ...]."""
+    parts = [name]
+    for attr, raw_value in attributes:
+        parts.append(attr if raw_value is None else f'{attr}={raw_value}')
+    return '<' + ' '.join(parts) + (' />' if self_closing else '>')
@@ -0,0 +1,364 @@
+"""
+Optimize the site's images and emit WebP and responsive variants.
+
+For every JPEG/PNG/GIF/BMP in the tree (backups and deploy/ pruned):
+
+  - JPEGs are left as they are unless asked: --quality N re-encodes them
+    lossily at that quality, and --quality keep tries an optimized progressive
+    re-encode with their own quantization tables that is only used if it
+    decodes to exactly the same pixels (rarely: on this site's JPEGs about one
+    in forty, and every file is encoded and decoded to find out). PNGs are
+    re-saved with zlib optimization. Either way the result only replaces the
+    original if smaller.
+  - BMPs are converted to PNG next to the original, and src/href references in
+    the pages are pointed at the PNG. A BMP whose name.png already exists with
+    other content is left alone.
+  - name.ext.webp plus name.ext-<width>w.webp for each configured width smaller
+    than the image are written next to the original (not for animated GIFs);
+    the source extension is kept so image001.jpg and image001.png do not
+    overwrite each other's variants. dnatools.deploybuild offers them to
+    browsers through <picture> in the deploy copy.
+
+Work is spread over a process pool. A cache in .dnatools/images.json is keyed by
+the content hash of the optimized image and the settings, so unchanged images
+are skipped and an identical image elsewhere in the tree gets its variants
+copied instead of encoded again.
+
+Needs Pillow (pip install Pillow).
+
+    python -m dnatools.images -j 0
+    python -m dnatools.images --quality 80 --widths 480,960 CHT7-P1_files/
+    python -m dnatools.images --quality keep *.jpg
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import re
+import shutil
+import sys
+from collections import Counter
+from functools import partial
+
+try:
+    from PIL import Image
+except ImportError:  # optional; only this tool needs it
+    Image = None
+
+from dnatools.backupstore import write_bytes
+from dnatools.batch import add_batch_arguments, run_batch
+from dnatools.detect import detect_bytes
+from dnatools.fsindex import html_files, scan_tree
+from dnatools.manifest import file_hash
+from dnatools.rewrite import resolve_local, rewrite_references
+
+CACHE_PATH = os.path.join('.dnatools', 'images.json')
+
+# Bump whenever the encoding steps below change so cached images are redone
+RULES_VERSION = 3
+
+SOURCE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+DEFAULT_WIDTHS = (480, 960, 1440)
+DEFAULT_WEBP_QUALITY = 80
+
+TOOL = 'images'
+
+# The lossless JPEG re-encode, as --quality keep
+KEEP_QUALITY = 'keep'
+
+_WIDTH_VARIANT = re.compile(r'-(\d+)w\.webp$')
+
+
+def settings_key(quality, webp_quality, widths):
+    """Everything that changes the output, for the cache."""
+    return f"v{RULES_VERSION}|q{quality or '-'}|w{webp_quality}|{','.join(map(str, widths))}"
+
+
+def variant_names(path, width, widths, animated=False):
+    """File names of the WebP variants an image of this width gets."""
+    return [name for name, _ in _variants(path, width, widths, animated)]
+
+
+def _variants(path, width, widths, animated):
+    """(name, width to resize to or None) for each WebP variant."""
+    if animated:
+        return []
+    return [(path + '.webp', None)] + [(f"{path}-{w}w.webp", w) for w in widths if w < width]
+
+
+def webp_variants(path):
+    """[(name, width or None for full size), ...] of the variants of path on disk, smallest first."""
+    variants = [(path + '.webp', None)] if os.path.isfile(path + '.webp') else []
+    for name in glob.glob(glob.escape(path) + '-*w.webp'):
+        match = _WIDTH_VARIANT.search(name)
+        if match and name == f"{path}-{match.group(1)}w.webp":
+            variants.append((name, int(match.group(1))))
+    return sorted(variants, key=lambda variant: (variant[1] is None, variant[1] or 0))
+
+
+def optimized_path(path):
+    """Where the optimized image ends up: BMPs become PNGs next to them."""
+    if path.lower().endswith('.bmp'):
+        return os.path.splitext(path)[0] + '.png'
+    return path
+
+
+def _png_target_free(png_path, data):
+    """True unless png_path exists with other content (a PNG we must not overwrite)."""
+    try:
+        with open(png_path, 'rb') as f:
+            return f.read() == data
+    except FileNotFoundError:
+        return True
+
+
+def _recompress(image, fmt, quality):
+    """Encode image in its own format; returns bytes or None if not applicable.
+
+    JPEGs need a quality; with KEEP_QUALITY one is only returned if it decodes
+    to the same pixels.
+    """
+    buf = io.BytesIO()
+    if fmt == 'JPEG':
+        if quality is None:
+            return None
+        extra = {key: image.info[key] for key in ('icc_profile', 'exif') if image.info.get(key)}
+        image.save(buf, 'JPEG', quality=quality, optimize=True, progressive=True, **extra)
+        if quality == KEEP_QUALITY:
+            recompressed = Image.open(io.BytesIO(buf.getvalue()))
+            if recompressed.tobytes() != image.tobytes():
+                return None
+    elif fmt == 'PNG':
+        image.save(buf, 'PNG', optimize=True)
+    else:
+        return None
+    return buf.getvalue()
+
+
+def _webp_source(image):
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def optimize_image(path, quality=None, webp_quality=DEFAULT_WEBP_QUALITY, widths=DEFAULT_WIDTHS):
+    """Recompress/convert one image and write its variants.
+
+    Returns a dict describing what was done, or None on error.
+    """
+    try:
+        with open(path, 'rb') as f:
+            original = f.read()
+        image = Image.open(io.BytesIO(original))
+        image.load()
+        fmt = image.format
+        animated = getattr(image, 'is_animated', False)
+        result = {'path': path, 'saved': 0, 'converted': None, 'variants': []}
+
+        if fmt == 'BMP':
+            # The BMP itself stays as it is, so it is cached under its own hash
+            result['source_hash'] = file_hash(path)
+            png_path = optimized_path(path)
+            buf = io.BytesIO()
+            image.save(buf, 'PNG', optimize=True)
+            if _png_target_free(png_path, buf.getvalue()):
+                write_bytes(png_path, buf.getvalue(), TOOL)
+                result['converted'] = png_path
+                result['saved'] = len(original) - len(buf.getvalue())
+                path = png_path
+            else:
+                print(f"Not converting {path}: {png_path} already exists")
+        elif not animated:
+            data = _recompress(image, fmt, quality)
+            if data is not None and len(data) < len(original):
+                write_bytes(path, data, TOOL, original=original)
+                result['saved'] = len(original) - len(data)
+
+        source = _webp_source(image) if not animated else None
+        for name, width in _variants(path, image.width, widths, animated):
+            if width is not None:
+                height = max(1, round(image.height * width / image.width))
+                variant = source.resize((width, height), Image.LANCZOS)
+            else:
+                variant = source
+            variant.save(name, 'WEBP', quality=webp_quality, method=6)
+            result['variants'].append(name)
+
+        result['optimized'] = path
+        result['hash'] = file_hash(path)
+        return result
+    except Exception as e:
+        print(f"Error optimizing {path}: {e}")
+        return None
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _reuse_cached(path, entry):
+    """Copy the variants of an identical, already processed image.
+
+    Returns how many were copied, or None if one of them cannot be found.
+    """
+    # Variant names are the optimized image's name plus a suffix (a BMP whose
+    # PNG was refused keeps its own name)
+    base = path if entry['path'].lower().endswith('.bmp') else optimized_path(path)
+    copied = 0
+    for name in entry['variants']:
+        target = base + name[len(entry['path']):]
+        if os.path.exists(target):
+            continue
+        if not os.path.exists(name):
+            return None
+        shutil.copyfile(name, target)
+        copied += 1
+    return copied
+
+
+def _copy_result(path, result):
+    """Give an identical copy of a processed image the same output; returns its optimized path."""
+    with open(result['optimized'], 'rb') as f:
+        data = f.read()
+    if result['converted']:
+        target = optimized_path(path)
+        if not _png_target_free(target, data):
+            print(f"Not converting {path}: {target} already exists")
+            return path
+    elif result['saved']:
+        target = path
+    else:
+        return path
+    write_bytes(target, data, TOOL)
+    return target
+
+
+def rewrite_bmp_references(converted, root='.'):
+    """Point src/href references to converted BMPs at their PNGs; returns pages changed."""
+    targets = {os.path.normpath(bmp): png for bmp, png in converted.items()}
+    changed_pages = 0
+    for page in html_files(root):
+        page_dir = os.path.dirname(page)
+
+        def replace(url):
+            resolved = resolve_local(page_dir, url)
+            if resolved is None or resolved[0] not in targets:
+                return url
+            target = url[:len(url) - len(resolved[1])]
+            return os.path.splitext(target)[0] + '.png' + resolved[1]
+
+        with open(page, 'rb') as f:
+            raw = f.read()
+        detection = detect_bytes(raw)
+        if detection.encoding is None:
+            print(f"Skipping {page}: encoding not recognised")
+            continue
+        text, changed = rewrite_references(detection.text, replace)
+        if changed:
+            write_bytes(page, text.encode(detection.encoding, 'xmlcharrefreplace'), TOOL, original=raw)
+            changed_pages += 1
+    return changed_pages
+
+
+def _parse_widths(value):
+    return tuple(sorted(int(w) for w in value.split(',') if w.strip()))
+
+
+def _parse_quality(value):
+    return value if value == KEEP_QUALITY else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize images and write WebP/responsive variants.")
+    parser.add_argument('paths', nargs='*', help='images or directories (default: the whole site)')
+    parser.add_argument('--quality', type=_parse_quality,
+                        help=f're-encode JPEGs lossily at this quality, or "{KEEP_QUALITY}" for a '
+                             're-encode that is only used if it has the same pixels (default: '
+                             'leave JPEGs alone)'),
+    parser.add_argument('--webp-quality', type=int, default=DEFAULT_WEBP_QUALITY,
+                        help=f'WebP quality (default: {DEFAULT_WEBP_QUALITY})')
+    parser.add_argument('--widths', type=_parse_widths, default=DEFAULT_WIDTHS,
+                        help='responsive variant widths (default: %s)' % ','.join(map(str, DEFAULT_WIDTHS)))
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    if Image is None:
+        print("dnatools.images needs Pillow: pip install Pillow")
+        sys.exit(1)
+
+    roots = args.paths or ['.']
+    paths = []
+    for root in roots:
+        if os.path.isfile(root):
+            paths.append(os.path.normpath(root))
+        else:
+            paths.extend(entry.path for entry in scan_tree(root)
+                         if entry.kind == 'image' and entry.path.lower().endswith(SOURCE_SUFFIXES))
+
+    key = settings_key(args.quality, args.webp_quality, args.widths)
+    cache = load_cache()
+    # Identical images are encoded once; the other copies get the results copied
+    pending = {}
+    copied = 0
+    for path in paths:
+        content_hash = file_hash(path)
+        entry = cache.get(content_hash)
+        if not args.force and entry and entry['settings'] == key:
+            reused = _reuse_cached(path, entry)
+            if reused is not None:
+                copied += reused
+                continue
+        pending.setdefault(content_hash, []).append(path)
+    skipped = len(paths) - sum(len(group) for group in pending.values())
+    print(f"{skipped} of {len(paths)} images unchanged since the last run "
+          f"({copied} variants copied from identical images)")
+
+    leaders = [group[0] for group in pending.values()]
+    results = run_batch(partial(optimize_image, quality=args.quality, webp_quality=args.webp_quality,
+                                widths=args.widths), leaders, jobs=args.jobs)
+
+    totals = Counter()
+    converted = {}
+    for group, result in zip(pending.values(), results):
+        if result is None:
+            totals['errors'] += 1
+            continue
+        entry = {'settings': key, 'path': result['optimized'], 'variants': result['variants']}
+        totals['variants'] += len(result['variants'])
+        for path in group:
+            if path != result['path']:
+                optimized = _copy_result(path, result)
+                _reuse_cached(optimized, entry)
+                if optimized != path:
+                    converted[path] = optimized
+            totals['saved'] += result['saved']
+        if result['converted']:
+            converted[result['path']] = result['converted']
+        cache[result['hash']] = entry
+        if 'source_hash' in result:
+            cache[result['source_hash']] = entry
+    save_cache(cache)
+
+    if converted:
+        pages = rewrite_bmp_references(converted)
+        print(f"Converted {len(converted)} BMPs to PNG; updated references in {pages} pages")
+    print(f"Processed {sum(len(group) for group in pending.values())} images "
+          f"({len(leaders)} distinct): {totals['saved'] / 1e6:.1f} MB saved, "
+          f"{totals['variants']} WebP variants, {totals['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Read image dimensions from file headers and stamp them onto <img> tags.
+
+image_size() looks only at the header bytes of a JPEG (up to its SOF marker,
+with the EXIF orientation applied), PNG (IHDR), GIF (logical screen) or BMP
+(DIB header); nothing is decoded. Results are cached per process by path,
+size and mtime, so an image referenced from many pages is read once.
+
+dimensions_stage() is a dnatools.pipeline stage: every <img> with a local src
+(relative, or root-absolute as dnatools.sitebuild writes them) gets width/height (the missing one is derived from the aspect ratio when only
+one is given) and decoding="async"; all but the first FIRST_EAGER_IMAGES images
+of a page also get loading="lazy". Attributes already present are left alone.
+
+    python -m dnatools.imagesize CHT7-P1_files/*.jpg
+    python -m dnatools.pipeline --stages dimensions
+"""
+
+import os
+import struct
+import sys
+from functools import lru_cache
+
+from dnatools.htmltokens import attribute_value, parse_attributes, tokenize
+from dnatools.rewrite import resolve_local
+
+# Bump whenever the stamping below changes so already-processed pages are redone
+RULES_VERSION = 2
+
+# The first images of a page (banner, logo) are usually visible at once; don't defer them
+FIRST_EAGER_IMAGES = 2
+
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+
+
+def _exif_swaps_axes(segment):
+    """True if an APP1 Exif segment has an orientation that rotates by 90 degrees."""
+    if not segment.startswith(b'Exif\0\0') or len(segment) < 14:
+        return False
+    tiff = segment[6:]
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None:
+        return False
+    offset = struct.unpack(order + 'I', tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return False
+    count = struct.unpack(order + 'H', tiff[offset:offset + 2])[0]
+    for i in range(count):
+        entry = tiff[offset + 2 + 12 * i:offset + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        tag, _, _, value = struct.unpack(order + 'HHIH', entry[:10])
+        if tag == 0x0112:
+            return value in (5, 6, 7, 8)
+    return False
+
+
+def _jpeg_size(f):
+    swap = False
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in _JPEG_STANDALONE:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack('>xHH', f.read(5))
+            return (height, width) if swap else (width, height)
+        if marker == 0xE1:
+            swap = swap or _exif_swaps_axes(f.read(length - 2))
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _read_size(filepath):
+    with open(filepath, 'rb') as f:
+        head = f.read(26)
+        if head[:2] == b'\xff\xd8':
+            return _jpeg_size(f)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:2] == b'BM' and len(head) >= 26:
+            header_size = struct.unpack('<I', head[14:18])[0]
+            if header_size == 12:   # OS/2 BITMAPCOREHEADER
+                return struct.unpack('<HH', head[18:22])
+            width, height = struct.unpack('<ii', head[18:26])
+            return width, abs(height)
+    return None
+
+
+@lru_cache(maxsize=None)
+def _cached_size(filepath, size, mtime_ns):
+    try:
+        return _read_size(filepath)
+    except (OSError, struct.error):
+        return None
+
+
+def image_size(filepath):
+    """(width, height) of a JPEG/PNG/GIF/BMP from its header, or None."""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return _cached_size(os.path.normpath(filepath), stat.st_size, stat.st_mtime_ns)
+
+
+def _int_value(raw):
+    try:
+        return int(float(attribute_value(raw)))
+    except ValueError:
+        return None
+
+
+def _image_path(src, page_dir, root):
+    """Local file an <img> src points at (a /-prefixed one from root), or None."""
+    if src.startswith('/') and not src.startswith('//'):
+        resolved = resolve_local(root, src.lstrip('/'))
+    else:
+        resolved = resolve_local(page_dir, src)
+    return resolved[0] if resolved else None
+
+
+def stamp_image_tags(text, page_dir, eager=FIRST_EAGER_IMAGES, root='.'):
+    """Add width/height/loading/decoding to the <img> tags in text; returns the new text."""
+    out = []
+    seen = 0
+    for kind, tag, name in tokenize(text):
+        if kind != 'start' or name != 'img':
+            out.append(tag)
+            continue
+        seen += 1
+        attributes = parse_attributes(tag)
+        present = {attr for attr, _ in attributes}
+        added = []
+
+        if not {'width', 'height'} <= present:
+            src = next((attribute_value(raw) for attr, raw in attributes if attr == 'src'), None)
+            path = _image_path(src.strip(), page_dir, root) if src else None
+            size = image_size(path) if path else None
+            given = {attr: _int_value(raw) for attr, raw in attributes if attr in ('width', 'height')}
+            # Percentages and other non-pixel sizes are left to the author
+            if size and all(size) and all(given.values()):
+                width, height = size
+                if 'width' in given:
+                    height = round(height * given['width'] / width)
+                elif 'height' in given:
+                    width = round(width * given['height'] / height)
+                if 'width' not in present:
+                    added.append(('width', f'"{width}"'))
+                if 'height' not in present:
+                    added.append(('height', f'"{height}"'))
+
+        if 'loading' not in present and seen > eager:
+            added.append(('loading', '"lazy"'))
+        if 'decoding' not in present:
+            added.append(('decoding', '"async"'))
+
+        if added:
+            # Append before the closing bracket so the tag keeps its original layout
+            end = len(tag) - (2 if tag.endswith('/>') else 1)
+            extra = ' '.join(f'{attr}={value}' for attr, value in added)
+            tag = f"{tag[:end].rstrip()} {extra}{' /' if tag.endswith('/>') else ''}>"
+        out.append(tag)
+    return ''.join(out)
+
+
+def dimensions_stage(doc):
+    """Pipeline stage: intrinsic size and lazy-loading hints on every <img>."""
+    if '<img' not in doc.text.lower():
+        return doc.text
+    return stamp_image_tags(doc.text, os.path.dirname(doc.path))
+
+
+def main():
+    for filepath in sys.argv[1:]:
+        size = image_size(filepath)
+        print(f"{size[0]:6} x {size[1]:<6} {filepath}" if size else f"{'?':>15}  {filepath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Check every internal src/href against the file index.
+
+Pages are parsed across a process pool and every src/href value is resolved
+(relative to the page, or to the root for /absolute URLs) against the
+dnatools.fsindex listing. Each reference ends up as one of
+
+  ok        the file exists as written
+  mismatch  only a file differing in case or Unicode normalization exists
+            (works on macOS/Windows, 404s on the Linux host)
+  broken    nothing there at all
+
+Assets no page references are reported as orphans. The references found in each
+page are kept in the manifest, so re-runs only re-parse pages that changed, and
+the reverse index (target -> referencing pages) is saved to
+.dnatools/references.json for renaming tools: `update_filenames.py --indexed`
+only opens the pages listed there.
+
+    python -m dnatools.linkcheck -j 0
+    python -m dnatools.linkcheck --orphans
+    python -m dnatools.linkcheck --affected B1_cover.jpg
+"""
+
+import argparse
+import json
+import os
+import unicodedata
+from collections import defaultdict, namedtuple
+
+from dnatools.batch import add_batch_arguments
+from dnatools.detect import detect_bytes
+from dnatools.fsindex import IMAGE_SUFFIXES, scan_tree
+from dnatools.manifest import MANIFEST_PATH, Manifest, run_incremental
+from dnatools.rewrite import resolve_local, rewrite_references
+
+TOOL = 'linkcheck'
+RULES_VERSION = 1
+REFERENCES_PATH = os.path.join('.dnatools', 'references.json')
+
+# Files that only exist to be referenced from a page; anything else may be a script or doc
+ASSET_SUFFIXES = IMAGE_SUFFIXES + ('.css', '.ico', '.svg', '.pdf', '.mp3', '.mp4',
+                                   '.wmz', '.emz', '.thmx', '.mso')
+
+Reference = namedtuple('Reference', ['page', 'url', 'target', 'status', 'actual'])
+
+
+def extract_references(filepath):
+    """Every src/href value in a page, in document order."""
+    try:
+        with open(filepath, 'rb') as f:
+            text = detect_bytes(f.read()).text
+    except OSError as e:
+        print(f"Could not read {filepath}: {e}")
+        return []
+    urls = []
+
+    def collect(url):
+        urls.append(url)
+        return url
+
+    rewrite_references(text, collect)
+    return urls
+
+
+def resolve(page, url, root='.'):
+    """Local path a URL in page points at, or None for external/fragment-only URLs."""
+    url = url.strip()
+    if url.startswith('/') and not url.startswith('//'):
+        resolved = resolve_local(root, url.lstrip('/') or '.')
+    else:
+        resolved = resolve_local(os.path.dirname(page), url)
+    if resolved is None:
+        return None
+    path = resolved[0]
+    if url.split('?', 1)[0].split('#', 1)[0].endswith('/') or path == '.':
+        path = os.path.normpath(os.path.join(path, 'index.html'))
+    return path
+
+
+def _normalized(path):
+    return unicodedata.normalize('NFC', path).casefold()
+
+
+class FileIndex:
+    """Exact and case/normalization-insensitive lookups over a tree scan."""
+
+    def __init__(self, entries):
+        self.paths = {entry.path for entry in entries}
+        self.folded = defaultdict(list)
+        for path in self.paths:
+            self.folded[_normalized(path)].append(path)
+
+    def lookup(self, path):
+        """Return (status, actual path or None)."""
+        if path in self.paths:
+            return 'ok', path
+        candidates = self.folded.get(_normalized(path))
+        if candidates:
+            return 'mismatch', sorted(candidates)[0]
+        return 'broken', None
+
+
+def _page_references(pages, jobs, force):
+    """{page: [url, ...]}, re-parsing only pages that changed since the last run."""
+    results = run_incremental(extract_references, pages, TOOL, RULES_VERSION, jobs=jobs, force=force)
+    recorded = Manifest(MANIFEST_PATH).entries.get(TOOL, {})
+    return {page: urls if urls is not None else recorded.get(page, {}).get('result', [])
+            for page, urls in zip(pages, results)}
+
+
+def check_links(root='.', jobs=1, force=False):
+    """Resolve every reference; returns (references, orphaned assets, reverse index)."""
+    entries = [entry for entry in scan_tree(root) if entry.kind not in ('temp', 'backup')]
+    index = FileIndex(entries)
+    pages = sorted(entry.path for entry in entries if entry.kind == 'html')
+
+    references = []
+    reverse = defaultdict(set)
+    for page, urls in _page_references(pages, jobs, force).items():
+        for url in urls:
+            target = resolve(page, url, root)
+            if target is None:
+                continue
+            status, actual = index.lookup(target)
+            references.append(Reference(page, url, target, status, actual))
+            reverse[actual or target].add(page)
+
+    orphans = sorted(entry.path for entry in entries
+                     if entry.path.lower().endswith(ASSET_SUFFIXES) and entry.path not in reverse)
+    return references, orphans, {target: sorted(pages) for target, pages in sorted(reverse.items())}
+
+
+def save_reverse_index(reverse, path=REFERENCES_PATH):
+    """Write the target -> pages index atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(reverse, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_reverse_index(path=REFERENCES_PATH):
+    """The saved target -> pages index, or None if the checker has not run yet."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pages_referencing(names, reverse):
+    """Pages referencing a target whose path or file name is in names."""
+    names = set(names)
+    pages = set()
+    for target, referencing in reverse.items():
+        if target in names or os.path.basename(target) in names:
+            pages.update(referencing)
+    return sorted(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find broken internal links and orphaned assets.")
+    parser.add_argument('--orphans', action='store_true', help='list every orphaned asset')
+    parser.add_argument('--affected', nargs='+', metavar='NAME',
+                        help='print the pages referencing these files (from the saved index) and exit')
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    if args.affected:
+        reverse = load_reverse_index()
+        if reverse is None:
+            parser.error(f"{REFERENCES_PATH} does not exist; run the checker first")
+        for page in pages_referencing(args.affected, reverse):
+            print(page)
+        return
+
+    references, orphans, reverse = check_links('.', args.jobs, args.force)
+    save_reverse_index(reverse)
+
+    for ref in references:
+        if ref.status == 'broken':
+            print(f"BROKEN    {ref.page}: {ref.url}")
+        elif ref.status == 'mismatch':
+            print(f"MISMATCH  {ref.page}: {ref.url} (file is {ref.actual})")
+    if args.orphans:
+        for path in orphans:
+            print(f"ORPHAN    {path}")
+
+    broken = sum(1 for ref in references if ref.status == 'broken')
+    mismatched = sum(1 for ref in references if ref.status == 'mismatch')
+    print(f"\n{len(references)} internal references: {broken} broken, {mismatched} case/normalization mismatches")
+    print(f"{len(orphans)} orphaned assets{'' if args.orphans else ' (list them with --orphans)'}")
+    print(f"Reverse index of {len(reverse)} targets saved to {REFERENCES_PATH}")
+
+
+if __name__ == "__main__":
+    main()
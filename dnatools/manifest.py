@@ -0,0 +1,245 @@
+"""
+Persistent record of which files each tool has already processed.
+
+Every entry is keyed by tool and path and remembers the file's size, mtime and
+content hash after the tool ran, the version of the tool's rules, and the result.
+A later run skips files whose entry still matches, so only new or changed pages
+are touched again.
+
+While a run is in progress every completed file is also appended to a journal
+(.dnatools/journal/<tool>.jsonl), one line per file, written by whichever
+process handled it. The journal is removed when the run finishes and the
+manifest is saved; if the run is killed, the next run folds the journal into
+the manifest so no file is converted twice, and --resume additionally keeps
+--force from redoing the files the interrupted run completed.
+
+Several tools (say watch and a batch fixer) can share the manifest at once:
+each only keeps track of the entries it changed, and saving re-reads the file
+and merges those in under a lock, so no run drops another's entries.
+"""
+
+import hashlib
+import json
+import os
+from functools import partial
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; saves are then unlocked
+    fcntl = None
+
+from dnatools.backupstore import replace_file
+from dnatools.batch import run_batch
+
+MANIFEST_PATH = os.path.join('.dnatools', 'manifest.json')
+JOURNAL_DIR = 'journal'     # next to the manifest
+
+
+def file_hash(filepath):
+    """Content hash used to tell real edits from a touched mtime."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_entry(filepath, version, result):
+    """The record kept for a file a tool just processed, or None if it is gone."""
+    try:
+        stat = os.stat(filepath)
+        content_hash = file_hash(filepath)
+    except OSError:
+        return None
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': content_hash,
+        'version': version,
+        'result': result,
+    }
+
+
+class Manifest:
+    """Per-tool processing records stored as a single JSON file."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = str(path)
+        self.entries = self._load()
+        # (tool, path) -> entry this run set, or None for one it forgot
+        self.changes = {}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable manifest {self.path}: {e}")
+            return {}
+
+    def set(self, filepath, tool, entry):
+        """Store an entry as it is (e.g. one taken from a journal)."""
+        path = os.path.normpath(str(filepath))
+        self.entries.setdefault(tool, {})[path] = entry
+        self.changes[(tool, path)] = entry
+
+    def forget(self, filepath, tool):
+        """Drop the tool's entry so the file is processed again."""
+        path = os.path.normpath(str(filepath))
+        self.entries.get(tool, {}).pop(path, None)
+        self.changes[(tool, path)] = None
+
+    def is_current(self, filepath, tool, version):
+        """True if the tool (at this rules version) already processed this exact content."""
+        entry = self.entries.get(tool, {}).get(os.path.normpath(str(filepath)))
+        if not entry or entry['version'] != version:
+            return False
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return False
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return True
+        # Touched but maybe not edited: fall back to the content hash
+        if file_hash(filepath) != entry['hash']:
+            return False
+        entry['mtime_ns'] = stat.st_mtime_ns
+        self.changes[(tool, os.path.normpath(str(filepath)))] = entry
+        return True
+
+    def record(self, filepath, tool, version, result):
+        """Remember the file's current state after the tool processed it."""
+        entry = file_entry(filepath, version, result)
+        if entry is not None:
+            self.set(filepath, tool, entry)
+
+    def save(self):
+        """Merge this run's changes into the manifest on disk and write it atomically."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Whatever other tools saved since this one loaded the manifest is kept
+            entries = self._load()
+            for (tool, path), entry in self.changes.items():
+                if entry is None:
+                    entries.get(tool, {}).pop(path, None)
+                else:
+                    entries.setdefault(tool, {})[path] = entry
+            replace_file(self.path, json.dumps(entries, ensure_ascii=False, indent=1, sort_keys=True), 'utf-8')
+        self.entries = entries
+        self.changes = {}
+
+
+class Journal:
+    """Append-only list of the files the current (or an interrupted) run of a tool completed."""
+
+    def __init__(self, tool, directory):
+        self.path = os.path.join(directory, f'{tool}.jsonl')
+
+    def entries(self):
+        """path -> manifest entry for every completed file; a torn last line is ignored."""
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries[entry.pop('path')] = entry
+        except OSError:
+            pass
+        return entries
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        open(self.path, 'w').close()
+
+    def append(self, filepath, version, result):
+        entry = file_entry(filepath, version, result)
+        if entry is None:
+            return
+        entry['path'] = os.path.normpath(str(filepath))
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        # One O_APPEND write per file keeps lines whole across worker processes
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _journaled(func, journal, version, path):
+    """Call func(path), then checkpoint the file as done."""
+    result = func(path)
+    journal.append(path, version, result)
+    return result
+
+
+def run_incremental(func, paths, tool, version, jobs=1, force=False, resume=False,
+                    manifest_path=MANIFEST_PATH):
+    """Run func only over paths the manifest does not list as current for this tool.
+
+    Returns results aligned with paths; skipped files get None, files completed
+    by an interrupted run that is being resumed get the result it recorded.
+    """
+    paths = list(paths)
+    manifest = Manifest(manifest_path)
+    journal = Journal(tool, os.path.join(os.path.dirname(manifest_path), JOURNAL_DIR))
+
+    # Whatever an interrupted run finished is processed content, resumed or not
+    completed = journal.entries()
+    if completed:
+        for path, entry in completed.items():
+            manifest.set(path, tool, entry)
+        if resume:
+            print(f"Resuming: {len(completed)} files were completed by the interrupted run")
+        else:
+            print(f"An earlier run was interrupted after {len(completed)} files; "
+                  f"they are kept as processed (use --resume to continue it)")
+            manifest.save()
+            completed = {}
+    if not resume or not completed:
+        journal.start()
+
+    results = [None] * len(paths)
+    pending = []
+    skipped = 0
+    for i, path in enumerate(paths):
+        current = manifest.is_current(path, tool, version)
+        if current and os.path.normpath(str(path)) in completed:
+            results[i] = completed[os.path.normpath(str(path))]['result']
+        elif force or not current:
+            pending.append(i)
+        else:
+            skipped += 1
+
+    if skipped:
+        print(f"Skipping {skipped} unchanged files (use --force to reprocess)")
+
+    try:
+        pending_results = run_batch(partial(_journaled, func, journal, version),
+                                    [paths[i] for i in pending], jobs=jobs)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; completed files are in {journal.path} (run again with --resume)")
+        raise
+    for i, result in zip(pending, pending_results):
+        results[i] = result
+        manifest.record(paths[i], tool, version, result)
+
+    manifest.save()
+    journal.remove()
+    return results
@@ -0,0 +1,180 @@
+"""
+Per-file and per-stage measurements for batch runs.
+
+Every tool that uses dnatools.batch.add_batch_arguments accepts
+
+    --metrics out.jsonl   one JSON record per file, plus a summary of the
+                          slowest files and stages at the end of the run
+    --profile             run under cProfile and print the top functions
+                          (use -j 1 so the fixers run in the profiled process)
+
+While a run is measured, run_batch wraps every call so each file gets its wall
+and CPU time, bytes in/out (file size before and after) and any exception that
+escaped. Code inside the call adds detail through
+
+    with metrics.stage('detect'):    # time a stage of the current file
+        ...
+    metrics.note(detection='meta')   # attach a field to the current file
+    metrics.note_error(e)            # an exception the fixer caught itself
+
+All three are no-ops when no run is being measured. detect_bytes, sniff_encoding,
+the backup-store writes and the pipeline stages are instrumented this way.
+"""
+
+import atexit
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Slowest files and top profile entries shown in the summary
+SUMMARY_ROWS = 10
+PROFILE_ROWS = 30
+
+_session = None     # the Session of this run, in the main process
+_current = None     # record of the file being processed, in whichever process runs it
+
+
+class Session:
+    """Collects the records of one run and reports them when it ends."""
+
+    def __init__(self):
+        self.path = None
+        self.records = []
+        self.profiler = None
+        atexit.register(self.finish)
+
+    def add(self, record):
+        self.records.append(record)
+
+    def finish(self):
+        if self.profiler is not None:
+            import pstats
+            self.profiler.disable()
+            print(f"\nProfile (top {PROFILE_ROWS} by cumulative time):")
+            pstats.Stats(self.profiler).sort_stats('cumulative').print_stats(PROFILE_ROWS)
+            self.profiler = None
+        if self.path is None or not self.records:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print_summary(self.records)
+        print(f"Metrics for {len(self.records)} files written to {self.path}")
+        self.records = []
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = Session()
+    return _session
+
+
+def enable(path=None, profile=False):
+    """Measure this run: write records to path and/or profile it."""
+    session = _get_session()
+    if path:
+        session.path = path
+    if profile and session.profiler is None:
+        # Imported here so unprofiled runs (and quick CLI calls) skip loading it
+        import cProfile
+        session.profiler = cProfile.Profile()
+        session.profiler.enable()
+
+
+def recording():
+    """True if per-file records are being collected."""
+    return _session is not None and _session.path is not None
+
+
+def add_record(record):
+    _get_session().add(record)
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+def measured_call(func, path):
+    """Call func(path) with a fresh record active; returns (result, record)."""
+    global _current
+    record = {'path': str(path), 'wall': 0.0, 'cpu': 0.0, 'bytes_in': _file_size(path),
+              'bytes_out': None, 'stages': {}, 'error': None}
+    _current = record
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        result = func(path)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record['wall'] = round(time.perf_counter() - wall, 6)
+        record['cpu'] = round(time.process_time() - cpu, 6)
+        record['bytes_out'] = _file_size(path)
+        _current = None
+    return result, record
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the file being processed (repeated stages add up)."""
+    record = _current
+    if record is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        totals = record['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0})
+        totals['wall'] = round(totals['wall'] + time.perf_counter() - wall, 6)
+        totals['cpu'] = round(totals['cpu'] + time.process_time() - cpu, 6)
+
+
+def note(**fields):
+    """Attach fields (detection tier, encoding, error, ...) to the file being processed."""
+    if _current is not None:
+        _current.update(fields)
+
+
+def note_error(error):
+    """Record an exception a fixer caught and reported itself."""
+    note(error=f"{type(error).__name__}: {error}")
+
+
+def print_summary(records, rows=SUMMARY_ROWS):
+    """Slowest files, time per stage, detection tiers and errors."""
+    print(f"\nSlowest {min(rows, len(records))} files:")
+    for record in sorted(records, key=lambda r: r['wall'], reverse=True)[:rows]:
+        size = record['bytes_in'] or 0
+        print(f"  {record['wall'] * 1000:9.1f} ms {record['cpu'] * 1000:9.1f} ms cpu {size:9} B  {record['path']}")
+
+    stages = defaultdict(lambda: [0, 0.0, 0.0])
+    for record in records:
+        for name, totals in record['stages'].items():
+            stages[name][0] += 1
+            stages[name][1] += totals['wall']
+            stages[name][2] += totals['cpu']
+    total_wall = sum(record['wall'] for record in records)
+    if stages:
+        print("\nTime per stage:")
+        for name, (count, wall, cpu) in sorted(stages.items(), key=lambda item: item[1][1], reverse=True):
+            share = 100 * wall / total_wall if total_wall else 0
+            print(f"  {name:12} {wall:8.3f} s {cpu:8.3f} s cpu {share:5.1f}%  ({count} files)")
+
+    tiers = Counter(record['detection'] for record in records if record.get('detection'))
+    if tiers:
+        print("\nDetection tiers: " + ', '.join(f"{tier} {count}" for tier, count in tiers.most_common()))
+    errors = [record for record in records if record['error']]
+    if errors:
+        print(f"\n{len(errors)} files failed:")
+        for record in errors[:rows]:
+            print(f"  {record['path']}: {record['error']}")
@@ -0,0 +1,217 @@
+"""
+Deploy-time HTML minifier for Word-export pages.
+
+Each page is streamed once through dnatools.htmltokens.tokenize_stream (memory
+stays bounded by the chunk size plus the longest single tag) and written to a
+temporary file that replaces the page. The rules:
+
+  - comments, <?xml ...?> processing instructions and the <![if ...]>/<![endif]>
+    markers are dropped (the doctype is kept)
+  - Office namespace tags (<o:p>, <v:shape>, <st1:place>, ...) are unwrapped and
+    namespaced attributes (v:shapes, o:title) removed
+  - mso-* and other Word-only declarations (tab-stops, text-justify, ...) are
+    removed from style attributes and <style> blocks, empty style attributes
+    dropped
+  - spans without attributes are unwrapped, spans with nothing in them dropped
+  - whitespace-only runs between tags collapse to one space or newline
+  - attribute values that need no quotes lose them
+
+Text content is never touched: every non-blank text run comes out byte for byte,
+in the page's own encoding. <pre>, <textarea> and <script> are copied verbatim.
+The pages are rewritten in place, so this is meant for the deploy/ copy that
+deploy.sh builds.
+
+    python -m dnatools.minify              # every page under deploy/
+    python -m dnatools.minify -j 0 CH-EN10-P4.html
+"""
+
+import argparse
+import os
+import re
+from collections import namedtuple
+
+from dnatools.batch import run_batch
+from dnatools.cjkscan import classify_file
+from dnatools.fsindex import DEFAULT_SKIP_DIRS, html_files
+from dnatools.htmltokens import attribute_value, parse_attributes, tokenize_stream
+
+DEFAULT_ROOT = 'deploy'
+CHUNK_SIZE = 64 * 1024
+
+MinifyResult = namedtuple('MinifyResult', ['path', 'size_in', 'size_out'])
+
+# Copied verbatim; <style> content only loses its Word-only declarations
+_VERBATIM = {'pre', 'textarea', 'script'}
+
+# Properties only Word and old IE understand; values may hold quoted font names
+_WORD_DECLARATION = re.compile(r'''
+    \s*(?:mso-[\w-]+|tab-stops|text-justify|layout-grid[\w-]*|text-autospace|punctuation-wrap)
+    \s*:(?:[^;"'}]|"[^"]*"|'[^']*')*;?''', re.IGNORECASE | re.VERBOSE)
+_SPACES = re.compile(r'\s+')
+_NEEDS_QUOTES = re.compile(r'''[\s"'=<>`]''')
+# HTML whitespace only; a run of &nbsp; (U+00A0) is content
+_BLANK = re.compile(r'[ \t\r\n\f]+')
+
+
+def _strip_mso(css):
+    return _WORD_DECLARATION.sub('', css)
+
+
+def _attribute_text(attr, raw_value):
+    if raw_value is None:
+        return attr
+    value = attribute_value(raw_value)
+    if value and not _NEEDS_QUOTES.search(value):
+        return f'{attr}={value}'
+    if raw_value[0] in '"\'':
+        return f'{attr}={raw_value}'
+    return f'{attr}="{value}"'
+
+
+def _clean_start_tag(name, text):
+    """Return (tag text, number of attributes left)."""
+    attributes = []
+    for attr, raw_value in parse_attributes(text):
+        if ':' in attr:
+            continue
+        if attr == 'style' and raw_value is not None:
+            style = _SPACES.sub(' ', _strip_mso(attribute_value(raw_value))).strip(' ;')
+            if not style:
+                continue
+            raw_value = f'"{style}"' if '"' not in style else f"'{style}'"
+        attributes.append(_attribute_text(attr, raw_value))
+    if not text.endswith('/>'):
+        closing = '>'
+    else:
+        # src=a.jpg/> would read as "a.jpg/"; the space keeps the slash out of the value
+        closing = ' />' if attributes else '/>'
+    return '<' + ' '.join([name] + attributes) + closing, len(attributes)
+
+
+def minify_tokens(tokens):
+    """Yield the minified text for a stream of Tokens."""
+    verbatim = None         # name of the <pre>/<script>/... being copied
+    in_style = False
+    pending_span = None     # start tag held back until we know the span is not empty
+    spans = []              # per open <span>: True if its start tag was dropped
+
+    for kind, text, name in tokens:
+        if verbatim is not None:
+            if kind == 'end' and name == verbatim:
+                verbatim = None
+            yield text
+            continue
+        if in_style:
+            if kind == 'end' and name == 'style':
+                in_style = False
+                yield text
+            else:
+                yield _strip_mso(text)
+            continue
+
+        if pending_span is not None:
+            held, pending_span = pending_span, None
+            if kind == 'end' and name == 'span':
+                spans.pop()
+                continue
+            yield held
+
+        if kind == 'text':
+            if _BLANK.fullmatch(text):
+                yield '\n' if '\n' in text else ' '
+            else:
+                yield text
+        elif kind in ('comment', 'pi'):
+            continue
+        elif kind == 'decl':
+            if not text.startswith('<!['):
+                yield text
+        elif ':' in name:
+            continue
+        elif kind == 'end':
+            if name == 'span' and spans and spans.pop():
+                continue
+            yield f'</{name}>'
+        else:
+            if '<' in text[1:]:
+                # An unclosed quote swallowed markup into this tag; rebuilding it
+                # would change what the browser shows, so keep it as written
+                tag, attribute_count = text, 1
+            else:
+                tag, attribute_count = _clean_start_tag(name, text)
+            if name in _VERBATIM and not text.endswith('/>'):
+                verbatim = name
+                yield tag
+            elif name == 'style':
+                in_style = True
+                yield tag
+            elif name == 'span' and not text.endswith('/>'):
+                spans.append(attribute_count == 0)
+                if attribute_count:
+                    pending_span = tag
+            else:
+                yield tag
+
+    if pending_span is not None:
+        yield pending_span
+
+
+def _read_chunks(f):
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def minify_file(filepath):
+    """Minify one page in place; returns MinifyResult or None on error."""
+    try:
+        # Latin-1 passes an unrecognised page's bytes through untouched
+        encoding = classify_file(filepath).encoding or 'latin-1'
+        tmp_path = filepath + '.min.tmp'
+        # surrogateescape carries undecodable bytes through unchanged
+        with open(filepath, 'r', encoding=encoding, errors='surrogateescape', newline='') as src, \
+                open(tmp_path, 'w', encoding=encoding, errors='surrogateescape', newline='') as dst:
+            for piece in minify_tokens(tokenize_stream(_read_chunks(src))):
+                dst.write(piece)
+        size_in = os.path.getsize(filepath)
+        size_out = os.path.getsize(tmp_path)
+        os.replace(tmp_path, filepath)
+        return MinifyResult(filepath, size_in, size_out)
+    except Exception as e:
+        print(f"Error minifying {filepath}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strip Word-export bloat from pages (in place).")
+    parser.add_argument('paths', nargs='*', help=f'pages or directories (default: {DEFAULT_ROOT}/)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (0 = one per CPU, default: 1)')
+    args = parser.parse_args()
+
+    paths = []
+    for root in args.paths or [DEFAULT_ROOT]:
+        if os.path.isfile(root):
+            paths.append(os.path.normpath(root))
+        else:
+            # deploy/ is skipped by default everywhere else; here it is the target. No
+            # index cache either, it would be written into (and deployed with) root.
+            paths.extend(html_files(root, DEFAULT_SKIP_DIRS - {DEFAULT_ROOT}, use_cache=False))
+
+    results = [result for result in run_batch(minify_file, paths, jobs=args.jobs) if result]
+    for result in sorted(results, key=lambda r: r.size_in - r.size_out, reverse=True):
+        saved = result.size_in - result.size_out
+        percent = 100 * saved / result.size_in if result.size_in else 0
+        print(f"{result.size_in:9} -> {result.size_out:9}  {percent:5.1f}%  {result.path}")
+
+    total_in = sum(result.size_in for result in results)
+    total_out = sum(result.size_out for result in results)
+    if total_in:
+        print(f"\nMinified {len(results)} pages: {total_in / 1e6:.1f} MB -> {total_out / 1e6:.1f} MB "
+              f"({100 * (total_in - total_out) / total_in:.1f}% smaller)")
+
+
+if __name__ == "__main__":
+    main()
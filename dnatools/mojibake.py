@@ -0,0 +1,361 @@
+"""
+Learn a repair table for mojibake from the backup originals, and apply it.
+
+Many pages went through a misdecode: their GBK bytes were read as UTF-8 (bytes
+that are not valid UTF-8 became U+FFFD) and saved that way. The backups_gb18030*
+folders hold copies of pages from both sides of that accident, under the same
+names as the pages in the tree. learn pairs them up and, for each pair:
+
+  - works out which side is clean and which misdecode path (source encoding,
+    misread as) turns the clean side's Chinese runs into text that occurs in
+    the corrupted side, trying the MISDECODE_PATHS
+  - takes every maximal run of Chinese text on the clean side, misdecodes it
+    along that path and keeps (garbled -> run) when the garbled form really
+    occurs in the corrupted side
+
+The table is then verified, and a garbled form is dropped when:
+
+  - it has fewer than MIN_KNOWN_CHARS characters that are not U+FFFD; each
+    U+FFFD hides bytes, so such a key is mostly guesswork and matches garbled
+    text it was never learned from ('·��' is 路线 but also 路口)
+  - several different runs of the clean pages produce it (U+FFFD makes the
+    misdecode lossy), or it occurs anywhere in a clean page
+  - applied to the clean pages after garbling them the same way, it turns a
+    run into text that run does not contain
+  - applied to the aligned backups, it produces a run the matching clean page
+    does not contain
+
+The result is cached in .dnatools/mojibake.json, keyed on the backup files
+only (so the fixers' own page writes do not invalidate it), and applied with
+dnatools.rewrite.Rewriter, so every page is repaired in one scan whatever the
+size of the table. Batch runs load it in the parent process before the pool
+starts; `learn` rebuilds it after the tree's clean pages changed.
+
+    python -m dnatools.mojibake learn            # (re)build and report the table
+    python -m dnatools.mojibake apply            # repair every page
+    python -m dnatools.mojibake apply CHT7-P2.html -j 0
+    python -m dnatools mojibake 'T4-P*.html'   # same as apply
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+from collections import Counter, defaultdict, namedtuple
+
+from dnatools import metrics
+from dnatools.backupstore import PROJECT_ROOT, replace_file, write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.fsindex import html_files
+from dnatools.manifest import run_incremental
+from dnatools.rewrite import Rewriter
+
+TOOL = 'mojibake'
+# Bump whenever the learning below changes so the table is relearned and pages are redone
+RULES_VERSION = 2
+
+BACKUP_GLOB = 'backups_gb18030*'
+TABLE_PATH = os.path.join(PROJECT_ROOT, '.dnatools', 'mojibake.json')
+
+# (encoding the page was written in, encoding it was misread as)
+MISDECODE_PATHS = (
+    ('gbk', 'utf-8'),
+    ('gbk', 'latin-1'),
+    ('gbk', 'cp1252'),
+    ('big5', 'utf-8'),
+    ('big5', 'latin-1'),
+)
+
+# A pair is only learned from when this many of its runs are found misdecoded
+MIN_PAIR_HITS = 3
+# Runs tried per pair while working out its misdecode path
+PATH_SAMPLE_RUNS = 60
+# Shorter garbled forms are too likely to occur by accident
+MIN_KEY_LENGTH = 2
+# Characters of a key that must be readable (not U+FFFD)
+MIN_KNOWN_CHARS = 2
+# Longer runs are whole paragraphs that never recur on another page
+MAX_RUN_LENGTH = 200
+
+# CJK punctuation, unified ideographs and fullwidth forms (U+FFFD is not included)
+_RUN = re.compile('[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]+')
+_REPLACEMENT = '\ufffd'
+
+Pair = namedtuple('Pair', ['clean', 'corrupted', 'path', 'hits', 'runs'])
+
+
+def misdecode(text, path):
+    """What text turns into when encoded as path[0] and read back as path[1]."""
+    source, misread = path
+    return text.encode(source).decode(misread, 'replace')
+
+
+def chinese_runs(text):
+    """The distinct maximal runs of Chinese text, longest runs left out."""
+    return {run for run in _RUN.findall(text) if len(run) <= MAX_RUN_LENGTH}
+
+
+def _garbled_runs(runs, path):
+    """(garbled, run) for the runs that path can misdecode into something non-ASCII."""
+    for run in runs:
+        try:
+            key = misdecode(run, path)
+        except UnicodeEncodeError:
+            continue
+        if len(key) >= MIN_KEY_LENGTH and not key.isascii():
+            yield key, run
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def backup_pairs(root=PROJECT_ROOT):
+    """(tree page, backup copy) for every backup file whose page still exists."""
+    pairs = []
+    for folder in sorted(glob.glob(os.path.join(root, BACKUP_GLOB))):
+        for directory, _, names in os.walk(folder):
+            for name in sorted(names):
+                backup = os.path.join(directory, name)
+                page = os.path.join(root, os.path.relpath(backup, folder))
+                if os.path.isfile(page):
+                    pairs.append((page, backup))
+    return pairs
+
+
+def align(page, backup):
+    """Orient a (page, backup) pair and find its misdecode path; None if neither side is a misdecode of the other."""
+    texts = {page: _read(page), backup: _read(backup)}
+    runs = {path: chinese_runs(text) for path, text in texts.items()}
+    best = None
+    for clean, corrupted in ((page, backup), (backup, page)):
+        sample = sorted(runs[clean], key=len, reverse=True)[:PATH_SAMPLE_RUNS]
+        for path in MISDECODE_PATHS:
+            hits = sum(1 for key, _ in _garbled_runs(sample, path) if key in texts[corrupted])
+            if best is None or hits > best.hits:
+                best = Pair(clean, corrupted, path, hits, len(runs[clean]))
+    if best is None or best.hits < MIN_PAIR_HITS:
+        return None
+    return best
+
+
+def _clean_pages(root, skip):
+    """Text of every page without U+FFFD, except those in skip."""
+    texts = {}
+    for path in html_files(root):
+        if path not in skip:
+            text = _read(path)
+            if _REPLACEMENT not in text:
+                texts[path] = text
+    return texts
+
+
+def learn(root=PROJECT_ROOT):
+    """Build and verify the table; returns (entries, report)."""
+    pairs = [pair for pair in (align(page, backup) for page, backup in backup_pairs(root)) if pair]
+    texts = {}
+    for pair in pairs:
+        for path in (pair.clean, pair.corrupted):
+            texts.setdefault(path, _read(path))
+
+    # Candidates: misdecoded runs of each clean side found in its corrupted side
+    candidates = defaultdict(set)
+    for pair in pairs:
+        corrupted = texts[pair.corrupted]
+        for key, run in _garbled_runs(chinese_runs(texts[pair.clean]), pair.path):
+            if key in corrupted:
+                candidates[key].add(run)
+
+    # Every clean text on the site: clean sides of the pairs plus the tree's clean pages
+    corrupted_sides = {os.path.normpath(pair.corrupted) for pair in pairs}
+    clean_texts = _clean_pages(root, corrupted_sides)
+    clean_texts.update((pair.clean, texts[pair.clean]) for pair in pairs)
+    paths = {pair.path for pair in pairs}
+
+    # Lossy keys: other clean runs that misdecode to the same garbled text
+    for text in clean_texts.values():
+        for path in paths:
+            for key, run in _garbled_runs(chinese_runs(text), path):
+                if key in candidates:
+                    candidates[key].add(run)
+    ambiguous = [key for key, runs in candidates.items() if len(runs) > 1]
+    entries = {key: runs.pop() for key, runs in candidates.items() if len(runs) == 1}
+
+    unreadable = [key for key in entries if len(key) - key.count(_REPLACEMENT) < MIN_KNOWN_CHARS]
+    for key in unreadable:
+        del entries[key]
+
+    # Keys that occur in clean text would damage it
+    finder = Rewriter(dict.fromkeys(entries, ''))
+    in_clean = set()
+    for text in clean_texts.values():
+        in_clean.update(finder.pattern.findall(text))
+    for key in in_clean:
+        entries.pop(key, None)
+
+    # Clean runs garbled on purpose must repair back to themselves; dropping a
+    # key lets shorter ones match instead, so repeat until none misfires
+    garbled_clean = [(key, run) for text in clean_texts.values() for path in paths
+                     for key, run in _garbled_runs(chinese_runs(text), path)]
+    misrepairs = set()
+    while True:
+        pattern = Rewriter(entries).pattern
+        wrong = {match.group(0) for key, run in garbled_clean for match in pattern.finditer(key)
+                 if entries[match.group(0)] not in run}
+        if not wrong:
+            break
+        misrepairs |= wrong
+        for key in wrong:
+            del entries[key]
+
+    # Applied to the aligned backups, every repaired run must be in the clean side
+    pattern = Rewriter(entries).pattern
+    unconfirmed = set()
+    for pair in pairs:
+        clean = texts[pair.clean]
+        for key in pattern.findall(texts[pair.corrupted]):
+            if entries[key] not in clean:
+                unconfirmed.add(key)
+    for key in unconfirmed:
+        entries.pop(key, None)
+
+    report = {
+        'pairs': [{'clean': os.path.relpath(pair.clean, root), 'corrupted': os.path.relpath(pair.corrupted, root),
+                   'path': '>'.join(pair.path), 'runs': pair.runs, 'sample_hits': pair.hits} for pair in pairs],
+        'unaligned': len(backup_pairs(root)) - len(pairs),
+        'paths': dict(Counter('>'.join(pair.path) for pair in pairs)),
+        'candidates': len(candidates),
+        'ambiguous': len(ambiguous),
+        'unreadable': len(unreadable),
+        'in_clean_text': len(in_clean),
+        'misrepairs': len(misrepairs),
+        'unconfirmed': len(unconfirmed),
+        'entries': len(entries),
+    }
+    return entries, report
+
+
+def backups_signature(root=PROJECT_ROOT):
+    """Changes whenever a backup file changes, so the cached table is relearned.
+
+    The pages themselves are left out: every fixer run writes them.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(RULES_VERSION).encode())
+    for folder in sorted(glob.glob(os.path.join(root, BACKUP_GLOB))):
+        for directory, _, names in sorted(os.walk(folder)):
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, root)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def save_table(entries, report, signature, path=TABLE_PATH):
+    """Write the table atomically (through a tmp file unique to this process)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Escaped, so U+FFFD and stray control characters in the keys stay visible
+    replace_file(path, json.dumps({'signature': signature, 'report': report, 'entries': entries},
+                                  ensure_ascii=True, indent=1, sort_keys=True), 'utf-8')
+
+
+def load_table(path=TABLE_PATH, root=PROJECT_ROOT):
+    """The cached table, relearned first if the backups changed."""
+    signature = backups_signature(root)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        if table.get('signature') == signature:
+            return table['entries']
+    except (OSError, ValueError):
+        pass
+    print(f"Learning the mojibake table from {BACKUP_GLOB} (cached in {os.path.relpath(path, root)})")
+    entries, report = learn(root)
+    save_table(entries, report, signature, path)
+    return entries
+
+
+_repairer = None
+
+
+def default_repairer():
+    """Rewriter over the learned table, built once per process."""
+    global _repairer
+    if _repairer is None:
+        _repairer = Rewriter(load_table())
+    return _repairer
+
+
+def repair_text(text):
+    """Return (text, number of runs repaired)."""
+    text, hits = default_repairer().rewrite(text)
+    return text, sum(hits.values())
+
+
+def repair_file(filepath):
+    """Repair one page in place; returns the number of runs repaired."""
+    try:
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        repaired, count = repair_text(content)
+        if count and repaired != content:
+            write_text(filepath, repaired, TOOL)
+            return count
+        return 0
+    except Exception as e:
+        print(f"Error processing {filepath}: {e}")
+        metrics.note_error(e)
+        return 0
+
+
+def table_version():
+    """Manifest version: a relearned table means pages are worth another look."""
+    digest = hashlib.blake2b(json.dumps(default_repairer().mappings, sort_keys=True).encode('utf-8'), digest_size=8)
+    return f"{RULES_VERSION}:{digest.hexdigest()}"
+
+
+def repair_files(paths, jobs=1, force=False, resume=False):
+    """Repair pages that changed (or the table did) since they were last repaired."""
+    results = run_incremental(repair_file, paths, TOOL, table_version(), jobs=jobs, force=force, resume=resume)
+    repaired = [(path, count) for path, count in zip(paths, results) if count]
+    for path, count in repaired:
+        print(f"Repaired {count} runs in {path}")
+    print(f"\nRepaired {sum(count for _, count in repaired)} runs in {len(repaired)} of {len(paths)} files")
+    return results
+
+
+def print_report(report):
+    print(f"Aligned {len(report['pairs'])} backup/page pairs ({report['unaligned']} others are not misdecodes)")
+    for path, count in sorted(report['paths'].items(), key=lambda item: -item[1]):
+        print(f"  {path}: {count} pairs")
+    print(f"Candidates {report['candidates']}: dropped {report['ambiguous']} ambiguous, "
+          f"{report['unreadable']} mostly U+FFFD, {report['in_clean_text']} found in clean text, "
+          f"{report['misrepairs']} misrepairing garbled clean text, {report['unconfirmed']} unconfirmed")
+    print(f"Table: {report['entries']} entries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn and apply the mojibake repair table.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('learn', help=f'rebuild the table from {BACKUP_GLOB} and report it')
+    apply_parser = commands.add_parser('apply', help='repair pages with the table')
+    apply_parser.add_argument('paths', nargs='*', help='pages to repair (default: every HTML page)')
+    add_batch_arguments(apply_parser)
+    args = parser.parse_args()
+
+    if args.command == 'learn':
+        entries, report = learn()
+        save_table(entries, report, backups_signature())
+        print_report(report)
+        print(f"Written to {os.path.relpath(TABLE_PATH)}")
+        return
+
+    repair_files([os.path.normpath(path) for path in args.paths] or html_files('.'),
+                 args.jobs, args.force, args.resume)
+
+
+if __name__ == "__main__":
+    main()
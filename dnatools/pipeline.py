@@ -0,0 +1,193 @@
+"""
+Run the page fixers as stages over one in-memory copy of each page.
+
+Each page is read and decoded once (dnatools.detect), handed through the ordered
+stages, and written back at most once: only if some stage changed the text or
+the encoding it will be saved in. A page is never left on disk converted but not
+yet relabelled, because the conversion and relabelling happen in the same write.
+
+A stage is a function taking a Document and returning the new text. A stage
+whose output declares UTF-8 asks for it with doc.to_utf8(), which only agrees
+when the encoding stage converted the page or its bytes decoded without loss;
+otherwise the page is written back in the encoding it came in, and not at all
+if its text lost bytes when it was decoded. The existing scripts provide the
+stages:
+
+    encoding    fix_chinese_files.encoding_stage
+    add_pages   tools/fix_add_pages.add_pages_stage
+    styling     tools/update_styling.styling_stage
+    structure   fix_html_structure.structure_stage
+    filenames   update_filenames.filenames_stage
+    dimensions  dnatools.imagesize.dimensions_stage
+
+    python -m dnatools.pipeline                      # all stages, whole site
+    python -m dnatools.pipeline --stages structure,filenames T18-1END.html
+"""
+
+import argparse
+import importlib
+import os
+import sys
+from collections import Counter
+from functools import partial
+
+from dnatools import metrics
+from dnatools.backupstore import PROJECT_ROOT, write_bytes
+from dnatools.batch import add_batch_arguments
+from dnatools.detect import detect_bytes
+from dnatools.fsindex import html_files
+from dnatools.manifest import run_incremental
+
+# name -> (module, function); modules are imported on first use
+STAGES = {
+    'encoding': ('fix_chinese_files', 'encoding_stage'),
+    'add_pages': ('tools.fix_add_pages', 'add_pages_stage'),
+    'styling': ('tools.update_styling', 'styling_stage'),
+    'structure': ('fix_html_structure', 'structure_stage'),
+    'filenames': ('update_filenames', 'filenames_stage'),
+    'dimensions': ('dnatools.imagesize', 'dimensions_stage'),
+}
+
+DEFAULT_STAGES = tuple(STAGES)
+
+TOOL = 'pipeline'
+
+
+class Document:
+    """One page as it moves through the stages."""
+
+    def __init__(self, path, raw, detection):
+        self.path = path
+        self.raw = raw
+        self.detection = detection
+        self.source_encoding = detection.encoding
+        # Encoding the page will be written in; the encoding stage and to_utf8 set 'utf-8'
+        self.encoding = detection.encoding
+        self.text = detection.text
+        self._lossless = None
+
+    @property
+    def lossless(self):
+        """True if the source bytes decoded strictly, so text holds all of them."""
+        if self._lossless is None:
+            try:
+                str(self.raw, self.source_encoding)
+                self._lossless = True
+            except UnicodeDecodeError:
+                self._lossless = False
+        return self._lossless
+
+    def to_utf8(self):
+        """Switch the page to UTF-8 if nothing is lost by it; returns whether it is written as UTF-8."""
+        if self.encoding != 'utf-8' and self.lossless:
+            self.encoding = 'utf-8'
+        return self.encoding == 'utf-8'
+
+
+def _stage_module(name):
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    return importlib.import_module(STAGES[name][0])
+
+
+def load_stages(names):
+    """Resolve stage names to [(name, function), ...] in the given order."""
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        raise ValueError(f"unknown stage(s): {', '.join(unknown)} (known: {', '.join(STAGES)})")
+    return [(name, getattr(_stage_module(name), STAGES[name][1])) for name in names]
+
+
+def _stage_version(name):
+    module = _stage_module(name)
+    if hasattr(module, 'stage_version'):
+        return module.stage_version()
+    return getattr(module, 'RULES_VERSION', 1)
+
+
+def stages_version(names):
+    """Manifest version covering the stage order and each stage's rules version.
+
+    A stage module may define stage_version() instead, for rules that depend on
+    data (it is called here, in the parent, before any worker starts).
+    """
+    return ','.join(f"{name}:{_stage_version(name)}" for name in names)
+
+
+def run_stages(doc, stages):
+    """Pass doc through the stages; returns the names of the stages that changed it."""
+    fired = []
+    for name, stage in stages:
+        before = (doc.text, doc.encoding)
+        with metrics.stage(name):
+            doc.text = stage(doc)
+        if (doc.text, doc.encoding) != before:
+            fired.append(name)
+    return fired
+
+
+def process_file(filepath, stage_names=DEFAULT_STAGES):
+    """Read, transform and (if changed) write one page; returns the stages that fired."""
+    try:
+        with metrics.stage('read'):
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+        detection = detect_bytes(raw)
+        if detection.encoding is None:
+            print(f"Skipping {filepath}: encoding not recognised")
+            return []
+        doc = Document(filepath, raw, detection)
+        fired = run_stages(doc, load_stages(stage_names))
+        if not fired:
+            return []
+        if doc.encoding == doc.source_encoding and not doc.lossless:
+            # Written back as it came in, the bytes dropped while decoding would be lost
+            print(f"Skipping {filepath}: {doc.source_encoding} text did not decode cleanly")
+            return []
+        with metrics.stage('encode'):
+            data = doc.text.encode(doc.encoding, 'xmlcharrefreplace')
+        if data == raw:
+            return []
+        write_bytes(filepath, data, TOOL, original=raw)
+        return fired
+    except Exception as e:
+        print(f"Error processing {filepath}: {e}")
+        metrics.note_error(e)
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the page fixers over each page in one read and one write.")
+    parser.add_argument('paths', nargs='*', help='pages to process (default: every HTML page)')
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES),
+                        help=f"comma-separated stages in order (default: {','.join(DEFAULT_STAGES)})")
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    stage_names = tuple(name.strip() for name in args.stages.split(',') if name.strip())
+    try:
+        load_stages(stage_names)
+    except ValueError as e:
+        parser.error(str(e))
+
+    paths = [os.path.normpath(path) for path in args.paths] or html_files('.')
+    print(f"Running {', '.join(stage_names)} over {len(paths)} files")
+
+    results = run_incremental(partial(process_file, stage_names=stage_names), paths,
+                              TOOL, stages_version(stage_names), jobs=args.jobs, force=args.force, resume=args.resume)
+
+    per_stage = Counter()
+    written = 0
+    for filepath, fired in zip(paths, results):
+        if fired:
+            written += 1
+            per_stage.update(fired)
+            print(f"Updated {filepath}: {', '.join(fired)}")
+
+    print(f"\nWrote {written} of {len(paths)} files")
+    for name in stage_names:
+        print(f"  {name:10} changed {per_stage[name]} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Apply a whole table of string replacements in one scan of the text.
+
+All keys are compiled into a single regex shaped like a trie of the keys: keys
+sharing a prefix share one branch, so at each position the engine follows one
+path character by character instead of trying every key in turn, and a longer
+key wins over its prefix ('英文B1封面.jpg' over '英文B1封面'). Every match is
+looked up in the table. The cost is linear in the size of the document instead of
+one full pass per mapping, and stays flat as the table grows to thousands of keys.
+"""
+
+import os
+import re
+from collections import Counter
+from urllib.parse import unquote
+
+# src="..." / href='...' / src=unquoted (old Word exports often skip the quotes)
+_ATTRIBUTE_VALUE = re.compile(
+    r'''(\b(?:src|href)\s*=\s*)("[^"]*"|'[^']*'|[^\s"'>]+)''',
+    re.IGNORECASE,
+)
+
+
+def resolve_local(page_dir, url):
+    """Resolve a relative src/href value against the page's directory.
+
+    Returns (local path, '?query#fragment' suffix, was_percent_encoded), or None
+    for external, absolute, data: and fragment-only URLs.
+    """
+    if not url or url.startswith(('#', '/', 'data:')) or ':' in url.split('/', 1)[0]:
+        return None
+    cut = min((i for i in (url.find('#'), url.find('?')) if i >= 0), default=len(url))
+    target, suffix = url[:cut], url[cut:]
+    decoded = unquote(target)
+    path = os.path.normpath(os.path.join(page_dir, decoded.replace('\\', '/')))
+    return path, suffix, decoded != target
+
+
+def rewrite_references(text, replace):
+    """Call replace(url) on every src/href value; quoting is kept as written.
+
+    replace returns the new URL (or the same one to leave it alone). Returns
+    (new_text, number_of_values_changed).
+    """
+    changed = 0
+
+    def replace_value(match):
+        nonlocal changed
+        raw = match.group(2)
+        quote = raw[0] if raw[0] in '"\'' else ''
+        url = raw[1:-1] if quote else raw
+        new_url = replace(url)
+        if new_url == url:
+            return match.group(0)
+        changed += 1
+        return match.group(1) + quote + new_url + quote
+
+    return _ATTRIBUTE_VALUE.sub(replace_value, text), changed
+
+
+def trie_pattern(keys):
+    """Regex source matching the longest of keys at a position, branching like a trie."""
+    trie = {}
+    for key in keys:
+        if key:
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[''] = {}    # a key ends here
+
+    def branch(node):
+        alternatives = [re.escape(char) + branch(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        source = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+        # Greedy: a key that ends here only matches if no longer one continues
+        return f'(?:{source})?' if '' in node else source
+
+    return branch(trie)
+
+
+class Rewriter:
+    """Compiled multi-pattern replacer built once from a mapping table."""
+
+    def __init__(self, mappings):
+        self.mappings = dict(mappings)
+        self.pattern = re.compile(trie_pattern(self.mappings))
+
+    def rewrite(self, text, attributes_only=False):
+        """Return (new_text, hits) where hits counts replacements per old name."""
+        hits = Counter()
+
+        def replace(match):
+            old_name = match.group(0)
+            hits[old_name] += 1
+            return self.mappings[old_name]
+
+        if not self.pattern.pattern:
+            return text, hits
+
+        if attributes_only:
+            def replace_value(match):
+                return match.group(1) + self.pattern.sub(replace, match.group(2))
+            text = _ATTRIBUTE_VALUE.sub(replace_value, text)
+        else:
+            text = self.pattern.sub(replace, text)
+
+        return text, hits
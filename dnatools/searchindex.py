@@ -0,0 +1,220 @@
+"""
+Build the client-side full-text search index for the deploy tree.
+
+Visible text is taken from each page (decoded from its own encoding, <script>,
+<style> and comments skipped) and split into terms: Chinese runs become
+overlapping character bigrams (a lone character stays a unigram), everything
+else lower-cased words. The inverted index is written to deploy/search/ as
+
+  meta.json      page URLs and titles, shard count, format version
+  shard-N.bin    the terms whose FNV-1a hash falls into shard N
+
+so assets/js/search.js (copied to deploy/search/search.js) only fetches the
+shards for the terms in a query. A shard is a sequence of varints:
+
+  term count, then per term (sorted): byte length, UTF-8 bytes,
+  posting count, then per posting: page id delta, term frequency
+
+The terms of every page are cached by content hash in .dnatools/searchindex.json,
+so a rebuild only re-reads pages that changed.
+
+    python -m dnatools.searchindex -j 0
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import unicodedata
+from collections import Counter, defaultdict
+
+from dnatools.batch import run_batch
+from dnatools.dedup import is_export_asset
+from dnatools.detect import detect_bytes
+from dnatools.fsindex import DEFAULT_SKIP_DIRS, html_files
+from dnatools.htmltokens import tokenize
+from dnatools.manifest import file_hash
+
+DEFAULT_ROOT = 'deploy'
+INDEX_DIR = 'search'
+CACHE_PATH = os.path.join('.dnatools', 'searchindex.json')
+CLIENT_SCRIPT = os.path.join('assets', 'js', 'search.js')
+FORMAT_VERSION = 1
+# Bump when extraction or tokenization changes so cached terms are redone
+RULES_VERSION = 2
+# Shards are sized so a query term costs one small request
+TARGET_SHARD_BYTES = 32 * 1024
+
+_HIDDEN = {'script', 'style', 'title'}
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+# Words are runs of letters and digits, [\p{L}\p{N}] in search.js; in Python's
+# Unicode mode [^\W_] is the same set (str.isalnum). Never the ASCII-only \W of JS.
+_TERMS = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+
+
+def fnv1a(term):
+    """32-bit FNV-1a of the term's UTF-8 bytes (search.js computes the same)."""
+    value = 0x811c9dc5
+    for byte in term.encode('utf-8'):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value
+
+
+def tokenize_terms(text):
+    """Yield search terms: CJK character bigrams and lower-cased words, after NFKC (so ＤＮＡ is dna)."""
+    for cjk, word in _TERMS.findall(unicodedata.normalize('NFKC', text).lower()):
+        if cjk:
+            if len(cjk) == 1:
+                yield cjk
+            for i in range(len(cjk) - 1):
+                yield cjk[i:i + 2]
+        elif len(word) > 1 or unicodedata.category(word)[0] == 'N':
+            yield word
+
+
+def extract_text(content):
+    """Return (title, visible text) of a page."""
+    title = []
+    text = []
+    hidden = None
+    for kind, tag, name in tokenize(content):
+        if hidden is not None:
+            if kind == 'end' and name == hidden:
+                hidden = None
+            elif hidden == 'title' and kind == 'text':
+                title.append(tag)
+            continue
+        if kind == 'start' and name in _HIDDEN and not tag.endswith('/>'):
+            hidden = name
+        elif kind == 'text':
+            text.append(tag)
+        elif kind == 'start' and name in ('br', 'p', 'div', 'td', 'li', 'tr', 'h1', 'h2', 'h3', 'h4'):
+            text.append(' ')
+    return html.unescape(' '.join(''.join(title).split())), html.unescape(''.join(text))
+
+
+def page_terms(filepath):
+    """{'hash', 'title', 'terms': {term: count}} for one page, or None on error."""
+    try:
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        title, text = extract_text(detect_bytes(raw).text)
+        return {
+            'hash': hashlib.blake2b(raw, digest_size=16).hexdigest(),
+            'title': title,
+            'terms': dict(Counter(tokenize_terms(title + ' ' + text))),
+        }
+    except Exception as e:
+        print(f"Error indexing {filepath}: {e}")
+        return None
+
+
+def _varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_shard(postings):
+    """Pack {term: [(page id, frequency), ...]} into the shard format."""
+    out = bytearray()
+    _varint(len(postings), out)
+    for term in sorted(postings):
+        encoded = term.encode('utf-8')
+        _varint(len(encoded), out)
+        out += encoded
+        _varint(len(postings[term]), out)
+        previous = 0
+        for page_id, frequency in postings[term]:
+            _varint(page_id - previous, out)
+            _varint(frequency, out)
+            previous = page_id
+    return bytes(out)
+
+
+def _load_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get('pages', {}) if cache.get('version') == RULES_VERSION else {}
+
+
+def _save_cache(pages, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': RULES_VERSION, 'pages': pages}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def build_index(root=DEFAULT_ROOT, jobs=1, cache_path=CACHE_PATH):
+    """Write root/search/; returns (pages indexed, pages re-read, terms, shards)."""
+    root = os.path.normpath(root)
+    # deploy/ is skipped by default everywhere else; here it is the target. No
+    # index cache either, it would be written into (and deployed with) root.
+    pages = [path for path in html_files(root, DEFAULT_SKIP_DIRS - {DEFAULT_ROOT}, use_cache=False)
+             if not is_export_asset(path)]
+    cache = _load_cache(cache_path)
+
+    changed = [path for path in pages
+               if path not in cache or cache[path]['hash'] != file_hash(path)]
+    for path, entry in zip(changed, run_batch(page_terms, changed, jobs=jobs)):
+        if entry is None:
+            cache.pop(path, None)
+        else:
+            cache[path] = entry
+    cache = {path: cache[path] for path in pages if path in cache}
+    _save_cache(cache, cache_path)
+
+    docs = []
+    postings = defaultdict(list)
+    for page_id, path in enumerate(sorted(cache)):
+        url = '/' + os.path.relpath(path, root).replace(os.sep, '/')
+        docs.append([url, cache[path]['title']])
+        for term, frequency in cache[path]['terms'].items():
+            postings[term].append((page_id, frequency))
+
+    estimated = sum(len(term.encode('utf-8')) + 2 * len(refs) + 2 for term, refs in postings.items())
+    shard_count = max(1, -(-estimated // TARGET_SHARD_BYTES))
+    shards = defaultdict(dict)
+    for term, refs in postings.items():
+        shards[fnv1a(term) % shard_count][term] = refs
+
+    index_dir = os.path.join(root, INDEX_DIR)
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.makedirs(index_dir)
+    for n in range(shard_count):
+        with open(os.path.join(index_dir, f'shard-{n}.bin'), 'wb') as f:
+            f.write(encode_shard(shards.get(n, {})))
+    with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': FORMAT_VERSION, 'shards': shard_count, 'docs': docs},
+                  f, ensure_ascii=False, separators=(',', ':'))
+    if os.path.exists(CLIENT_SCRIPT):
+        shutil.copyfile(CLIENT_SCRIPT, os.path.join(index_dir, 'search.js'))
+    return len(docs), len(changed), len(postings), shard_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the sharded client-side search index.")
+    parser.add_argument('root', nargs='?', default=DEFAULT_ROOT, help=f'deploy tree (default: {DEFAULT_ROOT})')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (0 = one per CPU, default: 1)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} does not exist; run deploy.sh first")
+    pages, reread, terms, shards = build_index(args.root, args.jobs)
+    print(f"Indexed {pages} pages ({reread} re-read): {terms} terms in {shards} shards "
+          f"under {os.path.join(args.root, INDEX_DIR)}/")
+
+
+if __name__ == "__main__":
+    main()
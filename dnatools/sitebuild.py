@@ -0,0 +1,260 @@
+"""
+Render the legacy pages into layouts/base.html (content/auto-migrated/).
+
+The layout's {% block name %}default{% endblock %} markers are compiled once into
+a list of literal and block parts; rendering a page is a single join. From every
+source page (root or ch-en/) the build takes
+
+  title      the text of its <title>
+  extra_css  its <style> blocks and stylesheet links
+  content    everything inside <body>
+
+decoded from whatever legacy encoding the page uses and written out as UTF-8
+(a page whose encoding is not recognised is skipped and reported).
+Local src/href values are made root-absolute (/CHT7-P1_files/image001.jpg) so
+they keep working from content/auto-migrated/<language>/.
+
+The pages are rendered across a process pool and the manifest remembers each
+source's hash together with the layout's, so an edited page re-renders only that
+page and a layout change re-renders everything.
+
+    python -m dnatools.sitebuild -j 0                 # every page already migrated
+    python -m dnatools.sitebuild --lang english NEW.html
+"""
+
+import argparse
+import hashlib
+import os
+import re
+from collections import namedtuple
+from functools import partial
+from urllib.parse import quote
+
+from dnatools.batch import add_batch_arguments
+from dnatools.detect import detect_bytes
+from dnatools.htmltokens import attribute_value, parse_attributes, tokenize
+from dnatools.manifest import MANIFEST_PATH, Manifest, run_incremental
+from dnatools.rewrite import resolve_local, rewrite_references
+
+TOOL = 'sitebuild'
+RULES_VERSION = 1
+LAYOUT_PATH = os.path.join('layouts', 'base.html')
+OUTPUT_DIR = os.path.join('content', 'auto-migrated')
+LANGUAGES = ('chinese', 'english')
+# Where the pages being migrated live, in lookup order
+SOURCE_DIRS = ('.', 'ch-en')
+# Same cut-off fix_chinese_files uses for "this page is Chinese"
+CHINESE_THRESHOLD = 10
+
+_BLOCK = re.compile(r'{%\s*block\s+(\w+)\s*%}(.*?){%\s*endblock(?:\s+\w+)?\s*%}', re.DOTALL)
+
+Page = namedtuple('Page', ['title', 'extra_css', 'content'])
+
+
+class Layout:
+    """A layout compiled into (literal, block name) parts."""
+
+    def __init__(self, text):
+        self.parts = []
+        self.defaults = {}
+        position = 0
+        for match in _BLOCK.finditer(text):
+            self.parts.append((text[position:match.start()], match.group(1)))
+            self.defaults[match.group(1)] = match.group(2)
+            position = match.end()
+        self.parts.append((text[position:], None))
+
+    def render(self, blocks):
+        """Fill each block from blocks, falling back to the layout's default."""
+        out = []
+        for literal, name in self.parts:
+            out.append(literal)
+            if name is not None:
+                value = blocks.get(name)
+                out.append(self.defaults[name] if value is None else value)
+        return ''.join(out)
+
+
+def load_layout(path=LAYOUT_PATH):
+    """Return (compiled Layout, hash of the layout file)."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return Layout(raw.decode('utf-8')), hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def extract_page(text):
+    """Split a legacy page into its title, head styles and body content."""
+    title = []
+    styles = []
+    content = []
+    in_title = in_style = False
+    body_seen = False
+    body_end = None     # length of content at the last </body>
+
+    for kind, tag, name in tokenize(text):
+        if in_title:
+            if kind == 'end' and name == 'title':
+                in_title = False
+            else:
+                title.append(tag)
+            continue
+        if in_style:
+            styles.append(tag)
+            in_style = not (kind == 'end' and name == 'style')
+            continue
+
+        if not body_seen:
+            if kind == 'start' and name == 'title' and not title:
+                in_title = True
+            elif kind == 'start' and name == 'style':
+                styles.append(tag)
+                in_style = True
+            elif kind == 'start' and name == 'link':
+                rel = next((attribute_value(raw) for attr, raw in parse_attributes(tag)
+                            if attr == 'rel' and raw is not None), '')
+                if rel.lower() == 'stylesheet':
+                    styles.append(tag)
+            elif kind == 'start' and name == 'body':
+                body_seen = True
+            continue
+
+        if kind == 'end' and name == 'body':
+            body_end = len(content)
+        content.append(tag)
+
+    if not body_seen:
+        # No <body> at all: everything that is not head material is content
+        return Page(''.join(title).strip(), '\n'.join(styles), text)
+    if body_end is not None:
+        content = content[:body_end]
+    return Page(''.join(title).strip(), '\n'.join(styles), ''.join(content))
+
+
+def _absolute_references(text, page_dir):
+    def replace(url):
+        resolved = resolve_local(page_dir, url)
+        if resolved is None:
+            return url
+        path, suffix, encoded = resolved
+        if path.startswith('..'):
+            return url
+        new_url = '/' + path.replace(os.sep, '/')
+        return (quote(new_url) if encoded else new_url) + suffix
+    return rewrite_references(text, replace)[0]
+
+
+def render_page(source, layout, outputs):
+    """Render one source page to its output path; returns the output path or None on error or skip."""
+    output = outputs[source]
+    try:
+        with open(source, 'rb') as f:
+            detection = detect_bytes(f.read())
+        if detection.encoding is None:
+            # The fallback decoding is only good for reading; rendered, it would be mojibake
+            print(f"Skipping {source}: encoding not recognised")
+            return None
+        page = extract_page(detection.text)
+        page_dir = os.path.dirname(source)
+        html = layout.render({
+            'title': page.title or None,
+            'extra_css': _absolute_references(page.extra_css, page_dir),
+            'content': _absolute_references(page.content, page_dir),
+        })
+        data = html.encode('utf-8', 'xmlcharrefreplace')
+
+        try:
+            with open(output, 'rb') as f:
+                unchanged = f.read() == data
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            tmp_path = output + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, output)
+        return output
+    except Exception as e:
+        print(f"Error rendering {source}: {e}")
+        return None
+
+
+def find_source(name):
+    """The legacy page an auto-migrated page was generated from, or None."""
+    for directory in SOURCE_DIRS:
+        path = os.path.normpath(os.path.join(directory, name))
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def migrated_targets(output_dir=OUTPUT_DIR):
+    """{source: output} for every page already under output_dir; also the names with no source."""
+    targets = {}
+    missing = []
+    for language in LANGUAGES:
+        directory = os.path.join(output_dir, language)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(('.html', '.htm')) or name.startswith('.!'):
+                continue
+            source = find_source(name)
+            if source is None:
+                missing.append(os.path.join(directory, name))
+            else:
+                targets.setdefault(source, os.path.join(directory, name))
+    return targets, missing
+
+
+def language_of(path):
+    """'chinese' or 'english' for a page not migrated yet."""
+    with open(path, 'rb') as f:
+        detection = detect_bytes(f.read())
+    return 'chinese' if detection.chinese_count > CHINESE_THRESHOLD else 'english'
+
+
+def build(paths=(), lang=None, layout_path=LAYOUT_PATH, output_dir=OUTPUT_DIR, jobs=1, force=False, resume=False):
+    """Render paths (default: every page already migrated) into output_dir; returns the count rendered."""
+    layout, layout_hash = load_layout(layout_path)
+    targets, missing = migrated_targets(output_dir)
+    if paths:
+        selected = {}
+        for path in map(os.path.normpath, paths):
+            language = lang or language_of(path)
+            selected[path] = targets.get(path) or os.path.join(output_dir, language, os.path.basename(path))
+        targets = selected
+    else:
+        for path in missing:
+            print(f"No source page for {path}; left as it is")
+
+    # A deleted output has to be rendered again even if its source is unchanged
+    manifest = Manifest(MANIFEST_PATH)
+    stale = [source for source, output in targets.items() if not os.path.exists(output)]
+    for source in stale:
+        manifest.forget(source, TOOL)
+    if stale:
+        manifest.save()
+
+    sources = sorted(targets)
+    results = run_incremental(partial(render_page, layout=layout, outputs=targets),
+                              sources, TOOL, f"{RULES_VERSION}:{layout_hash}",
+                              jobs=jobs, force=force, resume=resume)
+    rendered = sum(1 for result in results if result)
+    print(f"Rendered {rendered} of {len(sources)} pages into {output_dir}/")
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Render legacy pages into {LAYOUT_PATH}.")
+    parser.add_argument('paths', nargs='*', help='pages to (re)build (default: every page already migrated)')
+    parser.add_argument('--lang', choices=LANGUAGES, help='output language directory for new pages')
+    parser.add_argument('--layout', default=LAYOUT_PATH, help=f'layout to render into (default: {LAYOUT_PATH})')
+    parser.add_argument('--output', default=OUTPUT_DIR, help=f'output directory (default: {OUTPUT_DIR})')
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+    build(args.paths, args.lang, args.layout, args.output, args.jobs, args.force, args.resume)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Stream the sitemap for content/auto-migrated/ out of the file index.
+
+Supersedes tools/generate_sitemap.js, which listed every *.html it found, editor
+temp files (.!18255!CHT7-P2.html) included. URLs come from the shared
+dnatools.fsindex scan; temp files, *.bak/*.backup2 copies and backups_gb18030*
+directories never get in. Paths are percent-encoded as UTF-8, so CJK file
+names become valid <loc> values.
+
+<lastmod> follows the content: .dnatools/sitemap.json keeps each page's hash and
+the date it last changed, so a page that was only touched (or checked out again)
+keeps its old date, and a page seen for the first time gets its mtime.
+
+URLs are written as they come. Past MAX_URLS (the protocol's 50,000) or
+MAX_BYTES per file the output is split into sitemap-1.xml, sitemap-2.xml, ...
+and sitemap.xml becomes the sitemap index pointing at them.
+
+    python -m dnatools.sitemap
+    python -m dnatools.sitemap --base-url https://staging.bydnacoding.org
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from dnatools.fsindex import scan_tree
+from dnatools.manifest import file_hash
+
+DEFAULT_ROOT = os.path.join('content', 'auto-migrated')
+BASE_URL = 'https://bydnacoding.org'
+SITEMAP_NAME = 'sitemap.xml'
+STATE_PATH = os.path.join('.dnatools', 'sitemap.json')
+
+# Protocol limits per sitemap file
+MAX_URLS = 50000
+MAX_BYTES = 50 * 1024 * 1024
+
+_XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def lastmod(entry, state):
+    """W3C date the page's content last changed; updates state in place."""
+    record = state.get(entry.path)
+    if record and record['size'] == entry.size and record['mtime_ns'] == entry.mtime_ns:
+        return record['lastmod']
+    content_hash = file_hash(entry.path)
+    if not record or record['hash'] != content_hash:
+        changed = datetime.datetime.fromtimestamp(entry.mtime_ns / 1e9, datetime.timezone.utc)
+        record = {'hash': content_hash, 'lastmod': changed.strftime('%Y-%m-%d')}
+    record.update(size=entry.size, mtime_ns=entry.mtime_ns)
+    state[entry.path] = record
+    return record['lastmod']
+
+
+def iter_urls(root=DEFAULT_ROOT, base_url=BASE_URL, state=None):
+    """Yield (loc, lastmod) for every page under root, in index order."""
+    root = os.path.normpath(root)
+    prefix = root + os.sep
+    state = {} if state is None else state
+    # Scanning from the project root shares the index cache with every other tool
+    for entry in scan_tree('.'):
+        if entry.kind != 'html' or not entry.path.startswith(prefix):
+            continue
+        rel_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+        yield f"{base_url.rstrip('/')}/{quote(rel_path, safe='/')}", lastmod(entry, state)
+
+
+class _ShardWriter:
+    """Writes <url> entries into numbered shard files, starting a new one at the limits."""
+
+    def __init__(self, directory, max_urls, max_bytes):
+        self.directory = directory
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.shards = []
+        self._file = None
+
+    def _open(self):
+        path = os.path.join(self.directory, f'sitemap-{len(self.shards) + 1}.xml.tmp')
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{_XMLNS}">\n')
+        self._count = 0
+        self._bytes = self._file.tell()
+        self.shards.append(path)
+
+    def _close(self):
+        self._file.write('</urlset>\n')
+        self._file.close()
+        self._file = None
+
+    def write(self, loc, modified):
+        line = f'  <url><loc>{escape(loc)}</loc><lastmod>{modified}</lastmod></url>\n'
+        size = len(line.encode('utf-8'))
+        if self._file is not None and (self._count >= self.max_urls
+                                       or self._bytes + size + len('</urlset>\n') > self.max_bytes):
+            self._close()
+        if self._file is None:
+            self._open()
+        self._file.write(line)
+        self._count += 1
+        self._bytes += size
+
+    def finish(self):
+        if self._file is None:
+            self._open()
+        self._close()
+        return self.shards
+
+
+def write_sitemap(root=DEFAULT_ROOT, base_url=BASE_URL, output=None,
+                  max_urls=MAX_URLS, max_bytes=MAX_BYTES, state_path=STATE_PATH):
+    """Write the sitemap (and shards if needed); returns (url count, files written)."""
+    output = output or os.path.join(root, SITEMAP_NAME)
+    directory = os.path.dirname(output) or '.'
+    state = _load_state(state_path)
+
+    writer = _ShardWriter(directory, max_urls, max_bytes)
+    count = 0
+    newest = {}
+    for loc, modified in iter_urls(root, base_url, state):
+        writer.write(loc, modified)
+        shard = len(writer.shards)
+        newest[shard] = max(newest.get(shard, ''), modified)
+        count += 1
+    shards = writer.finish()
+
+    for stale in glob.glob(os.path.join(glob.escape(directory), 'sitemap-*.xml')):
+        os.remove(stale)
+    if len(shards) == 1:
+        os.replace(shards[0], output)
+        written = [output]
+    else:
+        written = []
+        for tmp_path in shards:
+            written.append(tmp_path[:-len('.tmp')])
+            os.replace(tmp_path, written[-1])
+        tmp_path = output + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{_XMLNS}">\n')
+            for n, path in enumerate(written, 1):
+                loc = f"{base_url.rstrip('/')}/{quote(os.path.basename(path))}"
+                f.write(f'  <sitemap><loc>{escape(loc)}</loc><lastmod>{newest[n]}</lastmod></sitemap>\n')
+            f.write('</sitemapindex>\n')
+        os.replace(tmp_path, output)
+        written.append(output)
+
+    # Forget pages that are gone so the state does not grow forever
+    seen = os.path.normpath(root) + os.sep
+    _save_state({path: record for path, record in state.items()
+                 if not path.startswith(seen) or os.path.exists(path)}, state_path)
+    return count, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate sitemap.xml (sharded past 50,000 URLs).")
+    parser.add_argument('root', nargs='?', default=DEFAULT_ROOT, help=f'site directory (default: {DEFAULT_ROOT})')
+    parser.add_argument('--base-url', default=BASE_URL, help=f'URL the root is served at (default: {BASE_URL})')
+    parser.add_argument('-o', '--output', help=f'sitemap path (default: <root>/{SITEMAP_NAME})')
+    parser.add_argument('--max-urls', type=int, default=MAX_URLS, help=f'URLs per file (default: {MAX_URLS})')
+    args = parser.parse_args()
+
+    count, written = write_sitemap(args.root, args.base_url, args.output, max_urls=args.max_urls)
+    if len(written) == 1:
+        print(f"Wrote {count} URLs to {written[0]}")
+    else:
+        print(f"Wrote {count} URLs in {len(written) - 1} shards; index at {written[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Cheap-first encoding sniffing for fix_file_encoding.py.
+
+Tiers, in the order they are tried:
+    bom      a byte-order mark at the start of the file
+    utf8     the whole buffer is valid UTF-8 (pure ASCII is reported as 'ascii')
+    meta     the <meta ... charset=...> declared in the first few KB, if the buffer
+             actually decodes with it
+    chardet  chardet's UniversalDetector over a bounded sample, stopping as soon
+             as it is confident
+
+UTF-8 validity is checked before the meta declaration because many converted
+pages still carry their old charset=gb2312 tag.
+"""
+
+import codecs
+import re
+from collections import namedtuple
+
+from dnatools import metrics
+from dnatools.cjkscan import is_valid_utf8
+
+Sniff = namedtuple('Sniff', ['encoding', 'confidence', 'tier'])
+
+# How far into the file to look for <meta charset>
+META_PREFIX_BYTES = 4096
+# Upper bound on what chardet gets to see, fed in blocks until it is done
+CHARDET_SAMPLE_BYTES = 64 * 1024
+CHARDET_BLOCK_BYTES = 8 * 1024
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+
+
+def declared_charset(raw_data):
+    """Return the charset named in a <meta> tag near the top of the page, or None."""
+    match = _META_CHARSET.search(bytes(raw_data[:META_PREFIX_BYTES]))
+    if not match:
+        return None
+    try:
+        return codecs.lookup(match.group(1).decode('ascii')).name
+    except LookupError:
+        return None
+
+
+def _chardet_sample(raw_data):
+    # Imported here so the cheap tiers never pay for loading chardet
+    from chardet.universaldetector import UniversalDetector
+
+    detector = UniversalDetector()
+    for start in range(0, min(len(raw_data), CHARDET_SAMPLE_BYTES), CHARDET_BLOCK_BYTES):
+        detector.feed(bytes(raw_data[start:start + CHARDET_BLOCK_BYTES]))
+        if detector.done:
+            break
+    result = detector.close()
+    return Sniff(result['encoding'], result['confidence'] or 0.0, 'chardet')
+
+
+def sniff_encoding(raw_data):
+    """Return Sniff(encoding, confidence, tier) for raw page bytes."""
+    with metrics.stage('sniff'):
+        sniff = _sniff(raw_data)
+    metrics.note(detection=sniff.tier, encoding=sniff.encoding)
+    return sniff
+
+
+def _sniff(raw_data):
+    for bom, encoding in _BOMS:
+        if raw_data[:len(bom)] == bom:
+            return Sniff(encoding, 1.0, 'bom')
+
+    if is_valid_utf8(raw_data):
+        if re.search(rb'[\x80-\xff]', raw_data):
+            return Sniff('utf-8', 1.0, 'utf8')
+        return Sniff('ascii', 1.0, 'utf8')
+
+    declared = declared_charset(raw_data)
+    if declared and declared != 'utf-8':
+        try:
+            str(raw_data, declared)
+        except UnicodeDecodeError:
+            pass
+        else:
+            return Sniff(declared, 0.99, 'meta')
+
+    return _chardet_sample(raw_data)
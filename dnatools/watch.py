@@ -0,0 +1,300 @@
+"""
+Watch the tree and re-run the fixers and the build on the pages that changed.
+
+On Linux the tree is watched with inotify (through ctypes, no extra package);
+elsewhere, or with --poll, the fsindex listing is compared every --interval
+seconds. Events are collected until the tree has been quiet for DEBOUNCE
+seconds, then handled as one batch:
+
+  - editor temp files (.!NNNNN!name), *.bak/*.backup/*.backup2 copies, *.tmp
+    files and the skipped directories (.dnatools/, deploy/, backups_gb18030*)
+    are ignored
+  - changed pages go through the dnatools.pipeline stages, under the same
+    manifest as a batch run, so a page this run wrote is not redone
+  - pages that reference a changed or deleted asset (per the dnatools.linkcheck
+    reverse index, kept up to date as pages change) are re-run as well, so e.g.
+    a replaced image gets its new width/height
+  - pages with a content/auto-migrated copy are rendered again, and a change to
+    layouts/base.html renders all of them (dnatools.sitebuild)
+
+Everything runs in this process with the modules already loaded, so a single
+edit is handled well under a second.
+
+    python -m dnatools.watch
+    python -m dnatools.watch --stages encoding,structure,filenames --no-build
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+from functools import partial
+
+from dnatools import sitebuild
+from dnatools.fsindex import DEFAULT_SKIP_DIRS, HTML_SUFFIXES, file_kind, scan_tree
+from dnatools.linkcheck import extract_references, load_reverse_index, resolve, save_reverse_index
+from dnatools.manifest import run_incremental
+from dnatools.pipeline import DEFAULT_STAGES, TOOL, load_stages, process_file, stages_version
+
+# Quiet time that ends a burst of events
+DEBOUNCE = 0.2
+POLL_INTERVAL = 1.0
+
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_ISDIR = 0x40000000
+_IN_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct('iIII')
+
+
+def _skipped(path, skip_dirs=DEFAULT_SKIP_DIRS):
+    parts = os.path.normpath(path).split(os.sep)
+    return any(fnmatch.fnmatchcase(part, pattern) for part in parts[:-1] for pattern in skip_dirs)
+
+
+def is_relevant(path, skip_dirs=DEFAULT_SKIP_DIRS):
+    """False for temp/backup files, our own *.tmp files and anything in a skipped directory."""
+    name = os.path.basename(path)
+    return (file_kind(name) not in ('temp', 'backup') and not name.endswith('.tmp')
+            and not _skipped(path, skip_dirs))
+
+
+class PollingWatcher:
+    """Compares (size, mtime) of every file between polls.
+
+    The fsindex cache is keyed on directory mtimes, which an in-place edit does
+    not change, so the tree is listed uncached.
+    """
+
+    def __init__(self, root='.', skip_dirs=DEFAULT_SKIP_DIRS, interval=POLL_INTERVAL):
+        self.root = root
+        self.skip_dirs = skip_dirs
+        self.interval = interval
+        self.state = self._snapshot()
+
+    def _snapshot(self):
+        return {entry.path: (entry.size, entry.mtime_ns)
+                for entry in scan_tree(self.root, self.skip_dirs, use_cache=False)}
+
+    def wait(self, timeout=None):
+        """Changed paths, or an empty set once timeout seconds pass without changes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+            state = self._snapshot()
+            changed = {path for path in state.keys() | self.state.keys()
+                       if state.get(path) != self.state.get(path)}
+            self.state = state
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify on every directory of the tree (new directories are added as they appear)."""
+
+    def __init__(self, root='.', skip_dirs=DEFAULT_SKIP_DIRS):
+        self.root = root
+        self.skip_dirs = skip_dirs
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directories = {}
+        self._add_tree(root)
+
+    def _add_tree(self, top):
+        """Watch top and its subdirectories; returns the files already in them."""
+        files = set()
+        for directory, subdirs, names in os.walk(top):
+            subdirs[:] = [name for name in subdirs
+                          if not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.skip_dirs)]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _IN_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if directory == top and top == self.root:
+                    raise OSError(error, f'inotify_add_watch failed for {directory}')
+                print(f"Not watching {directory}: {os.strerror(error)}")
+                continue
+            self.directories[wd] = directory
+            files.update(os.path.normpath(os.path.join(directory, name)) for name in names)
+        return files
+
+    def _read_events(self):
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.normpath(os.path.join(directory, name))
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and not any(
+                        fnmatch.fnmatchcase(name, pattern) for pattern in self.skip_dirs):
+                    changed |= self._add_tree(path)
+            else:
+                changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        """Changed paths, or an empty set once timeout seconds pass without events."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return self._read_events() if ready else set()
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(root='.', poll=False, interval=POLL_INTERVAL):
+    """inotify where available, polling otherwise."""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {interval}s")
+    return PollingWatcher(root, interval=interval)
+
+
+class Handler:
+    """Turns a batch of changed paths into pipeline and build runs."""
+
+    def __init__(self, stage_names=DEFAULT_STAGES, build=True):
+        self.stage_names = stage_names
+        self.version = stages_version(stage_names)
+        self.build = build
+        self.reverse = load_reverse_index() or {}
+        self.layout = None
+        self.layout_hash = None
+        self.targets = {}
+        self._written = {}      # path -> mtime_ns of the files this process wrote
+        if build:
+            self._load_layout()
+
+    def _load_layout(self):
+        self.layout, self.layout_hash = sitebuild.load_layout()
+        self.targets = sitebuild.migrated_targets()[0]
+
+    def _update_references(self, page):
+        for pages in self.reverse.values():
+            if page in pages:
+                pages.remove(page)
+        if os.path.exists(page):
+            for url in extract_references(page):
+                target = resolve(page, url)
+                if target is not None:
+                    pages = self.reverse.setdefault(target, [])
+                    if page not in pages:
+                        pages.append(page)
+
+    def is_own_write(self, path):
+        """True if path is still exactly as this process last wrote it."""
+        try:
+            return self._written.get(path) == os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+
+    def handle(self, paths):
+        """Process one debounced batch; returns the pages the pipeline or build touched."""
+        output_prefix = os.path.normpath(sitebuild.OUTPUT_DIR) + os.sep
+        pages = sorted(path for path in paths
+                       if path.lower().endswith(HTML_SUFFIXES) and os.path.isfile(path)
+                       and not path.startswith(output_prefix))
+        assets = [path for path in paths if not path.lower().endswith(HTML_SUFFIXES)]
+        layout_changed = os.path.normpath(sitebuild.LAYOUT_PATH) in paths
+        dependents = sorted({page for asset in assets for page in self.reverse.get(asset, ())
+                             if os.path.isfile(page)} - set(pages))
+
+        process = partial(process_file, stage_names=self.stage_names)
+        results = run_incremental(process, pages, TOOL, self.version) if pages else []
+        if dependents:
+            # The dependents themselves did not change, so the manifest would skip them
+            results += run_incremental(process, dependents, TOOL, self.version, force=True)
+        touched = [path for path, fired in zip(pages + dependents, results) if fired]
+
+        for page in pages:
+            self._update_references(page)
+        if pages:
+            save_reverse_index(self.reverse)
+
+        if self.build:
+            if layout_changed:
+                self._load_layout()
+                sources = sorted(self.targets)
+            else:
+                sources = [path for path in pages + dependents if path in self.targets]
+            if sources:
+                rendered = run_incremental(partial(sitebuild.render_page, layout=self.layout, outputs=self.targets),
+                                           sources, sitebuild.TOOL,
+                                           f"{sitebuild.RULES_VERSION}:{self.layout_hash}")
+                touched += [output for output in rendered if output]
+
+        for path in touched:
+            try:
+                self._written[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+        return touched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run the fixers and the build on changed pages.")
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES),
+                        help=f"comma-separated pipeline stages (default: {','.join(DEFAULT_STAGES)})")
+    parser.add_argument('--no-build', action='store_true', help='do not re-render content/auto-migrated pages')
+    parser.add_argument('--poll', action='store_true', help='poll instead of using inotify')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL,
+                        help=f'seconds between polls (default: {POLL_INTERVAL})')
+    args = parser.parse_args()
+
+    stage_names = tuple(name.strip() for name in args.stages.split(',') if name.strip())
+    try:
+        load_stages(stage_names)
+    except ValueError as e:
+        parser.error(str(e))
+
+    handler = Handler(stage_names, build=not args.no_build)
+    watcher = make_watcher('.', args.poll, args.interval)
+    print(f"Watching {os.getcwd()} ({type(watcher).__name__}); Ctrl-C to stop")
+    try:
+        while True:
+            changed = watcher.wait()
+            while True:
+                more = watcher.wait(DEBOUNCE)
+                if not more:
+                    break
+                changed |= more
+            changed = {path for path in changed if is_relevant(path) and not handler.is_own_write(path)}
+            if not changed:
+                continue
+            start = time.perf_counter()
+            touched = handler.handle(changed)
+            elapsed = time.perf_counter() - start
+            print(f"{time.strftime('%H:%M:%S')} {len(changed)} changed, {len(touched)} updated "
+                  f"in {elapsed * 1000:.0f} ms: {', '.join(sorted(changed)[:5])}"
+                  f"{' ...' if len(changed) > 5 else ''}")
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Strip Microsoft Word export markup from a page in a single streaming pass.
+
+The page is tokenized once and every token is checked against a rule table:
+elements to drop with their contents (<head>, <style>, <xml>, <o:p>), tags to
+unwrap while keeping their contents (<span>, <html>, <body>, any o:/w:/v:/st1:
+namespace tag, the Section1 wrapper div), attributes to remove from the tags
+that remain, comments and conditional markers, and empty paragraphs.
+"""
+
+import re
+from collections import namedtuple
+
+from dnatools.htmltokens import attribute_value, build_start_tag, parse_attributes, tokenize
+
+CleanedPage = namedtuple('CleanedPage', ['title', 'body'])
+
+# Rules used by tools/update_styling.py; copy and adjust for other layouts
+WORD_RULES = {
+    # Removed together with everything inside them
+    'drop': {'head', 'style', 'script', 'xml', 'o:p'},
+    # Tag removed, contents kept
+    'unwrap': {'html', 'body', 'span', 'font'},
+    'unwrap_prefixes': ('o:', 'w:', 'v:', 'st1:', 'mso-'),
+    # Tag removed, contents kept, only when it carries one of these classes
+    'unwrap_classes': {'div': {'section1', 'wordsection1'}},
+    # Attributes removed from every tag that is kept
+    'strip_attributes': {'class', 'style', 'lang'},
+    # Elements removed when they contain nothing but whitespace/&nbsp;
+    'drop_empty': {'p'},
+    'drop_comments': True,
+}
+
+_BLANK = re.compile(r'(?:\s|&nbsp;|&#160;|\xa0)*')
+
+
+def _is_unwrapped(name, rules):
+    return name in rules['unwrap'] or name.startswith(rules['unwrap_prefixes'])
+
+
+def clean_word_html(content, rules=WORD_RULES):
+    """Return CleanedPage(title, body) with Word markup removed according to rules."""
+    out = []
+    title = []
+    in_title = False
+    dropping = None     # name of the element being dropped
+    drop_depth = 0
+    conditional = {}    # tag name -> stack of "was this one unwrapped"
+    empty_start = {}    # tag name -> index in out where its start tag was written
+
+    for token in tokenize(content):
+        kind, text, name = token
+
+        if kind == 'start' and name == 'title':
+            in_title = True
+        elif kind == 'end' and name == 'title':
+            in_title = False
+        elif kind == 'text' and in_title:
+            title.append(text)
+
+        if dropping is not None:
+            if name == dropping:
+                if kind == 'start' and not text.endswith('/>'):
+                    drop_depth += 1
+                elif kind == 'end':
+                    drop_depth -= 1
+                    if drop_depth == 0:
+                        dropping = None
+            continue
+
+        if kind in ('comment', 'decl', 'pi'):
+            if not rules['drop_comments']:
+                out.append(text)
+            continue
+
+        if kind == 'text':
+            out.append(text)
+            continue
+
+        if name in rules['drop']:
+            if kind == 'start' and not text.endswith('/>'):
+                dropping = name
+                drop_depth = 1
+            continue
+
+        if _is_unwrapped(name, rules):
+            continue
+
+        classes = rules['unwrap_classes'].get(name)
+        if classes is not None:
+            if kind == 'start':
+                attributes = parse_attributes(text)
+                unwrap = any(attr == 'class' and attribute_value(value).lower() in classes
+                             for attr, value in attributes)
+                conditional.setdefault(name, []).append(unwrap)
+                if unwrap:
+                    continue
+            elif conditional.get(name):
+                if conditional[name].pop():
+                    continue
+
+        if kind == 'start':
+            attributes = parse_attributes(text)
+            kept = [(attr, value) for attr, value in attributes
+                    if attr not in rules['strip_attributes']]
+            if len(kept) != len(attributes):
+                text = build_start_tag(name, kept, self_closing=text.endswith('/>'))
+            out.append(text)
+            if name in rules['drop_empty']:
+                empty_start[name] = len(out) - 1
+        else:
+            start = empty_start.pop(name, None)
+            if start is not None and _BLANK.fullmatch(''.join(out[start + 1:])):
+                del out[start:]
+                empty_start = {n: i for n, i in empty_start.items() if i < start}
+                continue
+            out.append(text)
+
+    page_title = ''.join(title).strip()
+    return CleanedPage(page_title, ''.join(out).strip())
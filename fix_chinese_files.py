@@ -5,97 +5,81 @@ This addresses the issue where files show garbled characters when interpreted as
 """
 
 import os
-import re
-import glob
-import chardet
+import argparse
 
-def test_encoding_quality(filepath, encoding):
-    """Test how well an encoding works for a file."""
-    try:
-        with open(filepath, 'rb') as f:
-            raw_data = f.read()
-        
-        decoded = raw_data.decode(encoding, errors='ignore')
-        
-        # Count Chinese characters
-        chinese_chars = [char for char in decoded if '\u4e00' <= char <= '\u9fff']
-        
-        # Check if title looks reasonable
-        title_match = re.search(r'<title>(.*?)</title>', decoded, re.IGNORECASE)
-        title = title_match.group(1) if title_match else ""
-        
-        # Score based on number of Chinese chars and title quality
-        score = len(chinese_chars)
-        if title and any('\u4e00' <= char <= '\u9fff' for char in title):
-            score += 100  # Bonus for readable title
-        
-        return score, len(chinese_chars), title
-    except:
-        return 0, 0, ""
+from dnatools import metrics
+from dnatools.backupstore import write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.fsindex import html_files as list_html_files
+from dnatools.detect import detect_file, relabel_charset
+from dnatools.manifest import run_incremental
+
+# Bump whenever the conversion rules below change so already-processed files are redone
+RULES_VERSION = 1
 
 def find_best_encoding(filepath):
     """Find the best encoding for a file."""
-    encodings_to_test = ['gb2312', 'gb18030', 'gbk', 'big5', 'utf-8']
-    
-    best_encoding = 'utf-8'
-    best_score = 0
-    best_chinese_count = 0
-    
-    for encoding in encodings_to_test:
-        score, chinese_count, title = test_encoding_quality(filepath, encoding)
-        if score > best_score:
-            best_score = score
-            best_encoding = encoding
-            best_chinese_count = chinese_count
-    
-    return best_encoding, best_score, best_chinese_count
+    detection = detect_file(filepath)
+    return detection.encoding, detection.confidence, detection.chinese_count
 
-def convert_file_to_utf8(filepath, from_encoding):
-    """Convert a file from one encoding to UTF-8."""
+def convert_file_to_utf8(filepath, content):
+    """Write already-decoded content back to a file as UTF-8."""
     try:
-        with open(filepath, 'r', encoding=from_encoding, errors='ignore') as f:
-            content = f.read()
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_text(filepath, content, 'fix_chinese_files')
         
         return True
     except Exception as e:
         print(f"Error converting {filepath}: {e}")
+        metrics.note_error(e)
         return False
 
+def encoding_stage(doc):
+    """Pipeline stage: legacy-encoded pages are written back as UTF-8 and relabelled."""
+    if doc.encoding != 'utf-8' and doc.detection.chinese_count > 10:
+        doc.encoding = 'utf-8'
+        return relabel_charset(doc.text)
+    return doc.text
+
 def fix_chinese_file(filepath):
     """Fix encoding for a single file."""
     try:
-        # Find the best encoding
-        best_encoding, score, chinese_count = find_best_encoding(filepath)
+        # Read and score the file once; the winning decode is reused for the write
+        detection = detect_file(filepath)
         
         # If the best encoding is not UTF-8 and has Chinese characters, convert it
-        if best_encoding != 'utf-8' and chinese_count > 10:
-            print(f"Converting {filepath} from {best_encoding} to UTF-8 (found {chinese_count} Chinese chars)")
-            return convert_file_to_utf8(filepath, best_encoding)
+        if detection.encoding != 'utf-8' and detection.chinese_count > 10:
+            print(f"Converting {filepath} from {detection.encoding} to UTF-8 (found {detection.chinese_count} Chinese chars)")
+            return convert_file_to_utf8(filepath, detection.text)
         
         return False
         
     except Exception as e:
         print(f"Error processing {filepath}: {e}")
+        metrics.note_error(e)
         return False
 
+def convert_files(html_files, jobs=1, force=False, resume=False):
+    """Convert the legacy-encoded pages among html_files (under the manifest); returns the count."""
+    results = run_incremental(fix_chinese_file, html_files, 'fix_chinese_files', RULES_VERSION,
+                              jobs=jobs, force=force, resume=resume)
+    converted_count = sum(1 for converted in results if converted)
+    
+    print(f"\nConverted {converted_count} files from Chinese encodings to UTF-8")
+    return converted_count
+
 def main():
     """Main function to fix Chinese encoding in all HTML files."""
-    # Find all HTML files
-    html_files = []
-    for pattern in ['*.html', '**/*.html']:
-        html_files.extend(glob.glob(pattern, recursive=True))
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', help='pages to convert (default: every .html page)')
+    add_batch_arguments(parser)
+    args = parser.parse_args()
     
-    print(f"Found {len(html_files)} HTML files")
+    # Find all HTML files (each once; backups, deploy/ and node_modules pruned)
+    html_files = [os.path.normpath(path) for path in args.paths] or list_html_files('.', suffixes=('.html',))
     
-    converted_count = 0
-    for filepath in html_files:
-        if fix_chinese_file(filepath):
-            converted_count += 1
+    print(f"Found {len(html_files)} HTML files")
     
-    print(f"\nConverted {converted_count} files from Chinese encodings to UTF-8")
+    convert_files(html_files, args.jobs, args.force, args.resume)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -2,69 +2,66 @@
 import sys
 import os
 import codecs
+import argparse
+
+from dnatools.backupstore import write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.detect import detect_file, relabel_charset
+from dnatools.manifest import run_incremental
+
+# Bump whenever the conversion below changes so already-converted files are redone
+RULES_VERSION = 1
+
+# Converted when no files are named on the command line
+DEFAULT_FILES = ['WHY1.html', 'WHY.html']
 
 def detect_and_fix_encoding(filename):
     """Detect and fix encoding issues in HTML files."""
     
-    # Read the file as bytes first
-    with open(filename, 'rb') as f:
-        content_bytes = f.read()
+    # Read and score the file once
+    detection = detect_file(filename)
+    
+    # Check if we can find Chinese characters
+    if detection.chinese_count == 0:
+        print(f"Could not find proper encoding for {filename}")
+        return False
     
-    # Try different encodings to see which one works
-    encodings_to_try = ['gb18030', 'gbk', 'gb2312', 'utf-8', 'latin1']
+    print(f"Found Chinese characters with {detection.encoding} encoding "
+          f"(confidence: {detection.confidence:.2f})")
     
-    for encoding in encodings_to_try:
-        try:
-            # Try to decode with this encoding
-            content = content_bytes.decode(encoding)
-            
-            # Check if we can find Chinese characters
-            if any('\u4e00' <= char <= '\u9fff' for char in content):
-                print(f"Found Chinese characters with {encoding} encoding")
-                
-                # Create backup
-                backup_filename = filename + '.backup2'
-                os.rename(filename, backup_filename)
-                print(f"Created backup: {backup_filename}")
-                
-                # Write with UTF-8 encoding
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                # Update the meta tag
-                with open(filename, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                content = content.replace('charset=gb18030', 'charset=utf-8')
-                content = content.replace('charset=gbk', 'charset=utf-8')
-                content = content.replace('charset=gb2312', 'charset=utf-8')
-                
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                print(f"Successfully converted {filename} using {encoding} as source")
-                return True
-                
-        except UnicodeDecodeError:
-            continue
-        except Exception as e:
-            print(f"Error with {encoding}: {e}")
-            continue
+    # Write with UTF-8 encoding and an updated meta tag; the original bytes go
+    # to the backup store (python -m dnatools.backupstore restore FILE)
+    write_text(filename, relabel_charset(detection.text), 'fix_encoding')
     
-    print(f"Could not find proper encoding for {filename}")
-    return False
+    print(f"Successfully converted {filename} using {detection.encoding} as source")
+    return True
+
+def fix_file(filename):
+    print(f"\nFixing {filename}...")
+    success = detect_and_fix_encoding(filename)
+    if not success:
+        print(f"Failed to fix {filename}")
+    return success
 
 def main():
-    files_to_fix = ['WHY1.html', 'WHY.html']
+    parser = argparse.ArgumentParser(description="Detect and fix the encoding of specific pages.")
+    parser.add_argument('paths', nargs='*', help=f"pages to convert (default: {' '.join(DEFAULT_FILES)})")
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+    
+    files_to_fix = [os.path.normpath(path) for path in args.paths] or DEFAULT_FILES
     
+    existing = []
     for filename in files_to_fix:
         if os.path.exists(filename):
-            print(f"\nFixing {filename}...")
-            success = detect_and_fix_encoding(filename)
-            if not success:
-                print(f"Failed to fix {filename}")
+            existing.append(filename)
         else:
             print(f"File {filename} not found")
+    
+    # Converted files are checkpointed, so an interrupted or repeated run
+    # does not convert them a second time
+    run_incremental(fix_file, existing, 'fix_encoding', RULES_VERSION,
+                    jobs=args.jobs, force=args.force, resume=args.resume)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
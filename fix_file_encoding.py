@@ -6,75 +6,95 @@ This addresses files that were saved with Chinese encodings (gb2312, gb18030, et
 
 import os
 import re
-import glob
-import chardet
+import argparse
+from collections import Counter
+
+from dnatools import metrics
+from dnatools.backupstore import write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.fsindex import html_files as list_html_files
+from dnatools.manifest import run_incremental
+from dnatools.sniff import sniff_encoding
+
+# Bump whenever the conversion rules below change so already-processed files are redone
+RULES_VERSION = 2
 
 def detect_encoding(filepath):
-    """Detect the encoding of a file."""
+    """Detect the encoding of a file; returns (encoding, confidence, tier)."""
     try:
         with open(filepath, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            return result['encoding'], result['confidence']
+            return sniff_encoding(f.read())
     except Exception as e:
         print(f"Error detecting encoding for {filepath}: {e}")
-        return None, 0
+        metrics.note_error(e)
+        return None, 0, None
 
-def convert_file_encoding(filepath, from_encoding, to_encoding='utf-8'):
-    """Convert a file from one encoding to another."""
+def convert_file_encoding(filepath, raw_data, from_encoding, to_encoding='utf-8'):
+    """Convert already-read file bytes from one encoding to another."""
     try:
-        # Read with detected encoding
-        with open(filepath, 'r', encoding=from_encoding, errors='ignore') as f:
-            content = f.read()
+        # Decode with detected encoding
+        content = raw_data.decode(from_encoding, errors='ignore')
         
         # Write with target encoding
-        with open(filepath, 'w', encoding=to_encoding) as f:
-            f.write(content)
+        write_text(filepath, content, 'fix_file_encoding', encoding=to_encoding)
         
         return True
     except Exception as e:
         print(f"Error converting {filepath}: {e}")
+        metrics.note_error(e)
         return False
 
 def fix_file_encoding(filepath):
-    """Fix encoding for a single file."""
+    """Fix encoding for a single file.
+    
+    Returns (converted, tier) where tier names the sniffing step that decided.
+    """
     try:
-        # Detect current encoding
-        detected_encoding, confidence = detect_encoding(filepath)
+        with open(filepath, 'rb') as f:
+            raw_data = f.read()
+        
+        # Detect current encoding, cheapest evidence first
+        detected_encoding, confidence, tier = sniff_encoding(raw_data)
         
         if not detected_encoding:
-            return False
+            return False, tier
         
         # If it's already UTF-8 with high confidence, skip
-        if detected_encoding.lower() in ['utf-8', 'utf8'] and confidence > 0.8:
-            return False
+        if detected_encoding.lower() in ['utf-8', 'utf8', 'ascii'] and confidence > 0.8:
+            return False, tier
         
         # If it's a Chinese encoding or low confidence, convert to UTF-8
         if (detected_encoding.lower() in ['gb2312', 'gb18030', 'gbk', 'big5', 'gb2312-80'] or 
             confidence < 0.8):
             
-            print(f"Converting {filepath} from {detected_encoding} (confidence: {confidence:.2f}) to UTF-8")
-            return convert_file_encoding(filepath, detected_encoding, 'utf-8')
+            print(f"Converting {filepath} from {detected_encoding} (confidence: {confidence:.2f}, via {tier}) to UTF-8")
+            return convert_file_encoding(filepath, raw_data, detected_encoding, 'utf-8'), tier
         
-        return False
+        return False, tier
         
     except Exception as e:
         print(f"Error processing {filepath}: {e}")
-        return False
+        metrics.note_error(e)
+        return False, None
 
 def main():
     """Main function to fix encoding in all HTML files."""
-    # Find all HTML files
-    html_files = []
-    for pattern in ['*.html', '**/*.html']:
-        html_files.extend(glob.glob(pattern, recursive=True))
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+    
+    # Find all HTML files (each once; backups, deploy/ and node_modules pruned)
+    html_files = list_html_files('.', suffixes=('.html',))
     
     print(f"Found {len(html_files)} HTML files")
     
-    converted_count = 0
-    for filepath in html_files:
-        if fix_file_encoding(filepath):
-            converted_count += 1
+    results = run_incremental(fix_file_encoding, html_files, 'fix_file_encoding', RULES_VERSION,
+                              jobs=args.jobs, force=args.force, resume=args.resume)
+    converted_count = sum(1 for result in results if result and result[0])
+    
+    tiers = Counter(result[1] for result in results if result and result[1])
+    if tiers:
+        print("\nEncoding decided by: " + ", ".join(f"{tier} {count}" for tier, count in tiers.most_common()))
     
     print(f"\nConverted encoding for {converted_count} files")
 
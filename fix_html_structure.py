@@ -2,11 +2,157 @@
 """
 Fix HTML structure issues that prevent proper encoding recognition.
 Addresses malformed HTML structure and ensures proper UTF-8 encoding.
+
+Each page is scanned once (repair_page); every fix is made during that pass
+into one output buffer and the names of the fixes that fired are reported.
 """
 
 import os
 import re
-import glob
+import argparse
+from collections import Counter, namedtuple
+
+from dnatools import metrics
+from dnatools.backupstore import write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.fsindex import html_files as list_html_files
+from dnatools.htmltokens import parse_attributes
+from dnatools.manifest import run_incremental
+
+# Bump whenever the rewrite rules below change so already-processed files are redone
+RULES_VERSION = 2
+
+# Names reported for the fixes, in the order repair_page applies them
+FIXES = ('doctype', 'meta-charset', 'early-close', 'closing-tags', 'charset-relabel')
+
+# Legacy charset in a <meta charset=...> or http-equiv content="...; charset=..." tag
+LEGACY_CHARSET = re.compile(r'(charset\s*=\s*["\']?)(?:gb2312|gbk|gb18030|big5)\b', re.IGNORECASE)
+_UNQUOTED_HTTP_EQUIV = re.compile(r'http-equiv=Content-Type\b', re.IGNORECASE)
+
+# The only tokens the repair looks at; whatever lies between them is passed
+# through as one text run (same tag grammar as dnatools.htmltokens; the shared
+# leading '<' lets the regex engine skip straight between candidates)
+_STRUCTURE_TOKEN = re.compile(r'''<(?:
+      (?P<comment>!--.*?-->)
+    | (?P<decl>![^>]*>)
+    | (?P<end>/(?P<end_name>body|html)\s*>)
+    | (?P<start>(?P<start_name>html|head|body|meta)(?=[\s/>])(?:[^>"']|"[^"]*"|'[^']*')*>)
+)''', re.DOTALL | re.VERBOSE | re.IGNORECASE)
+
+StructureRepair = namedtuple('StructureRepair', ['text', 'fixes'])
+
+
+def _declares_charset(tag_text):
+    for attr, raw_value in parse_attributes(tag_text):
+        if attr == 'charset' or (attr == 'content' and raw_value and 'charset=' in raw_value.lower()):
+            return True
+    return False
+
+
+def _structure_tokens(content):
+    """Yield (kind, text, name) for the structural tokens and the text runs between them."""
+    position = 0
+    for match in _STRUCTURE_TOKEN.finditer(content):
+        if match.start() > position:
+            yield 'text', content[position:match.start()], None
+        kind = match.lastgroup
+        name = match.group(f'{kind}_name') if kind in ('start', 'end') else None
+        yield kind, match.group(0), name and name.lower()
+        position = match.end()
+    if position < len(content):
+        yield 'text', content[position:], None
+
+
+def repair_page(content, charset=True):
+    """Scan content once and apply the structural and charset fixes in that pass.
+
+    With charset=False (a page that stays in its legacy encoding) the two
+    charset fixes are left out.
+
+    Returns StructureRepair(text, fixes), fixes being the FIXES names that fired:
+
+      doctype          <!DOCTYPE html> added to a page with <html> but no doctype
+      meta-charset     <meta charset="utf-8"> added after <head> when the page
+                       declares no charset at all
+      early-close      </body>/</html> dropped when more content follows them
+      closing-tags     missing </body> and/or </html> added at the end
+      charset-relabel  gb2312/gbk/gb18030/big5 in a <meta> pointed at UTF-8
+    """
+    out = []
+    fixes = set()
+    has_doctype = False
+    doctype_at = None       # index in out of the first <html> when no doctype preceded it
+    head_at = None          # index in out of the <head> start tag
+    charset_declared = False
+    has_html = has_body = False
+    closed = set()          # body/html end tags that are kept
+    held = []               # end tags (and trailing whitespace/comments) seen since the last content
+
+    for kind, text, name in _structure_tokens(content):
+        if kind == 'end':
+            held.append((kind, text, name))
+            continue
+        if kind == 'comment' or (kind == 'text' and not text.strip()):
+            if held:
+                held.append((kind, text, name))
+            else:
+                out.append(text)
+            continue
+
+        if held:
+            # Content after </body></html>: the closers were premature
+            if any(held_kind == 'end' for held_kind, _, _ in held):
+                fixes.add('early-close')
+            out.extend(held_text for held_kind, held_text, _ in held if held_kind != 'end')
+            held = []
+
+        if kind == 'decl' and text[2:9].lower() == 'doctype':
+            has_doctype = True
+        elif kind == 'start':
+            if name == 'html':
+                has_html = True
+                if not has_doctype and doctype_at is None:
+                    doctype_at = len(out)
+            elif name == 'body':
+                has_body = True
+            elif name == 'head' and head_at is None:
+                head_at = len(out)
+            elif name == 'meta' and _declares_charset(text):
+                charset_declared = True
+                relabelled = LEGACY_CHARSET.sub(r'\1utf-8', text) if charset else text
+                if relabelled != text:
+                    fixes.add('charset-relabel')
+                    text = _UNQUOTED_HTTP_EQUIV.sub('http-equiv="Content-Type"', relabelled)
+        out.append(text)
+
+    for held_kind, held_text, held_name in held:
+        if held_kind == 'end':
+            closed.add(held_name)
+        out.append(held_text)
+
+    if has_html or has_body:
+        missing = [name for name in ('body', 'html') if name not in closed
+                   and (name == 'body' or has_html)]
+        if missing:
+            fixes.add('closing-tags')
+            out.extend(f'\n</{name}>' for name in missing)
+    if head_at is not None and not charset_declared and charset:
+        fixes.add('meta-charset')
+        out[head_at] += '\n<meta charset="utf-8">'
+    if doctype_at is not None:
+        fixes.add('doctype')
+        out.insert(0, '<!DOCTYPE html>\n')
+
+    return StructureRepair(''.join(out), [fix for fix in FIXES if fix in fixes])
+
+
+def repair_structure(content):
+    """Return content with the structural and charset fixes applied."""
+    return repair_page(content).text
+
+def structure_stage(doc):
+    """Pipeline stage: the charset fixes declare UTF-8, so they only run on a page written as UTF-8."""
+    return repair_page(doc.text, charset=doc.to_utf8()).text
 
 def fix_html_structure(filepath):
     """Fix HTML structure and encoding issues in a single HTML file."""
@@ -15,100 +161,51 @@ def fix_html_structure(filepath):
         with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read()
         
-        original_content = content
-        
-        # Fix 1: Ensure proper DOCTYPE and HTML structure
-        if not content.strip().startswith('<!DOCTYPE'):
-            # Add DOCTYPE if missing
-            if content.strip().startswith('<html'):
-                content = '<!DOCTYPE html>\n' + content
-            elif '<html' in content:
-                # Find html tag and add DOCTYPE before it
-                html_pos = content.find('<html')
-                content = '<!DOCTYPE html>\n' + content[:html_pos] + content[html_pos:]
-        
-        # Fix 2: Ensure proper head structure with charset
-        if '<head' in content:
-            # Check if charset is already properly declared
-            if 'charset=utf-8' not in content.lower():
-                # Find head tag
-                head_match = re.search(r'<head[^>]*>', content, re.IGNORECASE)
-                if head_match:
-                    # Add charset meta tag right after head opening
-                    charset_meta = '\n<meta charset="utf-8">'
-                    content = content[:head_match.end()] + charset_meta + content[head_match.end():]
-        
-        # Fix 3: Remove malformed early closing tags
-        # Find if there are early </body></html> tags
-        body_close_match = re.search(r'</body>\s*</html>', content, re.IGNORECASE)
-        if body_close_match:
-            # Check if there's content after the closing tags
-            after_close = content[body_close_match.end():].strip()
-            if after_close:
-                # Remove the early closing tags
-                content = content[:body_close_match.start()] + after_close
-        
-        # Fix 4: Ensure proper closing tags at the end
-        if not content.strip().endswith('</html>'):
-            # Add missing closing tags
-            if '</body>' not in content:
-                content += '\n</body>'
-            if '</html>' not in content:
-                content += '\n</html>'
-        
-        # Fix 5: Clean up any remaining encoding issues
-        patterns = [
-            # Fix various encoding declarations
-            (r'charset=gb2312', 'charset=utf-8'),
-            (r'charset=gb18030', 'charset=utf-8'),
-            (r'charset=big5', 'charset=utf-8'),
-            # Fix Content-Type declarations
-            (r'<meta http-equiv=Content-Type content="text/html; charset=gb2312">', 
-             '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'),
-            (r'<meta http-equiv=Content-Type content="text/html; charset=gb18030">', 
-             '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'),
-            (r'<meta http-equiv=Content-Type content="text/html; charset=big5">', 
-             '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'),
-            # Fix META declarations
-            (r'<META http-equiv=Content-Type content="text/html; charset=gb2312">', 
-             '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'),
-            (r'<META http-equiv=Content-Type content="text/html; charset=gb18030">', 
-             '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'),
-            (r'<META http-equiv=Content-Type content="text/html; charset=big5">', 
-             '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'),
-        ]
-        
-        for pattern, replacement in patterns:
-            content = re.sub(pattern, replacement, content, flags=re.IGNORECASE)
+        repaired = repair_page(content)
         
         # Write back if changes were made
-        if content != original_content:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-            return True
+        if repaired.fixes and repaired.text != content:
+            write_text(filepath, repaired.text, 'fix_html_structure')
+            return repaired.fixes
         
-        return False
+        return []
         
     except Exception as e:
         print(f"Error processing {filepath}: {e}")
-        return False
+        metrics.note_error(e)
+        return []
 
-def main():
-    """Main function to fix HTML structure in all HTML files."""
-    # Find all HTML files
-    html_files = []
-    for pattern in ['*.html', '**/*.html']:
-        html_files.extend(glob.glob(pattern, recursive=True))
-    
-    print(f"Found {len(html_files)} HTML files")
+def fix_files(html_files, jobs=1, force=False, resume=False):
+    """Repair html_files (under the manifest) and print which fixes fired."""
+    results = run_incremental(fix_html_structure, html_files, 'fix_html_structure', RULES_VERSION,
+                              jobs=jobs, force=force, resume=resume)
     
     fixed_count = 0
-    for filepath in html_files:
-        if fix_html_structure(filepath):
-            print(f"Fixed structure in: {filepath}")
+    fired = Counter()
+    for filepath, fixes in zip(html_files, results):
+        if fixes:
+            print(f"Fixed structure in: {filepath} ({', '.join(fixes)})")
+            fired.update(fixes)
             fixed_count += 1
     
     print(f"\nFixed structure in {fixed_count} files")
+    for fix in FIXES:
+        if fired[fix]:
+            print(f"  {fix}: {fired[fix]}")
+
+def main():
+    """Main function to fix HTML structure in all HTML files."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', help='pages to fix (default: every .html page)')
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+    
+    # Find all HTML files (each once; backups, deploy/ and node_modules pruned)
+    html_files = [os.path.normpath(path) for path in args.paths] or list_html_files('.', suffixes=('.html',))
+    
+    print(f"Found {len(html_files)} HTML files")
+    
+    fix_files(html_files, args.jobs, args.force, args.resume)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,30 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import re
+from dnatools.backupstore import write_text
+from dnatools.detect import detect_file
+from dnatools.wordclean import WORD_RULES, clean_word_html
+
+# Same Word clean-up as tools/update_styling.py, but the page is re-laid out
+# without its original <div> wrappers
+T18_RULES = dict(WORD_RULES, unwrap=WORD_RULES['unwrap'] | {'div'})
 
 def fix_t18_zfyend():
-    # Read the current file with gb2312 encoding
-    with open('T18-ZFYEND.html', 'r', encoding='gb2312') as f:
-        content = f.read()
-    
-    # Extract the title and body content
-    title_match = re.search(r'<title>(.*?)</title>', content, re.DOTALL)
-    title = title_match.group(1) if title_match else "ZFY基因和人类基因"
-    
-    # Find the body content (everything between <div class=Section1> and </div>)
-    body_match = re.search(r'<div class=Section1>(.*?)</div>', content, re.DOTALL)
-    body_content = body_match.group(1) if body_match else ""
+    # Read the current file in whatever encoding it was saved with
+    detection = detect_file('T18-ZFYEND.html')
+    if detection.encoding is None:
+        print("Could not decode T18-ZFYEND.html with any known encoding")
+        return
+    content = detection.text
     
-    # Clean up the body content - remove Microsoft Word artifacts
-    body_content = re.sub(r'<div align=center>', '', body_content)
-    body_content = re.sub(r'</div>', '', body_content)
-    body_content = re.sub(r'<p class=MsoNormal>', '<p>', body_content)
-    body_content = re.sub(r'<span style=[^>]*>', '', body_content)
-    body_content = re.sub(r'</span>', '', body_content)
-    body_content = re.sub(r'<o:p></o:p>', '', body_content)
-    body_content = re.sub(r'<o:p>', '', body_content)
-    body_content = re.sub(r'</o:p>', '', body_content)
+    # Extract the title and body content, removing Microsoft Word artifacts
+    page = clean_word_html(content, T18_RULES)
+    title = page.title or "ZFY基因和人类基因"
+    body_content = page.body
     
     # Create modern HTML5 structure
     modern_html = f'''<!DOCTYPE html>
@@ -99,8 +95,7 @@ def fix_t18_zfyend():
 </html>'''
     
     # Write the modern HTML
-    with open('T18-ZFYEND.html', 'w', encoding='utf-8') as f:
-        f.write(modern_html)
+    write_text('T18-ZFYEND.html', modern_html, 'fix_t18_zfyend')
     
     print("T18-ZFYEND.html has been updated with modern styling!")
 
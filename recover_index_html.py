@@ -3,16 +3,37 @@
 Attempt to recover index.html by reading it as GBK and saving as UTF-8.
 """
 
+import argparse
+from functools import partial
+
+from dnatools.backupstore import write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.manifest import run_incremental
+
+# Bump whenever the recovery below changes so an already-recovered file is redone
+RULES_VERSION = 1
+
 def recover_html(input_file, source_encoding):
     output_file = input_file
     try:
         with open(input_file, 'r', encoding=source_encoding, errors='ignore') as f:
             content = f.read()
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_text(output_file, content, 'recover_index_html')
         print(f"Recovered {input_file} from {source_encoding} to UTF-8.")
+        return True
     except Exception as e:
         print(f"Error: {e}")
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    # Decoding a recovered (UTF-8) file as GBK again would garble it, so the
+    # manifest and journal keep a re-run or resumed run from touching it twice
+    run_incremental(partial(recover_html, source_encoding='gbk'), ['index.html'], 'recover_index_html',
+                    RULES_VERSION, jobs=args.jobs, force=args.force, resume=args.resume)
 
 if __name__ == "__main__":
-    recover_html('index.html', 'gbk') 
\ No newline at end of file
+    main()
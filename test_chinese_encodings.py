@@ -6,6 +6,8 @@ Test different Chinese encodings to find which one produces readable text.
 import chardet
 import os
 
+from dnatools.cjkscan import classify_buffer
+
 def test_encodings(filepath):
     """Test different encodings on a file."""
     try:
@@ -33,6 +35,11 @@ def test_encodings(filepath):
             except Exception as e:
                 print(f"\n{encoding}: Error - {e}")
         
+        # Byte-level scan (no decoding)
+        result = classify_buffer(raw_data)[0]
+        print(f"\nByte-level scan: {result.encoding} (confidence: {result.confidence:.2f}, "
+              f"{result.chinese_count} Chinese characters)")
+        
         # Also try chardet
         result = chardet.detect(raw_data)
         print(f"\nChardet detected: {result['encoding']} (confidence: {result['confidence']:.2f})")
@@ -47,4 +47,6 @@ def test_specific_file(filepath):
 
 if __name__ == "__main__":
     import re
-    test_specific_file('CHT7-P1.html') 
\ No newline at end of file
+    import sys
+    for filepath in sys.argv[1:] or ['CHT7-P1.html']:
+        test_specific_file(filepath)
@@ -0,0 +1,52 @@
+"""
+Encoding scan: the NumPy path tokenizes buffers exactly like the regex path.
+
+    python -m pytest tests/test_cjkscan.py
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dnatools import cjkscan
+
+np = pytest.importorskip('numpy')
+
+# Bytes on both sides of every range boundary the scan looks at
+BOUNDARY_BYTES = [0x20, 0x30, 0x39, 0x40, 0x41, 0x7E, 0x80, 0x81, 0xA1, 0xA4, 0xB0,
+                  0xB8, 0xD7, 0xE4, 0xF7, 0xFE, 0xFF]
+
+
+def _both(buf):
+    python = cjkscan._score_legacy_python(buf)
+    vectorized = cjkscan._score_legacy_numpy(np.frombuffer(buf, dtype=np.uint8))
+    return python, vectorized
+
+
+@pytest.mark.parametrize('buf', [
+    b'\xa4\x80\xb0\xa1',            # 0x80 as trail, then a pair
+    b'\x80\xb0\xa1',                # 0x80 as lead goes alone
+    b'\xb0\xff\xb0\xa1',            # 0xFF is never a trail
+    b'\x81\x30\x81\x30\x81\x30',    # overlapping four-byte sequences
+    b'\xb0\x81\x30\x81\x30\xa1',
+])
+def test_alignment_edge_cases(buf):
+    python, vectorized = _both(buf)
+    assert python == vectorized
+
+
+def test_random_buffers_score_the_same():
+    rng = random.Random(0)
+    for n in range(2000):
+        length = rng.randint(1, 64)
+        if n % 2:
+            buf = bytes(rng.choice(BOUNDARY_BYTES) for _ in range(length))
+        else:
+            buf = bytes(rng.randrange(256) for _ in range(length))
+        python, vectorized = _both(buf)
+        assert python == vectorized, buf.hex()
+        assert cjkscan.classify_buffer(buf, use_numpy=True)[0] == cjkscan.classify_buffer(buf, use_numpy=False)[0]
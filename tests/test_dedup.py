@@ -0,0 +1,62 @@
+"""
+Duplicate assets: root-absolute references count, unreadable pages block pruning.
+
+    python -m pytest tests/test_dedup.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dnatools.dedup import canonical_map, find_duplicates, rewrite_page, rewrite_references_to_canonical
+
+IMAGE = b'\x89PNG\r\n\x1a\n' + bytes(range(256))
+
+
+def _site(root, pages):
+    """Two export directories holding the same image, plus the given pages."""
+    for directory in ('A-P1_files', 'B-P1_files'):
+        os.makedirs(os.path.join(root, directory))
+        with open(os.path.join(root, directory, 'image001.png'), 'wb') as f:
+            f.write(IMAGE)
+    for name, data in pages.items():
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(data)
+    return find_duplicates(root)
+
+
+def test_absolute_reference_to_a_duplicate_is_rewritten(tmp_path):
+    root = str(tmp_path)
+    groups = _site(root, {'B-P1.html': b'<img src="/B-P1_files/image001.png">'})
+    canonical, duplicate = groups[0]
+    assert duplicate == os.path.join(root, 'B-P1_files', 'image001.png')
+
+    referenced = set()
+    changed = rewrite_page(os.path.join(root, 'B-P1.html'), canonical_map(groups), referenced,
+                           dry_run=True, root=root)
+
+    assert changed == 1
+    assert referenced == {canonical}
+
+
+def test_absolute_reference_to_a_kept_file_is_recorded(tmp_path):
+    root = str(tmp_path)
+    groups = _site(root, {'A-P1.html': b'<img src="/A-P1_files/image001.png?v=1">'})
+
+    referenced = set()
+    changed = rewrite_page(os.path.join(root, 'A-P1.html'), canonical_map(groups), referenced,
+                           dry_run=True, root=root)
+
+    assert changed == 0
+    assert referenced == {os.path.join(root, 'A-P1_files', 'image001.png')}
+
+
+def test_unreadable_page_blocks_pruning(tmp_path):
+    root = str(tmp_path)
+    groups = _site(root, {'A-P1.html': b'<img src="A-P1_files/image001.png">',
+                          'X.html': b'\xff\xfe\xfd' * 50})
+
+    pages, references, freed = rewrite_references_to_canonical(groups, root, prune=True, dry_run=True)
+
+    assert freed == 0
@@ -0,0 +1,47 @@
+"""
+Deploy build: WebP variants written by dnatools.images are offered through <picture>.
+
+    python -m pytest tests/test_deploybuild.py
+"""
+
+import os
+import struct
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dnatools.deploybuild import add_webp_sources
+
+
+def _png_header(width, height):
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr
+            + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr)))
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_images_with_variants_get_a_picture(tmp_path):
+    root = str(tmp_path)
+    _write(os.path.join(root, 'A_files', 'image001.png'), _png_header(1000, 500))
+    _write(os.path.join(root, 'A_files', 'image001.png.webp'), b'RIFF')
+    _write(os.path.join(root, 'A_files', 'image001.png-480w.webp'), b'RIFF')
+    _write(os.path.join(root, 'A_files', 'image002.png'), _png_header(10, 10))
+    _write(os.path.join(root, 'A.html'),
+           b'<p><img src="/A_files/image001.png" width=300><img src="A_files/image002.png">'
+           b'<picture><img src="A_files/image001.png"></picture></p>')
+
+    assert add_webp_sources(root) == (1, 1)
+
+    with open(os.path.join(root, 'A.html'), 'rb') as f:
+        page = f.read().decode('utf-8')
+    assert page == (
+        '<p><picture><source type="image/webp" '
+        'srcset="/A_files/image001.png-480w.webp 480w, /A_files/image001.png.webp 1000w" '
+        'sizes="(max-width: 300px) 100vw, 300px"><img src="/A_files/image001.png" width=300></picture>'
+        '<img src="A_files/image002.png"><picture><img src="A_files/image001.png"></picture></p>')
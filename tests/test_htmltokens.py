@@ -0,0 +1,55 @@
+"""
+Streaming tokenizer: same tokens as tokenize(), with a bounded carry-over buffer.
+
+    python -m pytest tests/test_htmltokens.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dnatools.htmltokens import tokenize, tokenize_stream
+
+CHUNK_SIZE = 64
+
+
+def _chunks(text, size=CHUNK_SIZE):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _stream_with_peak(chunks):
+    """Tokens from tokenize_stream plus the most text it held back at any point."""
+    state = {'fed': 0, 'yielded': 0, 'peak': 0}
+
+    def feed():
+        for chunk in chunks:
+            state['fed'] += len(chunk)
+            state['peak'] = max(state['peak'], state['fed'] - state['yielded'])
+            yield chunk
+
+    tokens = []
+    for token in tokenize_stream(feed()):
+        tokens.append(token)
+        state['yielded'] += len(token.text)
+    return tokens, state['peak']
+
+
+def test_bare_less_than_does_not_hold_the_rest_of_the_page():
+    paragraph = '<p class="MsoNormal">if a < b then b > a, and 3 <4 too</p>\n'
+    page = '<html><body>\n' + paragraph * 2000 + '</body></html>\n'
+
+    tokens, peak = _stream_with_peak(_chunks(page))
+
+    assert tokens == list(tokenize(page))
+    # A chunk plus the unfinished token it ends in, not the whole document
+    assert peak <= 3 * CHUNK_SIZE + len(paragraph)
+
+
+def test_tags_split_across_chunks_match_tokenize():
+    page = ('<!DOCTYPE html><html><head><!-- a > b --><meta content="x>y" name=\'q\'>'
+            '</head><body><p title="1 < 2">a < b</p><?xml version="1.0"?>'
+            '<a href=\'t.html\'>x</a> < <b>y</b> </ p> <!--> --></body></html>')
+    expected = list(tokenize(page))
+    for size in range(1, len(page) + 1):
+        assert list(tokenize_stream(_chunks(page, size))) == expected, size
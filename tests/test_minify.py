@@ -0,0 +1,47 @@
+"""
+Minifier: unquoted values must not swallow the slash of a self-closing tag.
+
+    python -m pytest tests/test_minify.py
+"""
+
+import os
+import sys
+from html.parser import HTMLParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dnatools.htmltokens import tokenize
+from dnatools.minify import minify_tokens
+
+
+def _minify(html):
+    return ''.join(minify_tokens(tokenize(html)))
+
+
+def _browser_attributes(html):
+    """Attributes of every start tag as an HTML5 parser reads them."""
+    tags = []
+
+    class Collector(HTMLParser):
+        def handle_starttag(self, tag, attrs):
+            tags.append(attrs)
+        handle_startendtag = handle_starttag
+
+    Collector().feed(html)
+    return tags
+
+
+def test_self_closing_tag_keeps_its_last_value():
+    html = ('<img alt="" src="/ENT5-P3_files/5-17.jpg"/><img src="/001-2B.jpg"/>'
+            '<link rel="File-List" href="x_files/filelist.xml"/><link href="a.css" rel="File-List"/>')
+
+    minified = _minify(html)
+
+    assert len(minified) < len(html)
+    assert _browser_attributes(minified) == _browser_attributes(html) == [
+        [('alt', ''), ('src', '/ENT5-P3_files/5-17.jpg')], [('src', '/001-2B.jpg')],
+        [('rel', 'File-List'), ('href', 'x_files/filelist.xml')], [('href', 'a.css'), ('rel', 'File-List')]]
+
+
+def test_self_closing_tag_without_attributes():
+    assert _minify('<br/><br />') == '<br/><br/>'
@@ -4,11 +4,19 @@
 Fix Chinese character encoding in all HTML files listed in ADD.html
 """
 
+import argparse
 import os
 import sys
 import re
+from pathlib import Path
 
-# List of files from ADD.html that need to be fixed
+# Make the shared dnatools package importable when run as tools/<script>.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnatools.backupstore import write_text
+from dnatools.mojibake import repair_text, table_version
+
+# Files from ADD.html fixed when none are named on the command line (and by the pipeline stage)
 FILES_TO_FIX = [
     "T18-ZFYEND.html",
     "T18-7HUMAN.html", 
@@ -27,61 +35,33 @@ FILES_TO_FIX = [
     "T10-6COI.html"  # Already fixed, but included for completeness
 ]
 
-# Chinese character mappings for common garbled text
-CHINESE_FIXES = {
-    # Title fixes
-    "˵ZFYǺ͡һǡ": "人染色体ZFY标记和第一标记",
-    "--⨺COIDNAоĲ": "人-黑猩猩-猕猴：COI基因DNA编码序列有巨大的差异",
-    
-    # Common word fixes
-    "": "人",
-    "": "黑猩猩", 
-    "⨺": "猕猴",
-    "": "基因",
-    "": "编码",
-    "": "样本",
-    "Ⱦɫ": "染色体",
-    "Ǻ": "标记和",
-    "һǡ": "第一标记",
-    "": "编码序列",
-    "оĲ": "有巨大的差异",
-    "": "个人",
-    "": "样本的",
-    "": "个",
-    "мһ": "编码序列极其一致",
-    "": "（线粒体基因）",
-    "": "样本",
-    "": "：",
-    "ӻվ鿴": "从基因银行网站查看此",
-    "": "编码",
-    "": "非常一致",
-    "": "完全一致",
-    "": "黄牛",
-    "": "野牛",
-    "": "线粒体",
-    "": "四个地方",
-    "": "猪的",
-    "": "三个品种",
-    "": "小麦的",
-    "": "人类",
-    "": "比较",
-    "": "Y染色体",
-    "": "差异变化",
-    "": "样本",
-    "ͻ䡣": "样本发生了突变。",
-    "": "男人",
-    "": "女人",
-    "": "男人和女人的",
-    "": "第一标记",
-    "": "编码序列",
-    "": "完全一致"
-}
+# Bump whenever the fixes below change so already-processed files are redone
+RULES_VERSION = 2
+
+def stage_version():
+    """Pipeline version: the rules plus the learned table (loaded here, before the workers fork)"""
+    return f"{RULES_VERSION}:{table_version()}"
 
 def fix_chinese_characters(content):
-    """Fix garbled Chinese characters in the content"""
-    for garbled, correct in CHINESE_FIXES.items():
-        content = content.replace(garbled, correct)
-    return content
+    """Fix garbled Chinese characters with the table learned from the backups (dnatools.mojibake)"""
+    return repair_text(content)[0]
+
+def fix_page_text(content):
+    """Fix garbled Chinese characters and relabel the charset declaration"""
+    fixed_content = fix_chinese_characters(content)
+    
+    # Ensure proper charset declaration
+    if 'charset=utf-8' not in fixed_content:
+        fixed_content = fixed_content.replace('charset=gb2312', 'charset=utf-8')
+        fixed_content = fixed_content.replace('charset=gbk', 'charset=utf-8')
+        fixed_content = fixed_content.replace('charset=gb18030', 'charset=utf-8')
+    return fixed_content
+
+def add_pages_stage(doc):
+    """Pipeline stage: fix the pages listed in FILES_TO_FIX, leave the rest alone"""
+    if os.path.normpath(doc.path) not in FILES_TO_FIX or not doc.to_utf8():
+        return doc.text
+    return fix_page_text(doc.text)
 
 def fix_html_file(file_path):
     """Fix a single HTML file"""
@@ -94,18 +74,11 @@ def fix_html_file(file_path):
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read()
         
-        # Fix Chinese characters
-        fixed_content = fix_chinese_characters(content)
-        
-        # Ensure proper charset declaration
-        if 'charset=utf-8' not in fixed_content:
-            fixed_content = fixed_content.replace('charset=gb2312', 'charset=utf-8')
-            fixed_content = fixed_content.replace('charset=gbk', 'charset=utf-8')
-            fixed_content = fixed_content.replace('charset=gb18030', 'charset=utf-8')
+        # Fix Chinese characters and the charset declaration
+        fixed_content = fix_page_text(content)
         
         # Write back the fixed content
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(fixed_content)
+        write_text(file_path, fixed_content, 'fix_add_pages')
         
         print(f"Fixed: {file_path}")
         return True
@@ -116,12 +89,17 @@ def fix_html_file(file_path):
 
 def main():
     """Main function to fix all files"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', help='pages to fix (default: FILES_TO_FIX)')
+    args = parser.parse_args()
+    files_to_fix = [os.path.normpath(path) for path in args.paths] or FILES_TO_FIX
+    
     print("Fixing Chinese character encoding in ADD.html pages...")
     
     fixed_count = 0
-    total_count = len(FILES_TO_FIX)
+    total_count = len(files_to_fix)
     
-    for filename in FILES_TO_FIX:
+    for filename in files_to_fix:
         if fix_html_file(filename):
             fixed_count += 1
     
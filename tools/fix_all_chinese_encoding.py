@@ -5,29 +5,32 @@ Fix Chinese character encoding in all HTML files in the project
 Converts gb2312/gbk/gb18030 encoded files to UTF-8
 """
 
-import os
 import sys
-import glob
+import argparse
 from pathlib import Path
 
+# Make the shared dnatools package importable when run as tools/<script>.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnatools import metrics
+from dnatools.backupstore import write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.detect import detect_file, relabel_charset
+from dnatools.fsindex import DEFAULT_SKIP_DIRS, html_files as list_html_files
+from dnatools.manifest import run_incremental
+
+# Bump whenever the conversion rules below change so already-processed files are redone
+RULES_VERSION = 1
+
 def fix_html_encoding(file_path):
     """Fix encoding of a single HTML file"""
     try:
-        # First, try to detect the current encoding
-        encodings_to_try = ['gb2312', 'gbk', 'gb18030', 'utf-8']
-        content = None
-        detected_encoding = None
+        # Read the file once and decode it with the best-scoring encoding
+        detection = detect_file(file_path)
+        content = detection.text
+        detected_encoding = detection.encoding
         
-        for encoding in encodings_to_try:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                detected_encoding = encoding
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if content is None:
+        if detection.encoding is None:
             print(f"Could not decode {file_path} with any known encoding")
             return False
         
@@ -37,45 +40,32 @@ def fix_html_encoding(file_path):
             return True
         
         # Replace charset declarations
-        content = content.replace('charset=gb2312', 'charset=utf-8')
-        content = content.replace('charset=gbk', 'charset=utf-8')
-        content = content.replace('charset=gb18030', 'charset=utf-8')
-        content = content.replace('charset=GB2312', 'charset=utf-8')
-        content = content.replace('charset=GBK', 'charset=utf-8')
-        content = content.replace('charset=GB18030', 'charset=utf-8')
+        content = relabel_charset(content)
         
         # Write back with UTF-8 encoding
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_text(file_path, content, 'fix_all_chinese_encoding')
         
         print(f"Fixed: {file_path} (was {detected_encoding})")
         return True
         
     except Exception as e:
         print(f"Error fixing {file_path}: {e}")
+        metrics.note_error(e)
         return False
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+    
     # Get the project root directory
     project_root = Path(__file__).parent.parent
     
-    # Directories to skip
-    skip_dirs = {
-        'backups_gb18030',
-        'backups_gb18030_specific', 
-        'backups_gb18030_specific2',
-        'content/auto-migrated',
-        'deploy',
-        '.git'
-    }
+    # Directories to skip (pruned before descending)
+    skip_dirs = DEFAULT_SKIP_DIRS | {'content/auto-migrated'}
     
     # Find all HTML files
-    html_files = []
-    for html_file in project_root.rglob("*.html"):
-        # Skip files in backup directories
-        if any(skip_dir in str(html_file) for skip_dir in skip_dirs):
-            continue
-        html_files.append(html_file)
+    html_files = list_html_files(str(project_root), skip_dirs, suffixes=('.html',))
     
     if not html_files:
         print("No HTML files found")
@@ -83,10 +73,10 @@ def main():
     
     print(f"Found {len(html_files)} HTML files to process...")
     
-    fixed_count = 0
-    for html_file in html_files:
-        if fix_html_encoding(html_file):
-            fixed_count += 1
+    results = run_incremental(fix_html_encoding, html_files, 'fix_all_chinese_encoding', RULES_VERSION,
+                              jobs=args.jobs, force=args.force, resume=args.resume,
+                              manifest_path=project_root / '.dnatools' / 'manifest.json')
+    fixed_count = sum(1 for fixed in results if fixed)
     
     print(f"\nFixed {fixed_count} out of {len(html_files)} files")
 
@@ -10,21 +10,27 @@ import sys
 import glob
 from pathlib import Path
 
+# Make the shared dnatools package importable when run as tools/<script>.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnatools.backupstore import write_text
+from dnatools.detect import detect_file, relabel_charset
+
 def fix_html_encoding(file_path):
     """Fix encoding of a single HTML file"""
     try:
-        # Read the file with gb2312 encoding
-        with open(file_path, 'r', encoding='gb2312', errors='ignore') as f:
-            content = f.read()
+        # Read the file once and decode it with the best-scoring encoding
+        detection = detect_file(file_path)
+        if detection.encoding is None:
+            print(f"Could not decode {file_path} with any known encoding")
+            return False
+        content = detection.text
         
         # Replace the charset declaration
-        content = content.replace('charset=gb2312', 'charset=utf-8')
-        content = content.replace('charset=gbk', 'charset=utf-8')
-        content = content.replace('charset=gb18030', 'charset=utf-8')
+        content = relabel_charset(content)
         
         # Write back with UTF-8 encoding
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_text(file_path, content, 'fix_chinese_encoding')
         
         print(f"Fixed: {file_path}")
         return True
@@ -10,41 +10,28 @@ import sys
 import glob
 from pathlib import Path
 
+# Make the shared dnatools package importable when run as tools/<script>.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnatools.backupstore import write_text
+from dnatools.detect import detect_file, relabel_charset
+
 def fix_html_encoding_properly(file_path):
     """Fix encoding of a single HTML file by reading as binary"""
     try:
-        # Read the file as binary
-        with open(file_path, 'rb') as f:
-            content_bytes = f.read()
-        
-        # Try to decode with different encodings
-        encodings_to_try = ['gb2312', 'gbk', 'gb18030', 'utf-8']
-        content = None
-        detected_encoding = None
-        
-        for encoding in encodings_to_try:
-            try:
-                content = content_bytes.decode(encoding)
-                detected_encoding = encoding
-                break
-            except UnicodeDecodeError:
-                continue
+        # Read the file once and decode it with the best-scoring encoding
+        detection = detect_file(file_path)
+        detected_encoding = detection.encoding
         
-        if content is None:
+        if detection.encoding is None:
             print(f"Could not decode {file_path} with any known encoding")
             return False
         
         # Replace charset declarations
-        content = content.replace('charset=gb2312', 'charset=utf-8')
-        content = content.replace('charset=gbk', 'charset=utf-8')
-        content = content.replace('charset=gb18030', 'charset=utf-8')
-        content = content.replace('charset=GB2312', 'charset=utf-8')
-        content = content.replace('charset=GBK', 'charset=utf-8')
-        content = content.replace('charset=GB18030', 'charset=utf-8')
+        content = relabel_charset(detection.text)
         
         # Write back with UTF-8 encoding
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_text(file_path, content, 'fix_encoding_properly')
         
         print(f"Fixed: {file_path} (was {detected_encoding})")
         return True
@@ -4,11 +4,18 @@
 Update HTML files to match the modern styling of T18-ZFYEND.html
 """
 
+import argparse
 import os
 import sys
-import re
+from pathlib import Path
 
-# List of files to update
+# Make the shared dnatools package importable when run as tools/<script>.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnatools.backupstore import write_text
+from dnatools.wordclean import clean_word_html
+
+# Files updated when none are named on the command line (and by the pipeline stage)
 FILES_TO_UPDATE = [
     "T18-1END.html",
     "T18-2END.html", 
@@ -26,63 +33,15 @@ FILES_TO_UPDATE = [
     "T10-6COI.html"
 ]
 
-def update_file_styling(file_path):
-    """Update a single file to match T18-ZFYEND.html styling"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Extract title
-        title_match = re.search(r'<title>(.*?)</title>', content, re.DOTALL)
-        title = title_match.group(1) if title_match else "Untitled"
-        
-        # Extract main content (simplified approach)
-        # Find the main content area
-        content_match = re.search(r'<div[^>]*align=center[^>]*>(.*?)</div>', content, re.DOTALL | re.IGNORECASE)
-        if content_match:
-            main_content = content_match.group(1)
-        else:
-            # Fallback: get everything between body tags
-            body_match = re.search(r'<body[^>]*>(.*?)</body>', content, re.DOTALL | re.IGNORECASE)
-            main_content = body_match.group(1) if body_match else ""
-        
-        # Clean up the content
-        main_content = re.sub(r'<o:p>.*?</o:p>', '', main_content)
-        main_content = re.sub(r'<span[^>]*class="[^"]*"[^>]*>', '', main_content)
-        main_content = re.sub(r'</span>', '', main_content)
-        main_content = re.sub(r'<p[^>]*class="[^"]*"[^>]*>', '<p>', main_content)
-        main_content = re.sub(r'<div[^>]*class="[^"]*"[^>]*>', '<div>', main_content)
-        main_content = re.sub(r'<table[^>]*class="[^"]*"[^>]*>', '<table>', main_content)
-        main_content = re.sub(r'<td[^>]*style="[^"]*"[^>]*>', '<td>', main_content)
-        main_content = re.sub(r'<tr[^>]*style="[^"]*"[^>]*>', '<tr>', main_content)
-        main_content = re.sub(r'<b[^>]*style="[^"]*"[^>]*>', '<b>', main_content)
-        main_content = re.sub(r'<span[^>]*style="[^"]*"[^>]*>', '', main_content)
-        main_content = re.sub(r'<span[^>]*lang="[^"]*"[^>]*>', '', main_content)
-        main_content = re.sub(r'<span[^>]*color="[^"]*"[^>]*>', '', main_content)
-        main_content = re.sub(r'<span[^>]*mso-[^>]*>', '', main_content)
-        main_content = re.sub(r'<o:[^>]*>', '', main_content)
-        main_content = re.sub(r'</o:[^>]*>', '', main_content)
-        main_content = re.sub(r'<w:[^>]*>', '', main_content)
-        main_content = re.sub(r'</w:[^>]*>', '', main_content)
-        main_content = re.sub(r'<v:[^>]*>', '', main_content)
-        main_content = re.sub(r'</v:[^>]*>', '', main_content)
-        main_content = re.sub(r'<mso-[^>]*>', '', main_content)
-        main_content = re.sub(r'</mso-[^>]*>', '', main_content)
-        main_content = re.sub(r'<![^>]*>', '', main_content)
-        main_content = re.sub(r'<!--[^>]*-->', '', main_content)
-        main_content = re.sub(r'<xml[^>]*>.*?</xml>', '', main_content, flags=re.DOTALL)
-        main_content = re.sub(r'<style[^>]*>.*?</style>', '', main_content, flags=re.DOTALL)
-        main_content = re.sub(r'<head[^>]*>.*?</head>', '', main_content, flags=re.DOTALL)
-        main_content = re.sub(r'<html[^>]*>', '', main_content)
-        main_content = re.sub(r'</html>', '', main_content)
-        main_content = re.sub(r'<body[^>]*>', '', main_content)
-        main_content = re.sub(r'</body>', '', main_content)
-        main_content = re.sub(r'<div[^>]*class="Section1"[^>]*>', '', main_content)
-        main_content = re.sub(r'<p[^>]*>&nbsp;</p>', '', main_content)
-        main_content = re.sub(r'<p[^>]*><o:p>&nbsp;</o:p></p>', '', main_content)
-        
-        # Create new modern structure
-        new_content = f'''<!DOCTYPE html>
+def restyle(content):
+    """Return content rebuilt in the T18-ZFYEND.html layout"""
+    # Extract title and strip the Word markup in one pass
+    page = clean_word_html(content)
+    title = page.title or "Untitled"
+    main_content = page.body
+    
+    # Create new modern structure
+    new_content = f'''<!DOCTYPE html>
 <html lang="zh">
 <head>
     <link rel="stylesheet" href="/assets/css/main.css">
@@ -105,10 +64,28 @@ def update_file_styling(file_path):
     </div>
 </body>
 </html>'''
+    
+    return new_content
+
+def styling_stage(doc):
+    """Pipeline stage: restyle the pages listed in FILES_TO_UPDATE"""
+    # Pages already in the modern layout are left alone; restyling is not idempotent
+    if os.path.normpath(doc.path) not in FILES_TO_UPDATE or 'class="article-content"' in doc.text:
+        return doc.text
+    if not doc.to_utf8():
+        return doc.text
+    return restyle(doc.text)
+
+def update_file_styling(file_path):
+    """Update a single file to match T18-ZFYEND.html styling"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        new_content = restyle(content)
         
         # Write the updated content
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+        write_text(file_path, new_content, 'update_styling')
         
         print(f"✅ Updated {file_path}")
         return True
@@ -117,19 +94,24 @@ def update_file_styling(file_path):
         print(f"❌ Error updating {file_path}: {e}")
         return False
 
-def main():
-    """Main function to update all files"""
+def restyle_files(file_paths):
+    """Restyle file_paths, leaving pages already in the modern layout alone; returns the count updated"""
     print("🔄 Updating HTML files to match modern styling...")
     
     success_count = 0
-    total_count = len(FILES_TO_UPDATE)
+    total_count = len(file_paths)
     
-    for file_path in FILES_TO_UPDATE:
-        if os.path.exists(file_path):
-            if update_file_styling(file_path):
-                success_count += 1
-        else:
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
             print(f"⚠️  File not found: {file_path}")
+            continue
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            if 'class="article-content"' in f.read():
+                print(f"⏭️  Already restyled: {file_path}")
+                success_count += 1
+                continue
+        if update_file_styling(file_path):
+            success_count += 1
     
     print(f"\n📊 Results: {success_count}/{total_count} files updated successfully")
     
@@ -137,6 +119,15 @@ def main():
         print("🎉 All files updated successfully!")
     else:
         print("⚠️  Some files could not be updated. Check the errors above.")
+    return success_count
+
+def main():
+    """Main function to update all files"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', help='pages to restyle (default: FILES_TO_UPDATE)')
+    args = parser.parse_args()
+    
+    restyle_files([os.path.normpath(path) for path in args.paths] or FILES_TO_UPDATE)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,7 +1,18 @@
 #!/usr/bin/env python3
 import os
-import re
-import glob
+import argparse
+from collections import Counter
+from functools import partial
+
+from dnatools import metrics
+from dnatools.backupstore import write_text
+from dnatools.batch import add_batch_arguments
+from dnatools.fsindex import html_files as list_html_files
+from dnatools.manifest import run_incremental
+from dnatools.rewrite import Rewriter
+
+# Bump whenever the rewrite rules below change so already-processed files are redone
+RULES_VERSION = 2
 
 # Mapping of old Chinese filenames to new ASCII filenames
 filename_mappings = {
@@ -55,59 +66,93 @@ filename_mappings = {
     'ӢB3.jpg': 'B3_cover.jpg'
 }
 
-def update_file(filepath):
-    """Update a single HTML file with the filename mappings."""
+# Compiled once per process; applies every mapping in a single scan
+FILENAME_REWRITER = Rewriter(filename_mappings)
+
+def filenames_stage(doc):
+    """Pipeline stage: rewrite references to renamed files."""
+    return FILENAME_REWRITER.rewrite(doc.text)[0]
+
+def update_file(filepath, attributes_only=False):
+    """Update a single HTML file with the filename mappings.
+    
+    Returns the number of replacements made per old filename (empty if unchanged).
+    """
     try:
         # Read the file with UTF-8 encoding
         with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read()
         
-        original_content = content
-        
         # Apply all replacements
-        for old_name, new_name in filename_mappings.items():
-            # Replace in src attributes
-            content = re.sub(r'src=["\']([^"\']*' + re.escape(old_name) + r'[^"\']*)["\']', 
-                           r'src="\1'.replace(old_name, new_name) + '"', content)
-            
-            # Replace in href attributes
-            content = re.sub(r'href=["\']([^"\']*' + re.escape(old_name) + r'[^"\']*)["\']', 
-                           r'href="\1'.replace(old_name, new_name) + '"', content)
-            
-            # Replace standalone filenames (for cases where they appear in text)
-            content = content.replace(old_name, new_name)
+        content, hits = FILENAME_REWRITER.rewrite(content, attributes_only=attributes_only)
         
         # Only write if content changed
-        if content != original_content:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+        if hits:
+            write_text(filepath, content, 'update_filenames')
             print(f"Updated: {filepath}")
-            return True
         else:
             print(f"No changes needed: {filepath}")
-            return False
+        return dict(hits)
             
     except Exception as e:
         print(f"Error processing {filepath}: {e}")
-        return False
+        metrics.note_error(e)
+        return {}
+
+def indexed_pages(html_files):
+    """The html_files that reference an old filename per the linkcheck reverse index (None without one)."""
+    # Imported here: only --indexed needs the link checker
+    from dnatools.linkcheck import load_reverse_index, pages_referencing
+    reverse = load_reverse_index()
+    if reverse is None:
+        return None
+    affected = set(pages_referencing(filename_mappings, reverse))
+    return [path for path in html_files if path in affected]
+
+def update_files(html_files, attributes_only=False, jobs=1, force=False, resume=False):
+    """Rewrite old filenames in html_files (under the manifest) and print the replacements."""
+    # The two modes rewrite different amounts, so track them separately
+    version = f"{RULES_VERSION}:attributes" if attributes_only else RULES_VERSION
+    results = run_incremental(partial(update_file, attributes_only=attributes_only),
+                              html_files, 'update_filenames', version,
+                              jobs=jobs, force=force, resume=resume)
+    updated_count = sum(1 for hits in results if hits)
+    
+    total_hits = Counter()
+    for hits in results:
+        total_hits.update(hits or {})
+    if total_hits:
+        print("\nReplacements per filename:")
+        for old_name, count in total_hits.most_common():
+            print(f"  {old_name} -> {filename_mappings[old_name]}: {count}")
+    
+    print(f"\nUpdate complete! Updated {updated_count} files out of {len(html_files)} total files.")
 
 def main():
     """Main function to update all HTML files."""
-    # Find all HTML files
-    html_files = []
-    for root, dirs, files in os.walk('.'):
-        for file in files:
-            if file.endswith('.html'):
-                html_files.append(os.path.join(root, file))
+    parser = argparse.ArgumentParser(description="Rewrite references to renamed (Chinese) asset filenames.")
+    parser.add_argument('paths', nargs='*', help='pages to update (default: every .html page)')
+    parser.add_argument('--attributes-only', action='store_true',
+                        help='only rewrite src/href attribute values, not running text')
+    parser.add_argument('--indexed', action='store_true',
+                        help='only open pages that reference an old filename according to the '
+                             'dnatools.linkcheck reverse index (implies --attributes-only)')
+    add_batch_arguments(parser)
+    args = parser.parse_args()
     
-    print(f"Found {len(html_files)} HTML files")
+    # Find all HTML files (each once; backups, deploy/ and node_modules pruned)
+    html_files = [os.path.normpath(path) for path in args.paths] or list_html_files('.', suffixes=('.html',))
+    if args.indexed:
+        html_files = indexed_pages(html_files)
+        if html_files is None:
+            from dnatools.linkcheck import REFERENCES_PATH
+            parser.error(f"{REFERENCES_PATH} does not exist; run python -m dnatools.linkcheck first")
+        # The index only knows src/href values, so running text is left alone
+        args.attributes_only = True
     
-    updated_count = 0
-    for filepath in html_files:
-        if update_file(filepath):
-            updated_count += 1
+    print(f"Found {len(html_files)} HTML files")
     
-    print(f"\nUpdate complete! Updated {updated_count} files out of {len(html_files)} total files.")
+    update_files(html_files, args.attributes_only, args.jobs, args.force, args.resume)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file